@@ -0,0 +1,439 @@
+"""
+
+Pathfinder server jobs, @esteinig
+
+Survey and download jobs submitted over Socket.IO are run by a pool of workers as
+`pf download` processes. Their progress is streamed to subscribed clients with
+throttling and per-client backpressure, and their state is persisted in SQLite
+so that jobs queued or running when the server stops are resumed on restart.
+
+"""
+
+import sys
+import json
+import time
+import uuid
+import queue
+import collections
+import sqlite3
+import threading
+import subprocess
+
+from pathlib import Path
+
+KINDS = ('survey', 'download')
+
+# Job states
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = \
+    'queued', 'running', 'done', 'failed', 'cancelled'
+
+# Job parameters and their `pf download` options
+OPTIONS = {
+    'accession': '--accession',
+    'project': '--project',
+    'species': '--species',
+    'filter': '--filter',
+    'scheme': '--scheme',
+    'batch': '--batch',
+    'max_gb': '--max_gb',
+    'limit': '--limit',
+    'workers': '--workers',
+}
+
+FLAGS = {
+    'balance': '--balance',
+    'ftp': '--ftp',
+    'wget': '--wget',
+    'submitted': '--submitted',
+}
+
+
+class QueueFull(Exception):
+
+    """ Raised when a job is submitted to a full queue """
+
+    pass
+
+
+class JobStore:
+
+    """ Persistent job state in SQLite """
+
+    def __init__(self, path: Path):
+
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'id TEXT PRIMARY KEY, kind TEXT, params TEXT, state TEXT, '
+            'created REAL, started REAL, finished REAL, progress TEXT, error TEXT)'
+        )
+        self._db.commit()
+
+    def save(self, job: dict) -> None:
+
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (
+                    job['id'], job['kind'], json.dumps(job['params']),
+                    job['state'], job['created'], job['started'],
+                    job['finished'], json.dumps(job['progress']), job['error']
+                )
+            )
+            self._db.commit()
+
+    def load(self) -> list:
+
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT id, kind, params, state, created, started, finished, '
+                'progress, error FROM jobs ORDER BY created'
+            ).fetchall()
+
+        return [
+            {
+                'id': row[0], 'kind': row[1], 'params': json.loads(row[2]),
+                'state': row[3], 'created': row[4], 'started': row[5],
+                'finished': row[6], 'progress': json.loads(row[7]),
+                'error': row[8]
+            } for row in rows
+        ]
+
+
+class JobQueue:
+
+    """ Worker pool running survey and download jobs """
+
+    def __init__(
+        self,
+        socketio,
+        store: JobStore,
+        outdir: Path,
+        workers: int = 2,
+        max_queued: int = 20,
+        interval: float = 1.,
+        ack_timeout: float = 10.
+    ):
+
+        """ Job queue
+
+        :param socketio: Socket.IO server emitting job events
+        :param store: persistent job state
+        :param outdir: directory for job outputs, one subdirectory per job
+        :param workers: number of jobs running at once
+        :param max_queued: maximum number of queued jobs
+        :param interval: minimum seconds between progress events of a job
+        :param ack_timeout: seconds after which an unacknowledged progress
+            event no longer holds back the next event to a client
+
+        """
+
+        self.socketio = socketio
+        self.store = store
+        self.outdir = Path(outdir)
+        self.workers = workers
+        self.interval = interval
+        self.ack_timeout = ack_timeout
+
+        self.jobs = {job['id']: job for job in store.load()}
+
+        # Jobs queued or running when the server stopped are resumed
+        self.resumed = [
+            job for job in self.jobs.values() if job['state'] in (QUEUED, RUNNING)
+        ]
+        self.queue = queue.Queue(maxsize=max(max_queued, len(self.resumed)))
+
+        # Subscribed clients per job and their unacknowledged event time
+        self.subscribers = {}
+        self.in_flight = {}
+
+        self._processes = {}
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self) -> None:
+
+        """ Resume jobs interrupted by a restart and start the workers,
+        once per queue """
+
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+
+        for job in self.resumed:
+            job['state'] = QUEUED
+            self.store.save(job)
+            self.queue.put_nowait(job['id'])
+
+        for _ in range(self.workers):
+            self.socketio.start_background_task(self._work)
+
+    def submit(self, kind: str, params: dict) -> dict:
+
+        """ Submit a job to the queue
+
+        :param kind: job kind: survey or download
+        :param params: job parameters, see `OPTIONS` and `FLAGS`
+
+        :returns job
+
+        :raises ValueError if the job kind or parameters are not supported
+        :raises QueueFull if the queue is full
+
+        """
+
+        if kind not in KINDS:
+            raise ValueError(f'Job kind must be one of: {", ".join(KINDS)}')
+
+        unknown = set(params) - set(OPTIONS) - set(FLAGS)
+        if unknown:
+            raise ValueError(f'Unsupported job parameters: {", ".join(unknown)}')
+
+        job = {
+            'id': str(uuid.uuid4()), 'kind': kind, 'params': params,
+            'state': QUEUED, 'created': time.time(), 'started': None,
+            'finished': None, 'progress': {}, 'error': None
+        }
+
+        try:
+            self.queue.put_nowait(job['id'])
+        except queue.Full:
+            raise QueueFull(f'Job queue is full ({self.queue.maxsize} jobs)')
+
+        self.jobs[job['id']] = job
+        self.store.save(job)
+
+        return job
+
+    def cancel(self, job_id: str) -> dict:
+
+        """ Cancel a queued or running job """
+
+        job = self.jobs[job_id]
+
+        with self._lock:
+            if job['state'] in (QUEUED, RUNNING):
+                job['state'] = CANCELLED
+                job['finished'] = time.time()
+                proc = self._processes.get(job_id)
+                if proc is not None:
+                    proc.terminate()
+
+        self.store.save(job)
+        self._emit_state(job)
+
+        return job
+
+    def subscribe(self, sid: str, job_id: str) -> dict:
+
+        """ Subscribe a client to the events of a job """
+
+        job = self.jobs[job_id]
+        self.subscribers.setdefault(job_id, set()).add(sid)
+        self._send_progress(job, sid)
+
+        return job
+
+    def unsubscribe(self, sid: str, job_id: str = None) -> None:
+
+        """ Unsubscribe a client from one or all jobs """
+
+        for key, sids in self.subscribers.items():
+            if job_id is None or key == job_id:
+                sids.discard(sid)
+                self.in_flight.pop((sid, key), None)
+
+    def _work(self) -> None:
+
+        while True:
+            job_id = self.queue.get()
+            job = self.jobs[job_id]
+
+            if job['state'] != QUEUED:
+                continue  # cancelled while queued
+
+            try:
+                self._run(job)
+            except Exception as err:
+                job['state'], job['error'] = FAILED, str(err)
+
+            job['finished'] = time.time()
+            self.store.save(job)
+            self._emit_state(job)
+
+    def _run(self, job: dict) -> None:
+
+        job['state'], job['started'] = RUNNING, time.time()
+        self.store.save(job)
+        self._emit_state(job)
+
+        outdir = self.outdir / job['id']
+        outdir.mkdir(parents=True, exist_ok=True)
+
+        cmd = self.get_command(job, outdir)
+
+        with self._lock:
+            if job['state'] == CANCELLED:
+                return
+            proc = subprocess.Popen(
+                cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                universal_newlines=True, cwd=str(outdir)
+            )
+            self._processes[job['id']] = proc
+
+        # Errors are collected without blocking on a full stderr pipe:
+        errors = collections.deque(maxlen=20)
+        self.socketio.start_background_task(errors.extend, proc.stderr)
+
+        tracker = ProgressTracker()
+        emitted = 0.
+        try:
+            for line in proc.stdout:
+                try:
+                    update = json.loads(line)
+                except ValueError:
+                    continue
+
+                job['progress'] = tracker.update(update)
+
+                now = time.monotonic()
+                if now - emitted >= self.interval:
+                    emitted = now
+                    self.store.save(job)
+                    self._emit_progress(job)
+
+            proc.wait()
+        finally:
+            with self._lock:
+                self._processes.pop(job['id'], None)
+
+        if job['state'] == CANCELLED:
+            return
+
+        if proc.returncode == 0:
+            job['state'] = DONE
+        else:
+            job['state'] = FAILED
+            job['error'] = ''.join(errors).strip() or \
+                f'Exit status {proc.returncode}'
+
+        self._emit_progress(job)
+
+    @staticmethod
+    def get_command(job: dict, outdir: Path) -> list:
+
+        """ Command line of `pf download` for a job """
+
+        cmd = [sys.executable, '-m', 'pathfinder', 'download', '--outdir', str(outdir)]
+
+        for param, value in job['params'].items():
+            if param in FLAGS:
+                if value:
+                    cmd.append(FLAGS[param])
+            elif value is not None:
+                cmd += [OPTIONS[param], str(value)]
+
+        if job['kind'] == 'survey':
+            cmd += ['--no_download', '--db']
+        else:
+            cmd += ['--progress']
+
+        return cmd
+
+    def _emit_state(self, job: dict) -> None:
+
+        # State changes are rare and always sent
+        for sid in list(self.subscribers.get(job['id'], ())):
+            self.socketio.emit('job_state', self.summary(job), to=sid)
+
+    def _emit_progress(self, job: dict) -> None:
+
+        for sid in list(self.subscribers.get(job['id'], ())):
+            self._send_progress(job, sid)
+
+    def _send_progress(self, job: dict, sid: str) -> None:
+
+        """ Send progress to a client, unless it has not acknowledged the
+        previous event: slow clients receive the latest progress only """
+
+        key = (sid, job['id'])
+
+        sent = self.in_flight.get(key)
+        if sent is not None and time.monotonic() - sent < self.ack_timeout:
+            return
+
+        self.in_flight[key] = time.monotonic()
+        self.socketio.emit(
+            'job_progress', self.summary(job), to=sid,
+            callback=lambda *args: self.in_flight.pop(key, None)
+        )
+
+    @staticmethod
+    def summary(job: dict) -> dict:
+
+        return {
+            key: job[key] for key in (
+                'id', 'kind', 'state', 'created', 'started',
+                'finished', 'progress', 'error'
+            )
+        }
+
+
+class ProgressTracker:
+
+    """ Aggregate progress of batches with transfer rate and ETA """
+
+    def __init__(self, window: float = 10.):
+
+        self.window = window
+        self.batches = {}
+        self.samples = []
+
+    def update(self, update: dict) -> dict:
+
+        """ Update the progress of a batch
+
+        :param update: progress of `pf download --progress`: batch,
+            files_done, files, bytes_done, bytes_total
+
+        :returns aggregate progress: files done, files, bytes done,
+            total bytes, transfer rate (bytes/s) and ETA (s)
+
+        """
+
+        self.batches[update['batch']] = update
+
+        files_done = sum(b['files_done'] for b in self.batches.values())
+        files = sum(b['files'] for b in self.batches.values())
+        bytes_done = sum(b['bytes_done'] for b in self.batches.values())
+        bytes_total = sum(
+            b['bytes_total'] or 0 for b in self.batches.values()
+        )
+
+        # Transfer rate over a sliding window of samples
+        now = time.monotonic()
+        self.samples.append((now, bytes_done))
+        while len(self.samples) > 2 and now - self.samples[0][0] > self.window:
+            self.samples.pop(0)
+
+        elapsed = now - self.samples[0][0]
+        rate = (bytes_done - self.samples[0][1]) / elapsed if elapsed > 0 else None
+
+        if rate and bytes_total > bytes_done:
+            eta = (bytes_total - bytes_done) / rate
+        else:
+            eta = None
+
+        return {
+            'files_done': files_done,
+            'files': files,
+            'bytes_done': bytes_done,
+            'bytes_total': bytes_total or None,
+            'rate': rate,
+            'eta': eta
+        }
@@ -0,0 +1,105 @@
+"""
+
+Pathfinder server load test, @esteinig
+
+Connects many concurrent Socket.IO clients to the server, sends ping events and
+reports the latency until the pong event is received by each client.
+
+    python load_test.py --url http://localhost:5000 --clients 500 --event db_ping
+
+"""
+
+import time
+import click
+import asyncio
+import socketio
+import statistics
+
+PONGS = {'server_ping': 'server_pong', 'db_ping': 'db_pong'}
+
+
+async def run_client(url: str, event: str, rounds: int, latencies: list, errors: list):
+
+    """ Connect a client and time its ping events """
+
+    client = socketio.AsyncClient(reconnection=False)
+    pong = asyncio.Event()
+
+    @client.on(PONGS[event])
+    async def on_pong(data=None):
+        pong.set()
+
+    try:
+        await client.connect(url, transports=['websocket'])
+        for _ in range(rounds):
+            pong.clear()
+            start = time.perf_counter()
+            await client.emit(event)
+            await asyncio.wait_for(pong.wait(), timeout=30)
+            latencies.append(time.perf_counter() - start)
+    except Exception as err:
+        errors.append(err)
+    finally:
+        await client.disconnect()
+
+
+async def run_clients(url, event, clients, rounds, ramp) -> (list, list, float):
+
+    latencies, errors = [], []
+
+    start = time.perf_counter()
+    tasks = []
+    for _ in range(clients):
+        tasks.append(asyncio.ensure_future(
+            run_client(url, event, rounds, latencies, errors)
+        ))
+        await asyncio.sleep(ramp/clients)
+
+    await asyncio.gather(*tasks)
+
+    return latencies, errors, time.perf_counter() - start
+
+
+@click.command()
+@click.option(
+    '--url', '-u', type=str, default='http://localhost:5000',
+    help='Server URL'
+)
+@click.option(
+    '--event', '-e', type=click.Choice(sorted(PONGS)), default='db_ping',
+    help='Ping event sent by the clients'
+)
+@click.option(
+    '--clients', '-c', type=int, default=500,
+    help='Number of concurrent clients'
+)
+@click.option(
+    '--rounds', '-r', type=int, default=10,
+    help='Number of pings sent by each client'
+)
+@click.option(
+    '--ramp', type=float, default=5.,
+    help='Seconds over which clients connect'
+)
+def main(url, event, clients, rounds, ramp):
+
+    """ Load test the Socket.IO server with concurrent clients """
+
+    latencies, errors, wall = asyncio.run(
+        run_clients(url, event, clients, rounds, ramp)
+    )
+
+    click.echo(f'{clients} clients, {len(latencies)} pings in {wall:.2f} s')
+    if latencies:
+        ms = sorted(latency * 1000 for latency in latencies)
+        click.echo(
+            f'Latency (ms): median {statistics.median(ms):.1f}, '
+            f'p95 {ms[int(0.95 * (len(ms) - 1))]:.1f}, '
+            f'p99 {ms[int(0.99 * (len(ms) - 1))]:.1f}, max {ms[-1]:.1f}'
+        )
+    if errors:
+        click.echo(f'{len(errors)} clients failed: {errors[0]!r}', err=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,39 @@
+import os
+
+# Handlers run on cooperative green threads; patch the standard library
+# before anything else imports it, so that database I/O yields to other sockets
+ASYNC_MODE = os.environ.get('PATHFINDER_ASYNC_MODE', 'eventlet')
+
+if ASYNC_MODE == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+
+import sys
 import logging
+import threading
 
-from mongoengine import connect
-from flask import Flask
+from pathlib import Path
+from flask import Flask, request
 from flask_socketio import SocketIO, emit
 
+from pathfinder.db.database import MongoAPI
+
+# Job queue module next to the server, also when the server is loaded
+# as a module by a WSGI server (e.g. gunicorn) from another directory
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from jobs import JobQueue, JobStore, QueueFull  # noqa: E402
+
 DEBUG = True
 
+# Maximum number of database and long-running calls at once
+BACKGROUND_LIMIT = int(os.environ.get('PATHFINDER_BACKGROUND_LIMIT', 50))
+
 app = Flask(__name__)
 app.config.from_object(__name__)
 
 
-socketio = SocketIO(app, host='0.0.0.0', port=5000)
+socketio = SocketIO(app, async_mode=ASYNC_MODE, cors_allowed_origins='*')
 
 logging.basicConfig(
     level=logging.INFO,
@@ -20,6 +43,57 @@ logging.basicConfig(
 
 log = logging.getLogger(__name__)
 
+# One pooled database client, shared by all handlers
+db = MongoAPI()
+
+background_slots = threading.BoundedSemaphore(BACKGROUND_LIMIT)
+
+# Survey and download jobs, persisted across restarts
+JOBS_DIR = Path(
+    os.environ.get('PATHFINDER_JOBS', Path.home() / '.pathfinder' / 'jobs')
+)
+
+jobs = JobQueue(
+    socketio,
+    store=JobStore(JOBS_DIR / 'jobs.db'),
+    outdir=JOBS_DIR,
+    workers=int(os.environ.get('PATHFINDER_JOB_WORKERS', 2)),
+    max_queued=int(os.environ.get('PATHFINDER_JOB_QUEUE', 20))
+)
+
+# Workers start with the app, whichever server runs it
+jobs.start()
+
+
+def submit(event: str, func, *args):
+
+    """ Run a blocking call in the background and emit its result
+
+    The handler returns immediately; the result of the call is emitted
+    to the client that sent the event, so that slow calls do not stall
+    other sockets.
+
+    :param event: event emitted to the client with the result
+    :param func: blocking call returning the event data
+    :param args: arguments of the call
+
+    """
+
+    sid = request.sid
+
+    def task():
+        with background_slots:
+            try:
+                data = func(*args)
+            except Exception as err:
+                log.exception(f'Background call for {event} failed.')
+                data = {'error': str(err)}
+
+        socketio.emit(event, data, to=sid)
+
+    socketio.start_background_task(task)
+
+
 # SocketIO response functions
 
 log.info('Server log started, logging operations.')
@@ -39,17 +113,79 @@ def server_ping():
 @socketio.on('db_ping')
 def db_ping():
     log.info('Database ping received from client.')
-    client = connect(
-        host='mongodb://localhost:27017/'
-    )
-    log.info(
-        client.server_info()
-    )
-    emit(
-        'db_pong', {'data': 'Database ping received. Connected'}
-    )
-    log.info('Database pong emitted to client.')
+    submit('db_pong', ping_database)
+
+
+def ping_database() -> dict:
+
+    connected = db.is_connected()
+    if connected:
+        log.info('Database pong emitted to client.')
+        data = 'Database ping received. Connected'
+    else:
+        log.info('Database not connected, pong emitted to client.')
+        data = 'Database ping received. Not connected'
+
+    return {'data': data, 'connected': connected}
+
+
+# job sockets
+
+@socketio.on('job_submit')
+def job_submit(data):
+    log.info(f'Job submitted by client: {data}')
+    try:
+        job = jobs.submit(kind=data.get('kind'), params=data.get('params', {}))
+    except (ValueError, QueueFull) as err:
+        emit('job_error', {'error': str(err)})
+        return
+
+    jobs.subscribe(request.sid, job['id'])
+    emit('job_submitted', jobs.summary(job))
+
+
+@socketio.on('job_subscribe')
+def job_subscribe(data):
+    try:
+        job = jobs.subscribe(request.sid, data['id'])
+    except KeyError:
+        emit('job_error', {'error': f'Job not found: {data.get("id")}'})
+        return
+
+    emit('job_state', jobs.summary(job))
+
+
+@socketio.on('job_unsubscribe')
+def job_unsubscribe(data):
+    jobs.unsubscribe(request.sid, data.get('id'))
+
+
+@socketio.on('job_cancel')
+def job_cancel(data):
+    try:
+        job = jobs.cancel(data['id'])
+    except KeyError:
+        emit('job_error', {'error': f'Job not found: {data.get("id")}'})
+        return
+
+    log.info(f'Job cancelled by client: {job["id"]}')
+
+
+@socketio.on('job_list')
+def job_list():
+    emit('job_list', {
+        'jobs': [jobs.summary(job) for job in jobs.jobs.values()]
+    })
+
+
+@socketio.on('disconnect')
+def disconnect(*args):
+    jobs.unsubscribe(request.sid)
 
 
 if __name__ == "__main__":
-    socketio.run(app)
\ No newline at end of file
+    socketio.run(
+        app,
+        host=os.environ.get('PATHFINDER_HOST', '0.0.0.0'),
+        port=int(os.environ.get('PATHFINDER_PORT', 5000))
+    )
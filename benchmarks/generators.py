@@ -0,0 +1,365 @@
+"""
+
+Pathfinder benchmark generators, @esteinig
+
+Deterministic synthetic data for benchmarks of pathfinder hot paths: ENA warehouse
+query results, FASTA alignments, dated Newick trees, clock estimator outputs, SNP
+distance edge lists and gzipped FASTQ read files.
+
+"""
+
+import numpy
+import pandas
+
+from pathlib import Path
+
+ENA_FIELDS = [
+    'run_accession', 'tax_id', 'fastq_ftp', 'fastq_bytes', 'fastq_md5',
+    'read_count', 'base_count', 'instrument_platform', 'instrument_model',
+    'library_layout', 'library_source', 'library_strategy',
+    'sample_accession', 'study_accession', 'submitted_ftp',
+    'submitted_bytes', 'submitted_md5'
+]
+
+TAX_IDS = numpy.array([1280, 1281, 46170, 1282, 1283, 1290])
+GENOME_SIZES = numpy.array([2.8, 2.9, 2.8, 2.5, 2.6, 2.7])
+
+
+def ena_table(runs: int, seed: int = 0) -> pandas.DataFrame:
+
+    """ Synthetic ENA warehouse query results
+
+    Mostly paired-end runs with two links, including runs with one or three
+    links, single-end runs, missing links and missing counts.
+
+    :param runs: number of runs
+    :param seed: seed of the random number generator
+
+    :returns DataFrame with the ENA warehouse fields of `Survey.url_fields`
+
+    """
+
+    rng = numpy.random.default_rng(seed)
+
+    accessions = numpy.char.add('ERR', numpy.arange(runs).astype(str))
+    layout = rng.choice(['PAIRED', 'SINGLE'], runs, p=[0.9, 0.1])
+    links = numpy.where(
+        layout == 'PAIRED', rng.choice([1, 2, 3], runs, p=[0.02, 0.95, 0.03]), 1
+    )
+
+    ftp, sizes, checksums = [], [], []
+    for accession, n, file_sizes, digests in zip(
+        accessions, links,
+        rng.integers(10**7, 10**9, (runs, 3)),
+        rng.integers(0, 2**63, (runs, 3))
+    ):
+        path = f'ftp.sra.ebi.ac.uk/vol1/fastq/{accession[:6]}/{accession}'
+        if n == 1:
+            names = [f'{path}/{accession}.fastq.gz']
+        else:
+            names = [f'{path}/{accession}.fastq.gz'] * (n - 2) + [
+                f'{path}/{accession}_{i}.fastq.gz' for i in (1, 2)
+            ]
+        ftp.append(';'.join(names))
+        sizes.append(';'.join(str(size) for size in file_sizes[:n]))
+        checksums.append(';'.join(f'{digest:032x}' for digest in digests[:n]))
+
+    bases = rng.integers(10**8, 10**9, runs).astype(float)
+    reads = numpy.floor(bases / 250)
+
+    df = pandas.DataFrame({
+        'run_accession': accessions,
+        'tax_id': rng.choice(TAX_IDS, runs),
+        'fastq_ftp': ftp,
+        'fastq_bytes': sizes,
+        'fastq_md5': checksums,
+        'read_count': reads,
+        'base_count': bases,
+        'instrument_platform': 'ILLUMINA',
+        'instrument_model': rng.choice(
+            ['Illumina HiSeq 2500', 'Illumina MiSeq', 'NextSeq 500'], runs
+        ),
+        'library_layout': layout,
+        'library_source': 'GENOMIC',
+        'library_strategy': 'WGS',
+        'sample_accession': numpy.char.add('SAMEA', numpy.arange(runs).astype(str)),
+        'study_accession': numpy.char.add(
+            'PRJEB', rng.integers(1000, 1100, runs).astype(str)
+        ),
+        'submitted_ftp': numpy.nan,
+        'submitted_bytes': numpy.nan,
+        'submitted_md5': numpy.nan
+    }, columns=ENA_FIELDS)
+
+    df.loc[rng.random(runs) < 0.01, 'fastq_ftp'] = numpy.nan
+    df.loc[rng.random(runs) < 0.01, ['read_count', 'base_count']] = numpy.nan
+
+    return df
+
+
+def write_ena_table(path: Path, runs: int, seed: int = 0) -> Path:
+
+    """ Write synthetic ENA warehouse query results as returned by ENA (.tsv) """
+
+    ena_table(runs=runs, seed=seed).to_csv(path, sep='\t', index=False)
+
+    return Path(path)
+
+
+def genome_sizes() -> pandas.DataFrame:
+
+    """ Genome sizes (Mbp) of the taxonomic identifiers in `ena_table` """
+
+    return pandas.DataFrame(
+        {'size': GENOME_SIZES}, index=pandas.Index(TAX_IDS, name='taxid')
+    )
+
+
+def query_table(runs: int, seed: int = 0) -> pandas.DataFrame:
+
+    """ Synthetic sanitized query results for `Survey.batch`
+
+    :param runs: number of runs
+    :param seed: seed of the random number generator
+
+    :returns DataFrame with columns: size (MB), bases
+
+    """
+
+    rng = numpy.random.default_rng(seed)
+
+    size = rng.lognormal(mean=6, sigma=0.8, size=runs)
+
+    return pandas.DataFrame(
+        {
+            'size': size,
+            'bases': numpy.floor(size * 1024**2 * rng.uniform(1.5, 2.5, runs))
+        },
+        index=numpy.char.add('ERR', numpy.arange(runs).astype(str))
+    )
+
+
+def fasta_alignment(
+    path: Path,
+    samples: int,
+    length: int,
+    seed: int = 0,
+    snp_rate: float = 0.01,
+    line_width: int = None,
+    reference: bool = True
+) -> Path:
+
+    """ Write a random core alignment in FASTA format
+
+    Samples are mutated copies of a random reference sequence with
+    substitutions, missing (N) and gap (-) sites.
+
+    :param path: output file path
+    :param samples: number of sample sequences
+    :param length: alignment length
+    :param seed: seed of the random number generator
+    :param snp_rate: proportion of variable sites
+    :param line_width: wrap sequences at line width, unwrapped if None
+    :param reference: include the reference sequence named 'Reference'
+
+    :returns output file path
+
+    """
+
+    rng = numpy.random.default_rng(seed)
+    alphabet = numpy.frombuffer(b'ACGTN-', dtype=numpy.uint8)
+
+    ref = alphabet[rng.integers(0, 4, length)]
+    variable = numpy.flatnonzero(rng.random(length) < snp_rate)
+
+    def write(handle, name, sequence):
+        handle.write(f'>{name}\n'.encode())
+        sequence = sequence.tobytes()
+        if line_width:
+            for i in range(0, len(sequence), line_width):
+                handle.write(sequence[i:i+line_width] + b'\n')
+        else:
+            handle.write(sequence + b'\n')
+
+    with Path(path).open('wb') as handle:
+        if reference:
+            write(handle, 'Reference', ref)
+
+        for i in range(samples):
+            sequence = ref.copy()
+            sequence[variable] = alphabet[
+                rng.choice(6, variable.size, p=[.24, .24, .24, .24, .02, .02])
+            ]
+            write(handle, f'sample_{i}', sequence)
+
+    return Path(path)
+
+
+def newick_tree(
+    path: Path,
+    tips: int,
+    seed: int = 0,
+    start: float = 1990.,
+    end: float = 2020.
+) -> Path:
+
+    """ Write a random binary tree with dated tips in Newick format
+
+    Random pairs of lineages are joined until one lineage remains, with
+    exponential branch lengths. Tip labels are `sample{i}_{date}`, read as
+    `sample{i} {date}` by Newick parsers that convert underscores to spaces.
+
+    :param path: output file path
+    :param tips: number of tips
+    :param seed: seed of the random number generator
+    :param start: earliest tip date
+    :param end: latest tip date
+
+    :returns output file path
+
+    """
+
+    rng = numpy.random.default_rng(seed)
+
+    dates = rng.uniform(start, end, tips)
+    lineages = [f'sample{i}_{date:.3f}' for i, date in enumerate(dates)]
+
+    lengths = iter(rng.exponential(0.001, 2*tips))
+    while len(lineages) > 1:
+        i, j = rng.choice(len(lineages), 2, replace=False)
+        joined = f'({lineages[i]}:{next(lengths):.6f},' \
+                 f'{lineages[j]}:{next(lengths):.6f})'
+        # Swap with last lineages to remove in constant time:
+        for k in sorted((i, j), reverse=True):
+            lineages[k] = lineages[-1]
+            lineages.pop()
+        lineages.append(joined)
+
+    Path(path).write_text(lineages[0] + ';\n')
+
+    return Path(path)
+
+
+def date_file(path: Path, tips: int, seed: int = 0) -> Path:
+
+    """ Write a tab-delimited date file for the tips of `newick_tree`
+
+    :param path: output file path
+    :param tips: number of tips
+    :param seed: seed of the random number generator, as for the tree
+
+    :returns output file path
+
+    """
+
+    rng = numpy.random.default_rng(seed)
+
+    pandas.DataFrame({
+        'name': [f'sample{i}' for i in range(tips)],
+        'date': numpy.round(rng.uniform(1990., 2020., tips), 3)
+    }).to_csv(path, sep='\t', index=False)
+
+    return Path(path)
+
+
+def lsd2_output(path: Path, seed: int = 0) -> Path:
+
+    """ Write a fake result file of lsd2 with rate and TMRCA estimates
+
+    :param path: output file path
+    :param seed: seed of the random number generator
+
+    :returns output file path
+
+    """
+
+    rng = numpy.random.default_rng(seed)
+
+    rate = rng.lognormal(numpy.log(1e-6), 0.5)
+    tmrca = rng.uniform(1950, 1990)
+
+    Path(path).write_text(
+        'LSD2 - Least-Squares methods to estimate rates and Dates\n\n'
+        'Reading the tree 1 ...\n'
+        'Parameter to adjust variances was set to 0.0001 (settable via option -b)\n'
+        'Minimum branch length of time scaled tree (settable via option -u and -U): 0\n\n'
+        'TREE 1\n'
+        '*PROCESSING:\n'
+        'Estimating the root position on all branches using fast method ...\n'
+        'Computing confidence intervals using sequence length 1000 and '
+        'a lognormal relaxed clock with mean 1, standard deviation 0.2 '
+        '(settable via option -q)\n'
+        '*RESULTS:\n'
+        f' rate {rate:.6e}, tMRCA {tmrca:.3f}, objective function 0.0123\n'
+        '\nTOTAL ELAPSED TIME: 0.0128 seconds\n'
+    )
+
+    return Path(path)
+
+
+def distance_edges(
+    path: Path,
+    samples: int,
+    edges_per_sample: int = 10,
+    max_distance: int = 50,
+    seed: int = 0
+) -> Path:
+
+    """ Write a random SNP distance edge list as from `snp-distances -t`
+
+    :param path: output file path
+    :param samples: number of samples
+    :param edges_per_sample: average number of edges of a sample
+    :param max_distance: maximum distance of edges
+    :param seed: seed of the random number generator
+
+    :returns output file path
+
+    """
+
+    rng = numpy.random.default_rng(seed)
+
+    edges = samples * edges_per_sample // 2
+    i = rng.integers(0, samples, edges)
+    j = rng.integers(0, samples, edges)
+    keep = i < j
+
+    pandas.DataFrame({
+        'sample1': [f'sample{k}' for k in i[keep]],
+        'sample2': [f'sample{k}' for k in j[keep]],
+        'distance': rng.integers(0, max_distance + 1, keep.sum())
+    }).to_csv(path, sep='\t', index=False)
+
+    return Path(path)
+
+
+def fastq_file(path: Path, reads: int, length: int = 150, seed: int = 0) -> Path:
+
+    """ Write random reads to a multi-member gzipped FASTQ file, as from the ENA
+
+    :param path: output file path (.fastq.gz)
+    :param reads: number of reads
+    :param length: maximum read length, reads are 50 - 100% of it
+    :param seed: seed of the random number generator
+
+    :returns output file path
+
+    """
+
+    import gzip
+
+    rng = numpy.random.default_rng(seed)
+    letters = numpy.frombuffer(b'ACGT', dtype=numpy.uint8)
+
+    with Path(path).open('wb') as outfile:
+        for start in range(0, reads, 10000):
+            records = []
+            for i in range(start, min(start + 10000, reads)):
+                size = int(rng.integers(length // 2, length + 1))
+                sequence = letters[rng.integers(0, 4, size)].tobytes()
+                records.append(
+                    b'@read%d\n%s\n+\n%s\n' % (i, sequence, b'I' * size)
+                )
+            outfile.write(gzip.compress(b''.join(records), compresslevel=1))
+
+    return Path(path)
@@ -0,0 +1,103 @@
+"""
+
+Pathfinder import-time benchmark, @esteinig
+
+Measures the startup import time of the command-line client with `python -X importtime`
+and fails if it exceeds the time budget or imports heavy dependencies at startup.
+
+    python benchmarks/import_time.py --budget 200 --repeats 5
+
+"""
+
+import re
+import sys
+import click
+import subprocess
+
+# Modules imported at startup, with their import time budget in milliseconds
+BUDGETS = {
+    'pathfinder.terminal.client': 200,
+    'pathfinder.utils': 100
+}
+
+# Dependencies that must only be imported by the subcommands that need them
+HEAVY = (
+    'pandas', 'numpy', 'matplotlib', 'sklearn', 'scipy',
+    'seaborn', 'dendropy', 'pysam', 'pymongo', 'mongoengine', 'tqdm'
+)
+
+IMPORT_TIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$')
+
+
+def import_time(module: str) -> (float, set):
+
+    """ Import a module in a fresh interpreter with `-X importtime`
+
+    :param module: module to import
+
+    :returns cumulative import time of the module in milliseconds
+        and the names of all modules imported
+
+    """
+
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True, check=True
+    )
+
+    cumulative, imported = None, set()
+    for line in proc.stderr.splitlines():
+        match = IMPORT_TIME.match(line)
+        if match:
+            name = match.group(4)
+            imported.add(name)
+            if name == module:
+                cumulative = int(match.group(2))/1000
+
+    return cumulative, imported
+
+
+@click.command()
+@click.option(
+    '--budget', '-b', type=float, default=None,
+    help='Import time budget of the client in milliseconds [200]'
+)
+@click.option(
+    '--repeats', '-r', type=int, default=5,
+    help='Number of imports per module, the fastest is reported'
+)
+def main(budget, repeats):
+
+    """ Benchmark the import time of the command-line client """
+
+    budgets = dict(BUDGETS)
+    if budget is not None:
+        budgets['pathfinder.terminal.client'] = budget
+
+    failed = False
+    for module, limit in budgets.items():
+        times, imported = [], set()
+        for _ in range(repeats):
+            elapsed, modules = import_time(module)
+            times.append(elapsed)
+            imported |= modules
+
+        fastest = min(times)
+        heavy = sorted(name for name in imported if name in HEAVY)
+
+        status = 'ok'
+        if fastest > limit or heavy:
+            status, failed = 'FAILED', True
+
+        print(
+            f'{module:<32} {fastest:>8.1f} ms  (budget {limit:.0f} ms)  {status}'
+        )
+        if heavy:
+            print(f'    heavy imports at startup: {", ".join(heavy)}')
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
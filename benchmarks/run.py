@@ -0,0 +1,506 @@
+"""
+
+Pathfinder benchmark runner, @esteinig
+
+Times the hot paths of pathfinder on deterministic synthetic data at several scales,
+measures their peak memory with `tracemalloc` and saves the results as JSON. Results
+of a previous release can be compared against to catch regressions before deploying:
+
+    python benchmarks/run.py --scale small --scale medium --output results.json
+    python benchmarks/run.py --compare results.json --tolerance 0.25
+
+"""
+
+import sys
+import json
+import time
+import click
+import platform
+import tempfile
+import statistics
+import subprocess
+import tracemalloc
+
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks import generators  # noqa: E402
+
+SCALES = ('small', 'medium', 'large')
+
+# Registry of benchmarks: name -> (setup function, sizes by scale)
+BENCHMARKS = {}
+
+
+def benchmark(**sizes):
+
+    """ Register a benchmark with its problem size at each scale
+
+    The decorated function receives a working directory and the problem size,
+    generates its input data and returns the function to benchmark.
+
+    """
+
+    def register(setup):
+        BENCHMARKS[setup.__name__] = (setup, sizes)
+        return setup
+
+    return register
+
+
+@benchmark(small=1000, medium=10000, large=100000)
+def sanitize(workdir: Path, runs: int):
+
+    """ ENA query results (runs) -> sanitized query results """
+
+    from pathfinder.survey import Survey
+    from pathfinder.genomes import GenomeSizes
+
+    df = generators.ena_table(runs)
+    genome_sizes = generators.genome_sizes()
+    genome_sizes = GenomeSizes(genome_sizes.index, genome_sizes['size'])
+
+    def run():
+        with mock.patch(
+            'pathfinder.survey.get_genome_size_lookup',
+            return_value=genome_sizes
+        ):
+            Survey._sanitize_ena_query(df, url='', submitted_fastq=False)
+
+    return run
+
+
+@benchmark(small=1000, medium=10000, large=100000)
+def batch(workdir: Path, runs: int):
+
+    """ Query results (runs) -> balanced batches of at most 50 GB """
+
+    from pathfinder.survey import Survey
+
+    survey = Survey(outdir=workdir)
+    query = generators.query_table(runs)
+
+    def run():
+        survey.batch(query=query, max_gb=50, balance=True)
+
+    return run
+
+
+@benchmark(small=1000, medium=10000, large=50000)
+def manifest(workdir: Path, files: int):
+
+    """ Read files -> download manifest registration, status and summary """
+
+    from pathfinder.manifest import Manifest
+
+    records = [
+        {
+            'file': workdir / 'batch' / f'ERR{i // 2}_{i % 2 + 1}.fastq.gz',
+            'run': f'ERR{i // 2}', 'batch': 'batch', 'address': f'ERR{i}',
+            'size': 1024**2, 'md5': f'{i:032x}'
+        } for i in range(files)
+    ]
+
+    def run():
+        db = Manifest(workdir / 'manifest.db')
+        db.register(records)
+        db.get_status([record['file'] for record in records])
+        db.summary()
+        db.close()
+
+    return run
+
+
+@benchmark(small=10000, medium=100000, large=1000000)
+def fastq_stats(workdir: Path, reads: int):
+
+    """ Gzipped FASTQ chunks (reads x 75-150 bp) -> read and base counts """
+
+    from pathfinder.fastq import FastqStats
+
+    fastq = generators.fastq_file(workdir / 'reads.fastq.gz', reads=reads)
+    data = fastq.read_bytes()
+
+    def run():
+        stats = FastqStats()
+        for start in range(0, len(data), 1024*1024):
+            stats.update(data[start:start+1024*1024])
+        stats.finish()
+
+    return run
+
+
+@benchmark(small=20, medium=100, large=500)
+def failover(workdir: Path, files: int):
+
+    """ Read files (10k reads) -> failed Aspera, failover to HTTP with failures """
+
+    import pandas
+
+    from benchmarks.server import TransferServer
+    from pathfinder.survey import MiniAspera
+
+    reads = workdir / 'reads'
+    reads.mkdir()
+    fastq = generators.fastq_file(workdir / 'reads.fastq.gz', reads=10000)
+    data = fastq.read_bytes()
+    for i in range(files):
+        (reads / f'ERR{i}_1.fastq.gz').write_bytes(data)
+
+    server = TransferServer(reads, failures=0.2, seed=0).start()
+
+    batch_csv = workdir / 'batch.csv'
+    pandas.DataFrame({
+        'ftp_1': [f'{server.url}/ERR{i}_1.fastq.gz' for i in range(files)],
+        'ftp_2': [None] * files, 'size': [1.] * files
+    }).to_csv(batch_csv, index=False)
+
+    def run():
+        outdir = Path(tempfile.mkdtemp(dir=workdir))
+        ascp = MiniAspera(ascp='false', aspera_retries=1)
+        ascp.transfer.backoff = 0.
+        ascp.download_batch(
+            file=batch_csv, outdir=outdir, workers=4,
+            progress=lambda *args: None
+        )
+
+    return run
+
+
+@benchmark(small=100, medium=1000, large=5000)
+def remove_sample(workdir: Path, samples: int):
+
+    """ Alignment (samples x 100 kbp) -> alignment without reference """
+
+    from pathfinder.utils import remove_sample
+
+    alignment = generators.fasta_alignment(
+        workdir / 'alignment.fasta', samples=samples, length=100000
+    )
+    outfile = workdir / 'alignment.filtered.fasta'
+
+    def run():
+        remove_sample(alignment, outfile, remove=['Reference'])
+
+    return run
+
+
+@benchmark(small=100, medium=1000, large=5000)
+def variant_sites(workdir: Path, samples: int):
+
+    """ Alignment (samples x 100 kbp) -> variant sites and constant site counts """
+
+    from pathfinder.utils import phybeast_variant_sites
+
+    alignment = generators.fasta_alignment(
+        workdir / 'alignment.fasta', samples=samples, length=100000
+    )
+
+    def run():
+        phybeast_variant_sites(
+            alignment, workdir / 'snps.fasta', workdir / 'constant.txt'
+        )
+
+    return run
+
+
+@benchmark(small=100, medium=1000, large=5000)
+def snp_distances(workdir: Path, samples: int):
+
+    """ Alignment (samples x 100 kbp) -> pairwise SNP distance matrix """
+
+    from pathfinder.utils import phybeast_snp_distances
+
+    alignment = generators.fasta_alignment(
+        workdir / 'alignment.fasta', samples=samples, length=100000
+    )
+
+    def run():
+        phybeast_snp_distances(alignment, workdir / 'distances.npy', workers=4)
+
+    return run
+
+
+@benchmark(small=1000, medium=10000, large=20000)
+def clusters(workdir: Path, samples: int):
+
+    """ SNP distance edge list (samples x 10 edges) -> clusters at 10 thresholds """
+
+    from pathfinder.utils import phybeast_clusters
+
+    edges = generators.distance_edges(workdir / 'edges.tsv', samples=samples)
+    output = workdir / 'clusters.tsv'
+
+    def run():
+        phybeast_clusters(edges, thresholds=range(0, 50, 5), output_file=output)
+
+    return run
+
+
+@benchmark(small=1000, medium=10000, large=100000)
+def randomise_dates(workdir: Path, tips: int):
+
+    """ Date file (tips) -> 100 replicates of randomised dates """
+
+    from pathfinder.utils import phybeast_randomise_date_file
+
+    date_file = generators.date_file(workdir / 'dates.tab', tips=tips)
+    output_file = workdir / 'replicates.tab'
+
+    def run():
+        phybeast_randomise_date_file(
+            date_file, output_file, replicates=100, seed=0, long=True
+        )
+
+    return run
+
+
+@benchmark(small=1000, medium=10000, large=50000)
+def tree_dates(workdir: Path, tips: int):
+
+    """ Newick tree (tips) -> tip names and dates """
+
+    from pathfinder.utils import get_tree_dates
+
+    tree = generators.newick_tree(workdir / 'tree.newick', tips=tips)
+
+    def run():
+        get_tree_dates(tree)
+
+    return run
+
+
+@benchmark(small=1000, medium=10000, large=50000)
+def tree_dates_dendropy(workdir: Path, tips: int):
+
+    """ Newick tree (tips) -> tip names and dates, with a DendroPy tree """
+
+    import dendropy
+    import pandas
+
+    tree = generators.newick_tree(workdir / 'tree.newick', tips=tips)
+
+    def run():
+        taxa = dendropy.Tree.get(path=tree, schema='newick').taxon_namespace
+        pandas.DataFrame(
+            data=[taxon.label.split() for taxon in taxa], columns=['name', 'date']
+        )
+
+    return run
+
+
+@benchmark(small=1000, medium=10000, large=100000)
+def root_to_tip(workdir: Path, tips: int):
+
+    """ Newick tree (tips) -> rerooted root-to-tip regression data (rtt.csv) """
+
+    from pathfinder.utils import phybeast_root_to_tip
+
+    tree = generators.newick_tree(workdir / 'tree.newick', tips=tips)
+
+    def run():
+        phybeast_root_to_tip(tree, output_file=workdir / 'rtt.csv')
+
+    return run
+
+
+@benchmark(small=100, medium=1000, large=10000)
+def extract_rate(workdir: Path, replicates: int):
+
+    """ LSD2 result files (replicates) -> rates and TMRCA """
+
+    from pathfinder.utils import phybeast_extract_rate
+
+    result_files = [
+        generators.lsd2_output(workdir / f'lsd2.{i}.txt', seed=i)
+        for i in range(replicates)
+    ]
+    output_file = workdir / 'rate.txt'
+
+    def run():
+        for result_file in result_files:
+            phybeast_extract_rate(
+                result_file, prep='lsd2', output_file=output_file
+            )
+
+    return run
+
+
+@benchmark(small=100, medium=1000, large=10000)
+def aggregate_rates(workdir: Path, replicates: int):
+
+    """ LSD2 result files (replicates) -> table of rates and TMRCA """
+
+    from pathfinder.utils import phybeast_aggregate_rates
+
+    for i in range(replicates):
+        generators.lsd2_output(workdir / f'clock.{i}.txt', seed=i)
+    output_file = workdir / 'rates.tab'
+
+    def run():
+        phybeast_aggregate_rates(
+            workdir, prep='lsd2', output_file=output_file, pattern='clock.*.txt'
+        )
+
+    return run
+
+
+def measure(run, repeats: int = 3) -> dict:
+
+    """ Time a function and measure its peak memory
+
+    Timings are taken without tracing; peak memory is measured in an
+    additional run with `tracemalloc`, which slows down allocations.
+
+    :param run: function to benchmark
+    :param repeats: number of timed runs
+
+    :returns dictionary of minimum and median time (s) and peak memory (MB)
+
+    """
+
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'time': min(times),
+        'time_median': statistics.median(times),
+        'memory': peak / 1024**2,
+        'repeats': repeats
+    }
+
+
+def get_environment() -> dict:
+
+    """ Describe the environment of a benchmark run """
+
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            universal_newlines=True, cwd=Path(__file__).parent
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+
+    """ Compare benchmark results against the results of a baseline
+
+    :param results: benchmark results: {benchmark: {scale: measures}}
+    :param baseline: benchmark results of the baseline
+    :param tolerance: relative increase in time or memory tolerated
+
+    :returns list of regressions: (benchmark, scale, quantity, baseline, result)
+
+    """
+
+    regressions = []
+    for name, scales in results.items():
+        for scale, result in scales.items():
+            base = baseline.get(name, {}).get(scale)
+            if base is None or base['size'] != result['size']:
+                continue
+            for quantity in ('time', 'memory'):
+                if result[quantity] > base[quantity] * (1 + tolerance):
+                    regressions.append(
+                        (name, scale, quantity, base[quantity], result[quantity])
+                    )
+
+    return regressions
+
+
+@click.command()
+@click.option(
+    '--benchmark', '-b', type=click.Choice(sorted(BENCHMARKS)), multiple=True,
+    help='Benchmarks to run, can be specified multiple times [all]'
+)
+@click.option(
+    '--scale', '-s', type=click.Choice(SCALES), multiple=True,
+    help='Scales to run, can be specified multiple times [small, medium]'
+)
+@click.option(
+    '--repeats', '-r', type=int, default=3,
+    help='Number of timed runs per benchmark, the fastest is reported'
+)
+@click.option(
+    '--output', '-o', type=Path, default=None,
+    help='Output file for benchmark results (.json)'
+)
+@click.option(
+    '--compare', '-c', 'baseline', type=Path, default=None,
+    help='Benchmark results of a baseline to compare against (.json)'
+)
+@click.option(
+    '--tolerance', '-t', type=float, default=0.2,
+    help='Relative increase in time or memory tolerated against baseline'
+)
+def main(benchmark, scale, repeats, output, baseline, tolerance):
+
+    """ Benchmark the hot paths of pathfinder on synthetic data """
+
+    names = benchmark or sorted(BENCHMARKS)
+    scales = scale or ('small', 'medium')
+
+    results = {}
+    for name in names:
+        setup, sizes = BENCHMARKS[name]
+        results[name] = {}
+        for s in scales:
+            with tempfile.TemporaryDirectory() as workdir:
+                run = setup(Path(workdir), sizes[s])
+                result = measure(run, repeats=repeats)
+
+            result['size'] = sizes[s]
+            results[name][s] = result
+
+            click.echo(
+                f'{name:<16} {s:<7} {sizes[s]:>8} '
+                f'{result["time"]:>10.4f} s {result["memory"]:>10.2f} MB'
+            )
+
+    if output:
+        with output.open('w') as outfile:
+            json.dump(
+                {'environment': get_environment(), 'results': results},
+                outfile, indent=2
+            )
+
+    if baseline:
+        with baseline.open('r') as infile:
+            base = json.load(infile)['results']
+
+        regressions = compare(results, base, tolerance)
+        for name, s, quantity, before, after in regressions:
+            click.echo(
+                f'Regression in {name} ({s}): {quantity} '
+                f'{before:.4f} -> {after:.4f} (+{after/before - 1:.0%})',
+                err=True
+            )
+
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
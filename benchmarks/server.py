@@ -0,0 +1,198 @@
+"""
+
+Pathfinder stand-in transfer server, @esteinig
+
+Local HTTP server standing in for the ENA file servers, to exercise read file
+transfers without network access: files of a directory are served with byte range
+requests (resume), a bandwidth limit per connection and randomly injected failures
+(errors before and connections dropped during responses), so that throttling,
+retries and failover to FTP of `MiniAspera` can be run against it:
+
+    python benchmarks/server.py --directory reads/ --rate 10 --failures 0.2
+
+"""
+
+import re
+import sys
+import time
+import click
+import random
+import threading
+
+from pathlib import Path
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+
+
+class TransferServer(ThreadingMixIn, HTTPServer):
+
+    """ HTTP file server with bandwidth limit and injected failures """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        directory: Path,
+        port: int = 0,
+        rate: float = None,
+        failures: float = 0.,
+        seed: int = 0
+    ):
+
+        """ Transfer server
+
+        :param directory: directory of files to serve
+        :param port: port on localhost, any free port if 0
+        :param rate: bandwidth of each connection in Mbit/s, unlimited if None
+        :param failures: probability of a request to fail, either with
+            an error response or a connection dropped during the response
+        :param seed: seed of the random number generator of failures
+
+        """
+
+        self.directory = Path(directory)
+        self.rate = rate
+        self.failures = failures
+
+        self.requests = 0
+        self.failed = 0
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        super().__init__(('127.0.0.1', port), TransferHandler)
+
+    @property
+    def url(self) -> str:
+
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def fail(self) -> str or None:
+
+        """ Draw the failure of a request: None, 'error' or 'drop' """
+
+        with self._lock:
+            self.requests += 1
+            if self._random.random() >= self.failures:
+                return None
+            self.failed += 1
+            return self._random.choice(('error', 'drop'))
+
+    def start(self) -> 'TransferServer':
+
+        """ Serve requests in a background thread """
+
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+        return self
+
+    def stop(self) -> None:
+
+        self.shutdown()
+        self.server_close()
+
+
+class TransferHandler(BaseHTTPRequestHandler):
+
+    """ File requests with byte ranges, bandwidth limit and failures """
+
+    protocol_version = 'HTTP/1.0'
+    chunk_size = 64*1024
+
+    def do_GET(self):
+
+        file = self.server.directory / self.path.lstrip('/').split('?')[0]
+        if not file.is_file():
+            self.send_error(404)
+            return
+
+        failure = self.server.fail()
+        if failure == 'error':
+            self.send_error(503)
+            return
+
+        size = file.stat().st_size
+        start = 0
+
+        match = re.match(r'bytes=(\d+)-$', self.headers.get('Range', ''))
+        if match:
+            start = int(match.group(1))
+            if start >= size:
+                self.send_error(416)
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{size-1}/{size}')
+        else:
+            self.send_response(200)
+
+        self.send_header('Content-Length', str(size - start))
+        self.end_headers()
+
+        # Drop the connection halfway through the response:
+        stop = size
+        if failure == 'drop':
+            stop = start + (size - start) // 2
+
+        clock = time.monotonic()
+        sent = 0
+        with file.open('rb') as infile:
+            infile.seek(start)
+            while start + sent < stop:
+                chunk = infile.read(min(self.chunk_size, stop - start - sent))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                sent += len(chunk)
+
+                if self.server.rate:
+                    due = clock + sent * 8 / (self.server.rate * 1e6)
+                    wait = due - time.monotonic()
+                    if wait > 0:
+                        time.sleep(wait)
+
+        if failure == 'drop':
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+
+        pass
+
+
+@click.command()
+@click.option(
+    '--directory', '-d', type=Path, default=Path('.'),
+    help='Directory of files to serve'
+)
+@click.option(
+    '--port', '-p', type=int, default=8000,
+    help='Port on localhost'
+)
+@click.option(
+    '--rate', '-r', type=float, default=None,
+    help='Bandwidth of each connection in Mbit/s [unlimited]'
+)
+@click.option(
+    '--failures', '-f', type=float, default=0.,
+    help='Probability of a request to fail with an error or dropped connection'
+)
+@click.option(
+    '--seed', '-s', type=int, default=0,
+    help='Seed of injected failures'
+)
+def main(directory, port, rate, failures, seed):
+
+    """ Serve files with bandwidth limit and injected failures """
+
+    server = TransferServer(
+        directory, port=port, rate=rate, failures=failures, seed=seed
+    )
+    click.echo(f'Serving {directory} at {server.url}', err=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+        sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -214,11 +214,12 @@ process Gubbins {
   file(core_alignment) from recombination
 
   output:
-  file("core.alignment.recombination.fasta") into (phylogeny, clock_align, tree_align, reg_align, rep_align)
+  file("core.alignment.recombination.fasta") into (phylogeny, clock_align, tree_align, rep_align)
 
   """
   run_gubbins.py -p gubbins --threads $task.cpus $core_alignment
-  snp-sites -c gubbins.filtered_polymorphic_sites.fasta > core.alignment.recombination.fasta
+  pathfinder phybeast utils variant-sites -a gubbins.filtered_polymorphic_sites.fasta --acgt \
+  -o core.alignment.recombination.fasta
   """
 
 }
@@ -291,7 +292,7 @@ process MolecularClock {
     pathfinder phybeast utils prepare-metadata -m $metadata -p treetime -o treetime.meta
     treetime clock --tree $tree --aln $alignment --dates treetime.meta --allow-negative-rate \
     --outdir clock > clock.txt
-    pathfinder phybeast utils extract-rate -f output.txt -p treetime -o rate.txt
+    pathfinder phybeast utils extract-rate -f clock.txt -p treetime -o rate.txt
     """
 
   else if (params.clock == 'lsd')
@@ -304,7 +305,7 @@ process MolecularClock {
 
 }
 
-// Date regression estimate with TimeTree, separate from clock estimate above
+// Date regression by root-to-tip distances, separate from clock estimate above
 
 process DateRegression {
 
@@ -315,7 +316,6 @@ process DateRegression {
 
   input:
   file(tree) from phylo_regression
-  file(alignment) from reg_align
 
   output:
   file("rtt.csv") into plot_regression
@@ -323,9 +323,7 @@ process DateRegression {
   script:
 
   """
-  pathfinder phybeast utils prepare-metadata -m $metadata -p treetime -o treetime.meta
-  treetime clock --tree $tree --aln $alignment --dates treetime.meta --allow-negative-rate --outdir clock > clock.txt
-  mv clock/rtt.csv rtt.csv
+  pathfinder phybeast utils root-to-tip -t $tree -d $metadata -o rtt.csv
   """
 
 
@@ -336,25 +334,24 @@ process DateRegression {
 
 if (params.date_test){
 
-  replicates = 1..params.replicates
+  // All replicates are randomised in a single process: random.{1..n}.tab
 
   process DateRandomisation {
 
     label "data"
 
-    input:
-    file(alignment) from clock_align
-    each rep from replicates
-
     output:
-    set rep, file("random.${rep}.tab") into estimate_rate
+    file("random.*.tab") into random_dates
 
     """
-    pathfinder phybeast utils randomise-dates --date_file $metadata --output random.${rep}.tab
+    pathfinder phybeast utils randomise-dates --date_file $metadata --output random.tab \
+    --replicates $params.replicates --seed $params.seed
     """
 
   }
 
+  estimate_rate = random_dates.flatten().map { file -> [ file.baseName.tokenize('.')[1], file ] }
+
   process ClockReplicate {
 
     label "data"
@@ -365,7 +362,7 @@ if (params.date_test){
     file(alignment) from rep_align
 
     output:
-    file("rate.${rep}.txt") into plot_date_randomisation
+    file("clock.${rep}*") into plot_date_randomisation
 
     script:
 
@@ -374,7 +371,6 @@ if (params.date_test){
       """
       pathfinder phybeast utils prepare-metadata -m $random_dates -p lsd2 -o lsd2.meta
       lsd2 -i $tree -d lsd2.meta -r a -c -o clock.${rep}.txt
-      pathfinder phybeast utils extract-rate -f clock.${rep}.txt -p lsd2 -o rate.${rep}.txt
       """
 
     else if (params.clock == 'treetime')
@@ -382,8 +378,7 @@ if (params.date_test){
       """
       pathfinder phybeast utils prepare-metadata -m $random_dates -p treetime -o treetime.meta
       treetime clock --tree $tree --aln $alignment --dates treetime.meta --allow-negative-rate \
-      --outdir clock > clock.${rep}.txt
-      pathfinder phybeast utils extract-rate -f clock.${rep}.txt -p treetime -o rate.${rep}.txt
+      --outdir clock.${rep} > clock.${rep}.txt
       """
 
   }
@@ -395,7 +390,7 @@ if (params.date_test){
     publishDir "${params.outdir}", mode: "copy"
 
     input:
-    file(rates) from plot_date_randomisation.collect()
+    file(results) from plot_date_randomisation.collect()
     file(rate) from plot_date_randomisation_rate
     file(regression) from plot_regression
 
@@ -405,8 +400,10 @@ if (params.date_test){
 
     script:
 
+    prep = params.clock == 'lsd' ? 'lsd2' : 'treetime'
+
     """
-    cat $rates > rates.tab
+    pathfinder phybeast utils aggregate-rates -r 'clock.*.txt' -p $prep -o rates.tab
     pathfinder phybeast utils plot-date-randomisation -f rates.tab -r $rate \
     -o date_randomisation.png --regression $regression
     """
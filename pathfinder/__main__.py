@@ -0,0 +1,3 @@
+from pathfinder.terminal.client import terminal_client
+
+terminal_client()
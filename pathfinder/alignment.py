@@ -0,0 +1,324 @@
+"""
+
+Pathfinder alignment module, @esteinig
+
+Nucleotide alignments as memory-mapped sample by site matrices of one byte codes
+(A, C, G, T, N, -) with an index of sample names. Alignments are converted from
+FASTA in one pass and read in blocks of samples for column-wise operations such
+as variant site extraction, without holding the alignment in memory.
+
+"""
+
+import gzip
+import mmap
+import os
+import numpy
+
+from pathlib import Path
+
+# Codes of nucleotides: A, C, G, T, other (N) and gap
+LETTERS = numpy.frombuffer(b'ACGTN-', dtype=numpy.uint8)
+MISSING, GAP = 4, 5
+
+CODES = numpy.full(256, MISSING, dtype=numpy.uint8)
+for _code, _letter in enumerate(b'ACGT'):
+    CODES[_letter] = CODES[_letter + 32] = _code
+CODES[ord('-')] = GAP
+
+
+class Alignment:
+
+    """ Alignment as a sample by site matrix of nucleotide codes """
+
+    def __init__(self, sites: numpy.array, names: list):
+
+        """ Alignment
+
+        :param sites: sample by site matrix of nucleotide codes, see `LETTERS`
+        :param names: sample names, in order of rows
+
+        """
+
+        self.sites = sites
+        self.names = names
+
+    def __len__(self):
+
+        return len(self.names)
+
+    @property
+    def length(self) -> int:
+
+        return self.sites.shape[1]
+
+    @classmethod
+    def convert(cls, fasta: Path, store: Path) -> 'Alignment':
+
+        """ Convert an alignment to a memory-mapped store
+
+        The store is a directory with the matrix of nucleotide codes
+        (`sites.u8`, one row per sample) and sample names (`names.txt`).
+
+        :param fasta: alignment file (.fasta or .fasta.gz)
+        :param store: output store directory
+
+        :returns memory-mapped alignment
+
+        :raises ValueError if the alignment is empty or sequences
+            differ in length
+
+        """
+
+        store = Path(store)
+        store.mkdir(parents=True, exist_ok=True)
+
+        length = None
+        with (store / 'sites.u8').open('wb') as sites, \
+                (store / 'names.txt').open('wb') as names:
+            for name, sequence in iter_fasta(fasta):
+                if length is None:
+                    length = len(sequence)
+                elif len(sequence) != length:
+                    raise ValueError(
+                        f'Sequence length of {name.decode()} ({len(sequence)}) '
+                        f'differs from alignment length ({length})'
+                    )
+
+                sites.write(CODES[numpy.frombuffer(sequence, dtype=numpy.uint8)])
+                names.write(name + b'\n')
+
+        if not length:
+            raise ValueError(f'No sequences in alignment: {fasta}')
+
+        return cls.open(store)
+
+    @classmethod
+    def open(cls, store: Path) -> 'Alignment':
+
+        """ Memory-map an alignment store, see `Alignment.convert` """
+
+        store = Path(store)
+        with (store / 'names.txt').open('r') as infile:
+            names = [line.rstrip('\n') for line in infile]
+
+        size = (store / 'sites.u8').stat().st_size
+        if not names or size % len(names):
+            raise ValueError(f'Alignment store is empty or corrupt: {store}')
+
+        sites = numpy.memmap(
+            store / 'sites.u8', dtype=numpy.uint8, mode='r',
+            shape=(len(names), size // len(names))
+        )
+
+        return cls(sites, names)
+
+    def blocks(self, block_size: int = 64*1024*1024):
+
+        """ Blocks of consecutive samples
+
+        :param block_size: maximum bytes per block
+
+        :returns generator of first sample index and block of sites
+
+        """
+
+        rows = max(1, block_size // max(1, self.length))
+        for start in range(0, len(self), rows):
+            yield start, numpy.asarray(self.sites[start:start+rows])
+
+    def site_counts(self, block_size: int = 64*1024*1024) -> numpy.array:
+
+        """ Count nucleotides at each site
+
+        :param block_size: maximum bytes of samples read at once
+
+        :returns matrix of counts of A, C, G, T (rows) at each site
+
+        """
+
+        counts = numpy.zeros((4, self.length), dtype=numpy.int64)
+        for _, block in self.blocks(block_size):
+            for code in range(4):
+                counts[code] += (block == code).sum(axis=0)
+
+        return counts
+
+    def pack(
+        self,
+        sites: numpy.array = None,
+        output: Path = None,
+        block_size: int = 64*1024*1024
+    ) -> numpy.array:
+
+        """ Pack sites into bit planes of 64-bit words
+
+        Nucleotides are encoded in two bits (high and low bit of the code of
+        A, C, G or T) with a third bit for sites with A, C, G or T, so that
+        differences between samples at many sites are compared at once
+        with bitwise operations.
+
+        :param sites: indices or mask of sites to pack, all if None
+        :param output: output file of the packed planes (.npy), to be
+            memory-mapped by other processes, in memory if None
+        :param block_size: maximum bytes of samples read at once
+
+        :returns array of planes (high, low, valid) x samples x words
+
+        """
+
+        size = self.length if sites is None else len(numpy.arange(self.length)[sites])
+        words = max(1, -(-size // 64))
+
+        shape = (3, len(self), words)
+        if output is None:
+            planes = numpy.zeros(shape, dtype=numpy.uint64)
+        else:
+            planes = numpy.lib.format.open_memmap(
+                output, mode='w+', dtype=numpy.uint64, shape=shape
+            )
+
+        for start, block in self.blocks(block_size):
+            if sites is not None:
+                block = block[:, sites]
+            stop = start + len(block)
+
+            bits = (block >> 1 & 1, block & 1, block < MISSING)
+            for plane, values in enumerate(bits):
+                packed = numpy.zeros((len(block), words*8), dtype=numpy.uint8)
+                packed[:, :-(-size // 8)] = numpy.packbits(values, axis=1)
+                planes[plane, start:stop] = packed.view(numpy.uint64)
+
+        if output is not None:
+            planes.flush()
+
+        return planes
+
+    def write_fasta(
+        self,
+        fasta: Path,
+        sites: numpy.array = None,
+        block_size: int = 64*1024*1024
+    ) -> None:
+
+        """ Write the alignment or a selection of sites to FASTA
+
+        :param fasta: output alignment file (.fasta)
+        :param sites: indices or mask of sites to write, all if None
+        :param block_size: maximum bytes of samples read at once
+
+        """
+
+        with Path(fasta).open('wb') as outfile:
+            for start, block in self.blocks(block_size):
+                if sites is not None:
+                    block = block[:, sites]
+                letters = LETTERS[block]
+                for i, row in enumerate(letters):
+                    outfile.write(b'>' + self.names[start+i].encode() + b'\n')
+                    outfile.write(row.tobytes() + b'\n')
+
+
+def variant_sites(counts: numpy.array, samples: int, acgt: bool = False) -> (
+    numpy.array, numpy.array
+):
+
+    """ Variant sites and constant site counts from nucleotide counts
+
+    :param counts: counts of A, C, G, T at each site, see `Alignment.site_counts`
+    :param samples: number of samples in the alignment
+    :param acgt: variant sites contain only A, C, G or T in all samples,
+        sites with N or gaps are not counted as variant or constant sites
+
+    :returns mask of variant sites, and counts of constant sites
+        of A, C, G, T, as for IQ-TREE ascertainment bias correction
+
+    """
+
+    present = counts > 0
+    complete = counts.sum(axis=0) == samples
+
+    observed = present.sum(axis=0)
+
+    variant = observed > 1
+    constant = observed == 1
+    if acgt:
+        variant &= complete
+        constant &= complete
+
+    constant_counts = numpy.bincount(
+        present[:, constant].argmax(axis=0), minlength=4
+    )
+
+    return variant, constant_counts
+
+
+def fasta_name(header: bytes) -> bytes:
+
+    """ Sequence identifier of a header: up to the first whitespace """
+
+    fields = header[1:].split(None, 1)
+
+    return fields[0] if fields else b''
+
+
+def find_header(mm: mmap.mmap, start: int) -> int:
+
+    """ Find the next header at the start of a line, single-byte
+    search is much faster than searching for a newline and '>' """
+
+    position = mm.find(b'>', start)
+    while position > 0 and mm[position-1] != 10:
+        position = mm.find(b'>', position + 1)
+
+    return position
+
+
+def iter_fasta(fasta: Path):
+
+    """ Records of a FASTA file, sequences without line breaks
+
+    Plain files are memory-mapped and records are sliced at headers; gzipped
+    files are streamed line by line.
+
+    :param fasta: alignment file (.fasta or .fasta.gz)
+
+    :returns generator of sequence names and sequences (bytes)
+
+    """
+
+    fasta = Path(fasta)
+    with fasta.open('rb') as fin:
+        gzipped = fin.read(2) == b'\x1f\x8b'
+
+    if gzipped:
+        name, lines = None, []
+        with gzip.open(fasta, 'rb') as fin:
+            for line in fin:
+                if line.startswith(b'>'):
+                    if name is not None:
+                        yield name, b''.join(lines)
+                    name, lines = fasta_name(line), []
+                else:
+                    lines.append(line.rstrip())
+        if name is not None:
+            yield name, b''.join(lines)
+        return
+
+    with fasta.open('rb') as fin:
+        if os.fstat(fin.fileno()).st_size == 0:
+            return
+
+        with mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start = find_header(mm, 0)
+            while start != -1:
+                header_end = mm.find(b'\n', start)
+                if header_end == -1:
+                    header_end = len(mm)
+
+                next_start = find_header(mm, header_end)
+                end = len(mm) if next_start == -1 else next_start
+
+                yield fasta_name(mm[start:header_end]), \
+                    mm[header_end:end].translate(None, b'\r\n\t ')
+
+                start = next_start
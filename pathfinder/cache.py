@@ -0,0 +1,132 @@
+"""
+
+Pathfinder cache module, @esteinig
+
+On-disk cache of ENA warehouse query results, keyed on the query url, with
+a time to live for cached results and size-based eviction of the least
+recently used entries.
+
+"""
+
+import os
+import time
+import uuid
+import pandas
+import hashlib
+
+from pathlib import Path
+
+
+class QueryCache:
+
+    """ Cache of query results as compressed tab-delimited files """
+
+    def __init__(
+        self,
+        path: Path = Path.home() / '.pathfinder' / 'cache',
+        ttl: float = 7*24*3600,
+        max_size: int = 1024**3
+    ):
+
+        """ Query result cache
+
+        :param path: cache directory
+        :param ttl: time to live of cached results in seconds
+        :param max_size: maximum size of the cache directory in bytes
+
+        """
+
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_size = max_size
+
+    @staticmethod
+    def key(url: str) -> str:
+
+        """ Cache key of a query url """
+
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def get_file(self, url: str) -> Path:
+
+        """ Cache file of a query url """
+
+        return self.path / f"{self.key(url)}.tsv.gz"
+
+    def get(self, url: str, expired: bool = False) -> pandas.DataFrame or None:
+
+        """ Get the cached results of a query
+
+        :param url: query url
+        :param expired: return results that have outlived the time to live
+
+        :returns dataframe of query results or None if not in cache
+
+        """
+
+        file = self.get_file(url)
+
+        try:
+            modified = file.stat().st_mtime
+        except OSError:
+            return None
+
+        if not expired and time.time() - modified > self.ttl:
+            return None
+
+        df = pandas.read_csv(file, sep='\t')
+
+        # Track recent use for eviction, keeping the time of the query:
+        os.utime(file, times=(time.time(), modified))
+
+        return df
+
+    def put(self, url: str, df: pandas.DataFrame) -> None:
+
+        """ Cache the results of a query and evict entries over capacity
+
+        :param url: query url
+        :param df: dataframe of query results
+
+        """
+
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        file = self.get_file(url)
+        tmp = self.path / f".{uuid.uuid4()}.tmp"
+        try:
+            df.to_csv(tmp, sep='\t', index=False, compression='gzip')
+            tmp.replace(file)
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+
+        self.evict()
+
+    def evict(self) -> None:
+
+        """ Remove the least recently used entries until the cache is
+        within its maximum size; expired entries are kept for offline use """
+
+        entries = []
+        for file in self.path.glob('*.tsv.gz'):
+            try:
+                stat = file.stat()
+            except OSError:
+                continue
+
+            entries.append((stat.st_atime, stat.st_size, file))
+
+        size = sum(entry[1] for entry in entries)
+        for _, file_size, file in sorted(entries):
+            if size <= self.max_size:
+                break
+            file.unlink()
+            size -= file_size
+
+    def clear(self) -> None:
+
+        """ Remove all entries from the cache """
+
+        for file in self.path.glob('*.tsv.gz'):
+            file.unlink()
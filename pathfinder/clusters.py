@@ -0,0 +1,159 @@
+"""
+
+Pathfinder clusters module, @esteinig
+
+Threshold-based clustering of samples by pairwise SNP distances. Edges between
+samples are sorted once by distance and merged with a union-find, so that the
+clusters at all thresholds (single linkage) are read off in one incremental pass.
+
+"""
+
+import numpy
+
+from pathlib import Path
+
+
+def read_edges(
+    distance_file: Path,
+    max_distance: int,
+    names_file: Path = None,
+    block_size: int = 64*1024*1024
+) -> (list, numpy.array, numpy.array, numpy.array):
+
+    """ Edges between samples at or below a distance
+
+    :param distance_file: distance matrix (.npy) with sample names (.names.txt),
+        or tab-delimited edge list with columns: sample1, sample2, distance,
+        as from `pf phybeast utils snp-distances`
+    :param max_distance: maximum distance of edges
+    :param names_file: sample names, one per line; for edge lists, samples
+        without edges are only known from this file
+    :param block_size: maximum bytes of the distance matrix read at once
+
+    :returns sample names, and edges as arrays of sample indices and distances
+
+    """
+
+    distance_file = Path(distance_file)
+
+    if names_file is None and distance_file.suffix == '.npy':
+        names_file = distance_file.with_suffix('.names.txt')
+
+    names = []
+    if names_file is not None:
+        with Path(names_file).open('r') as infile:
+            names = [line.strip() for line in infile if line.strip()]
+
+    if distance_file.suffix == '.npy':
+        matrix = numpy.load(distance_file, mmap_mode='r')
+        if len(names) != len(matrix):
+            raise ValueError(
+                f'Number of names ({len(names)}) differs from the size '
+                f'of the distance matrix ({len(matrix)})'
+            )
+
+        edges = []
+        rows = max(1, block_size // max(1, matrix.shape[1] * matrix.itemsize))
+        for start in range(0, len(matrix), rows):
+            block = numpy.asarray(matrix[start:start+rows])
+            i, j = numpy.nonzero(block <= max_distance)
+            upper = i + start < j
+            i, j = i[upper], j[upper]
+            edges.append((i + start, j, block[i, j].astype(numpy.int64)))
+
+        i, j, distances = (numpy.concatenate(values) for values in zip(*edges))
+
+        return names, i, j, distances
+
+    import pandas
+
+    df = pandas.read_csv(distance_file, sep='\t')
+    df = df[df.distance <= max_distance]
+
+    # Samples of the edge list in order of the names file, then of appearance
+    codes, uniques = pandas.factorize(
+        pandas.concat([pandas.Series(names, dtype=object), df.sample1, df.sample2])
+    )
+    i = codes[len(names):len(names)+len(df)]
+    j = codes[len(names)+len(df):]
+
+    return list(uniques), i, j, df.distance.values.astype(numpy.int64)
+
+
+def threshold_clusters(
+    samples: int,
+    i: numpy.array,
+    j: numpy.array,
+    distances: numpy.array,
+    thresholds: list
+) -> numpy.array:
+
+    """ Single linkage clusters of samples at distance thresholds
+
+    Edges are sorted by distance once; edges are merged in order with a
+    union-find (union by size, path halving) and the clusters are read
+    off each time the next threshold is passed.
+
+    :param samples: number of samples
+    :param i: sample index of the first sample of each edge
+    :param j: sample index of the second sample of each edge
+    :param distances: distance of each edge
+    :param thresholds: distance thresholds, samples are linked at or below
+
+    :returns matrix of cluster identifiers (1, 2, ... in order of the first
+        sample of each cluster) of the samples (columns) at each threshold
+        (rows, in order of the thresholds)
+
+    """
+
+    thresholds = numpy.asarray(thresholds)
+
+    order = numpy.argsort(distances, kind='stable')
+    i, j, distances = i[order].tolist(), j[order].tolist(), distances[order]
+
+    # Number of edges at or below each threshold:
+    ends = numpy.searchsorted(distances, thresholds, side='right')
+
+    parent = list(range(samples))
+    size = [1] * samples
+
+    def find(x: int) -> int:
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    clusters = numpy.zeros((len(thresholds), samples), dtype=numpy.int64)
+
+    merged = 0
+    for t in numpy.argsort(thresholds, kind='stable'):
+        for edge in range(merged, ends[t]):
+            a, b = find(i[edge]), find(j[edge])
+            if a != b:
+                if size[a] < size[b]:
+                    a, b = b, a
+                parent[b] = a
+                size[a] += size[b]
+        merged = max(merged, ends[t])
+
+        clusters[t] = _cluster_ids(numpy.array(parent))
+
+    return clusters
+
+
+def _cluster_ids(parent: numpy.array) -> numpy.array:
+
+    """ Cluster identifiers from union-find parents, numbered 1, 2, ...
+    in order of the first sample of each cluster """
+
+    roots = parent
+    while True:
+        above = roots[roots]
+        if (above == roots).all():
+            break
+        roots = above
+
+    _, first, inverse = numpy.unique(roots, return_index=True, return_inverse=True)
+    rank = numpy.argsort(numpy.argsort(first))
+
+    return rank[inverse.ravel()] + 1
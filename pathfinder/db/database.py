@@ -1,17 +1,197 @@
+import os
+import json
+import pandas
+import threading
+
 from pathlib import Path
+from pymongo import MongoClient, UpdateOne, IndexModel, ASCENDING
+from pymongo.errors import PyMongoError
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(uri: str, max_pool_size: int = 100, timeout: int = 5000) -> MongoClient:
+
+    """ Get the shared, pooled client for a MongoDB URI
+
+    Clients are thread-safe and pool their connections, so that one client
+    per URI is shared by all users in the process.
+
+    :param uri: MongoDB connection string
+    :param max_pool_size: maximum number of pooled connections
+    :param timeout: server selection timeout in milliseconds
+
+    :returns client connecting on first operation
+
+    """
+
+    with _clients_lock:
+        client = _clients.get(uri)
+        if client is None:
+            client = MongoClient(
+                uri,
+                maxPoolSize=max_pool_size,
+                serverSelectionTimeoutMS=timeout,
+                connect=False
+            )
+            _clients[uri] = client
+
+    return client
 
 
 class MongoAPI:
 
     """ Convenience base class for utilities around PyMongo and MongoDB """
 
+    # Default configuration, updated from the configuration file:
+    defaults = {
+        'uri': 'mongodb://localhost:27017',
+        'database': 'pathfinder',
+        'collection': 'runs',
+        'max_pool_size': 100,
+        'timeout': 5000,
+        'chunk_size': 10000
+    }
+
     def __init__(
         self,
         config: Path = Path.home() / '.pathfinder' / 'db' / 'config.json'
     ):
 
-        pass
+        """ MongoDB interface with one pooled client
+
+        The configuration file (.json) may set any of the keys: uri, database,
+        collection, max_pool_size, timeout (ms), chunk_size; the URI can be set
+        with the environment variable PATHFINDER_MONGO_URI.
+
+        :param config: configuration file
+
+        """
+
+        self.config = self.load_config(config)
+
+        self.client = get_client(
+            uri=self.config['uri'],
+            max_pool_size=self.config['max_pool_size'],
+            timeout=self.config['timeout']
+        )
+
+        self.db = self.client[self.config['database']]
+        self.runs = self.db[self.config['collection']]
+
+    def load_config(self, config: Path) -> dict:
+
+        """ Load the configuration file over the default configuration """
+
+        settings = dict(self.defaults)
+
+        if config is not None and Path(config).exists():
+            with Path(config).open('r') as infile:
+                settings.update(json.load(infile))
+
+        uri = os.environ.get('PATHFINDER_MONGO_URI')
+        if uri:
+            settings['uri'] = uri
+
+        return settings
+
+    def is_connected(self) -> bool:
+
+        """ Check the connection to the database server """
+
+        try:
+            self.client.admin.command('ping')
+        except PyMongoError:
+            return False
+
+        return True
+
+    def create_indexes(self) -> list:
+
+        """ Create indexes on the fields used by dashboard queries
+
+        :returns names of the indexes
+
+        """
+
+        return self.runs.create_indexes([
+            IndexModel([('run_accession', ASCENDING)], unique=True),
+            IndexModel([('tax_id', ASCENDING)]),
+            IndexModel([('study', ASCENDING)]),
+            IndexModel([('sample', ASCENDING)])
+        ])
+
+    def upsert_survey(
+        self,
+        query: pandas.DataFrame,
+        chunk_size: int = None
+    ) -> (int, int):
+
+        """ Insert or update the query results of a survey
+
+        Runs are keyed on their run accession (index of `Survey.query`)
+        and written in chunks of unordered bulk writes.
+
+        :param query: query results of `Survey.query_ena`
+        :param chunk_size: number of runs per bulk write
+
+        :returns number of inserted and updated runs
+
+        """
+
+        chunk_size = chunk_size or self.config['chunk_size']
+
+        self.create_indexes()
+
+        inserted, updated = 0, 0
+        for i in range(0, len(query), chunk_size):
+            operations = [
+                UpdateOne(
+                    {'run_accession': document['run_accession']},
+                    {'$set': document},
+                    upsert=True
+                ) for document in self.get_documents(query.iloc[i:i+chunk_size])
+            ]
+
+            result = self.runs.bulk_write(operations, ordered=False)
+            inserted += result.upserted_count
+            updated += result.matched_count
+
+        return inserted, updated
+
+    @staticmethod
+    def get_documents(query: pandas.DataFrame) -> list:
+
+        """ Convert query results to documents with native types
+
+        :param query: query results indexed by run accession,
+            see `Survey.query_from_csv`
+
+        :raises ValueError if the index is not of run accessions
+
+        """
+
+        if isinstance(query.index, pandas.RangeIndex) or \
+                not query.index.map(lambda run: isinstance(run, str)).all():
+            raise ValueError('Query results are not indexed by run accession')
+
+        df = query.astype(object)
+        df = df.where(query.notna(), None)
+        df.insert(0, 'run_accession', [str(run) for run in query.index])
+
+        return df.to_dict('records')
+
+    def get_runs(self, **fields) -> pandas.DataFrame:
+
+        """ Get runs matching field values, e.g. `tax_id=1280`
+
+        :returns query results of the matching runs, indexed by run accession
+
+        """
 
-    def is_connected(self):
+        documents = list(self.runs.find(fields, {'_id': 0}))
+        if not documents:
+            return pandas.DataFrame()
 
-        pass
+        return pandas.DataFrame(documents).set_index('run_accession')
@@ -0,0 +1,170 @@
+"""
+
+Pathfinder distances module, @esteinig
+
+Pairwise SNP distances between the samples of an alignment. Alignments are packed
+into bit planes (see `pathfinder.alignment.Alignment.pack`), so that the sites of
+two samples are compared 64 at a time with bitwise operations and counted with a
+population count. Blocks of samples are compared in a process pool; workers read
+the packed planes and write the distance matrix through shared memory maps.
+
+"""
+
+import numpy
+
+from pathlib import Path
+
+# Population count of bytes, if numpy.bitwise_count is not available
+POPCOUNT = numpy.array([bin(i).count('1') for i in range(256)], dtype=numpy.uint8)
+
+
+def popcount(words: numpy.array) -> numpy.array:
+
+    """ Number of set bits summed over the last axis of 64-bit words """
+
+    if hasattr(numpy, 'bitwise_count'):
+        return numpy.bitwise_count(words).sum(axis=-1, dtype=numpy.uint32)
+    else:
+        return POPCOUNT[words.view(numpy.uint8)].sum(axis=-1, dtype=numpy.uint32)
+
+
+def block_distances(planes: numpy.array, rows: slice, cols: slice) -> numpy.array:
+
+    """ SNP distances between two blocks of samples
+
+    Sites are counted as different where both samples have A, C, G or T
+    and the nucleotides differ; sites with N or gaps are not counted.
+
+    :param planes: packed bit planes, see `Alignment.pack`
+    :param rows: first block of samples
+    :param cols: second block of samples
+
+    :returns matrix of distances between the samples of the blocks
+
+    """
+
+    high, low, valid = (numpy.asarray(plane[rows])[:, None, :] for plane in planes)
+    high_j, low_j, valid_j = (numpy.asarray(plane[cols])[None, :, :] for plane in planes)
+
+    # In place, to limit temporary arrays to two:
+    diff = numpy.bitwise_xor(high, high_j)
+    other = numpy.bitwise_xor(low, low_j)
+    diff |= other
+    numpy.bitwise_and(valid, valid_j, out=other)
+    diff &= other
+
+    return popcount(diff)
+
+
+def _distance_rows(
+    planes_file: Path,
+    start: int,
+    stop: int,
+    matrix_file: Path = None,
+    threshold: int = None,
+    block_size: int = 64*1024*1024
+) -> (numpy.array, numpy.array, numpy.array) or None:
+
+    """ Distances of a block of samples to themselves and all later samples
+
+    Distances are written to both triangles of the memory-mapped matrix,
+    or returned as edges at or below the threshold.
+
+    :returns edges as arrays of sample indices and distances, if a
+        threshold is given
+
+    """
+
+    planes = numpy.load(planes_file, mmap_mode='r')
+    samples, words = planes.shape[1], planes.shape[2]
+
+    if matrix_file is not None:
+        matrix = numpy.load(matrix_file, mmap_mode='r+')
+
+    edges = []
+
+    # Blocks of columns within the memory limit of the comparison:
+    cols = max(1, block_size // (17 * (stop - start) * words))
+    for col in range(start, samples, cols):
+        col_stop = min(col + cols, samples)
+        distances = block_distances(planes, slice(start, stop), slice(col, col_stop))
+
+        if matrix_file is not None:
+            matrix[start:stop, col:col_stop] = distances
+            matrix[col:col_stop, start:stop] = distances.T
+        else:
+            i, j = numpy.nonzero(distances <= threshold)
+            i, j = i + start, j + col
+            upper = i < j
+            edges.append((i[upper], j[upper], distances[i[upper]-start, j[upper]-col]))
+
+    if matrix_file is not None:
+        matrix.flush()
+        return None
+
+    if not edges:
+        return numpy.zeros(0, int), numpy.zeros(0, int), numpy.zeros(0, int)
+
+    return tuple(numpy.concatenate(values) for values in zip(*edges))
+
+
+def snp_distances(
+    planes_file: Path,
+    matrix_file: Path = None,
+    threshold: int = None,
+    workers: int = 4,
+    rows: int = 64,
+    block_size: int = 64*1024*1024
+) -> (numpy.array, numpy.array, numpy.array) or None:
+
+    """ Pairwise SNP distances between all samples of packed bit planes
+
+    :param planes_file: packed bit planes (.npy), see `Alignment.pack`
+    :param matrix_file: output distance matrix (.npy), memory-mapped;
+        required unless a threshold is given
+    :param threshold: return edges between samples at or below this
+        distance instead of writing the distance matrix
+    :param workers: number of processes
+    :param rows: number of samples compared to all others per task
+    :param block_size: maximum bytes of comparisons held in memory per process
+
+    :returns edges as arrays of sample indices (i < j) and distances,
+        if a threshold is given, otherwise None
+
+    :raises ValueError if neither a threshold nor a matrix file are given
+
+    """
+
+    from functools import partial
+    from concurrent.futures import ProcessPoolExecutor
+
+    if threshold is None and matrix_file is None:
+        raise ValueError('Threshold or distance matrix file required')
+
+    planes = numpy.load(planes_file, mmap_mode='r')
+    samples, words = planes.shape[1], planes.shape[2]
+
+    if threshold is None:
+        dtype = numpy.uint16 if words * 64 < 2**16 else numpy.uint32
+        numpy.lib.format.open_memmap(
+            matrix_file, mode='w+', dtype=dtype, shape=(samples, samples)
+        ).flush()
+
+    compute = partial(
+        _distance_rows, planes_file, matrix_file=matrix_file if threshold is None
+        else None, threshold=threshold, block_size=block_size
+    )
+
+    starts = list(range(0, samples, rows))
+    stops = [min(start + rows, samples) for start in starts]
+
+    if workers > 1 and len(starts) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(compute, starts, stops))
+    else:
+        results = [compute(start, stop) for start, stop in zip(starts, stops)]
+
+    if threshold is None:
+        return None
+
+    return tuple(numpy.concatenate(values) for values in zip(*results))
@@ -0,0 +1,186 @@
+"""
+
+Pathfinder FASTQ module, @esteinig
+
+Integrity statistics of read files computed from the chunks of their transfer: data
+is decompressed incrementally (including multi-member gzip files as written by ENA)
+and FASTQ records are counted as the chunks are written to disk, so that read and
+base counts and the validity of the gzip stream are known when a transfer completes,
+without reading the file again.
+
+"""
+
+import zlib
+import numpy
+
+from pathlib import Path
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+FASTQ_SUFFIXES = ('.fastq', '.fq', '.fastq.gz', '.fq.gz')
+
+
+class FastqStats:
+
+    """ Read and base counts of a (gzipped) FASTQ file, updated chunk by chunk """
+
+    def __init__(self):
+
+        self.reset()
+
+    def reset(self) -> None:
+
+        """ Discard all data, e.g. when a transfer starts over """
+
+        self.size = 0           # bytes received
+        self.lines = 0          # complete lines
+        self.bases = 0          # length of sequence lines
+        self.qualities = 0      # length of quality lines
+        self.gzip = None        # gzipped, known from the first two bytes
+        self.error = None       # error of the gzip stream
+
+        self._head = b''
+        self._rest = b''        # incomplete last line
+        self._decoder = None
+
+    @property
+    def reads(self) -> int:
+
+        return self.lines // 4
+
+    @property
+    def mean_length(self) -> float or None:
+
+        return self.bases / self.reads if self.reads else None
+
+    @property
+    def valid_gzip(self) -> bool or None:
+
+        """ Gzip stream ends with a complete member, None if not gzipped """
+
+        if not self.gzip:
+            return None
+
+        return self.error is None and self._decoder is not None \
+            and self._decoder.eof and not self._decoder.unused_data
+
+    @property
+    def valid(self) -> bool:
+
+        """ Complete gzip stream (if gzipped) of complete FASTQ records,
+        with qualities of the length of their sequences """
+
+        return self.size > 0 and self.valid_gzip is not False \
+            and not self._rest and self.lines % 4 == 0 \
+            and self.qualities == self.bases
+
+    def update(self, chunk: bytes) -> None:
+
+        """ Count the records of the next chunk of the file """
+
+        if self.gzip is None:
+            self._head += chunk
+            if len(self._head) < 2:
+                return
+            self.gzip = self._head[:2] == GZIP_MAGIC
+            chunk, self._head = self._head, b''
+
+        self.size += len(chunk)
+
+        if not self.gzip:
+            self._count(chunk)
+        elif self.error is None:
+            try:
+                self._decompress(chunk)
+            except zlib.error as err:
+                self.error = str(err)
+
+    def _decompress(self, chunk: bytes) -> None:
+
+        """ Decompress and count gzip members, a new member may start
+        in the chunk """
+
+        while chunk:
+            if self._decoder is None or self._decoder.eof:
+                self._decoder = zlib.decompressobj(wbits=47)
+            self._count(self._decoder.decompress(chunk))
+            chunk = self._decoder.unused_data if self._decoder.eof else b''
+
+    def _count(self, data: bytes) -> None:
+
+        """ Count lines and the lengths of sequence and quality lines,
+        from the positions of newlines """
+
+        newlines = numpy.flatnonzero(
+            numpy.frombuffer(data, dtype=numpy.uint8) == 10
+        )
+        if len(newlines) == 0:
+            self._rest += data
+            return
+
+        lengths = numpy.diff(newlines, prepend=-1) - 1
+        lengths[0] += len(self._rest)
+        self._rest = data[newlines[-1]+1:]
+
+        # Sequences are the second line of each record:
+        first = (1 - self.lines) % 4
+        self.bases += int(lengths[first::4].sum())
+        self.qualities += int(lengths[(first + 2) % 4::4].sum())
+        self.lines += len(newlines)
+
+    def finish(self) -> 'FastqStats':
+
+        """ Count the last line, if the file does not end with a newline """
+
+        if self.gzip is None and self._head:
+            self.gzip = False
+            self.size += len(self._head)
+            self._count(self._head)
+            self._head = b''
+
+        if self._rest.strip():
+            self._count(b'\n')
+        self._rest = b''
+
+        return self
+
+    def check(self, reads: int = None, bases: int = None) -> str or None:
+
+        """ Check the file for completeness and against expected counts
+
+        :param reads: expected number of reads, e.g. `read_count` of the ENA
+        :param bases: expected number of bases, e.g. `base_count` of the ENA
+            for runs with a single read file
+
+        :returns description of the first problem, None if the file passes
+
+        """
+
+        if self.valid_gzip is False:
+            return f'Invalid gzip stream ({self.error or "truncated"})'
+        if not self.valid:
+            return 'Incomplete FASTQ records'
+        if reads is not None and self.reads != reads:
+            return f'Read count {self.reads} does not match {reads}'
+        if bases is not None and self.bases != bases:
+            return f'Base count {self.bases} does not match {bases}'
+
+        return None
+
+    def read(self, file: Path, chunk_size: int = 1024*1024) -> 'FastqStats':
+
+        """ Statistics of a file on disk, e.g. after a transfer by wget or ascp """
+
+        self.reset()
+        with Path(file).open('rb') as infile:
+            for chunk in iter(lambda: infile.read(chunk_size), b''):
+                self.update(chunk)
+
+        return self.finish()
+
+
+def is_fastq(file: Path) -> bool:
+
+    """ Read file is FASTQ by name, e.g. not a submitted BAM file """
+
+    return Path(file).name.endswith(FASTQ_SUFFIXES)
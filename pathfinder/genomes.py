@@ -0,0 +1,295 @@
+"""
+
+Pathfinder genomes module, @esteinig
+
+Genome size lookup for coverage estimates. Genome sizes are held in sorted arrays
+of taxonomic identifiers for vectorized lookup; identifiers without a genome size,
+such as strain-level identifiers, fall back to the median genome size of their
+species or genus in the NCBI taxonomy.
+
+"""
+
+import os
+import numpy
+
+from pathlib import Path
+
+RESOURCES = Path(__file__).parent / 'resources'
+
+
+class Taxonomy:
+
+    """ Species and genus of taxonomic identifiers in sorted arrays """
+
+    def __init__(
+        self, taxids: numpy.array, species: numpy.array, genus: numpy.array
+    ):
+
+        """ Taxonomy
+
+        :param taxids: taxonomic identifiers
+        :param species: species identifier of each taxonomic identifier, 0 if none
+        :param genus: genus identifier of each taxonomic identifier, 0 if none
+
+        """
+
+        order = numpy.argsort(taxids)
+
+        self.taxids = numpy.asarray(taxids, dtype=numpy.int64)[order]
+        self.species = numpy.asarray(species, dtype=numpy.int64)[order]
+        self.genus = numpy.asarray(genus, dtype=numpy.int64)[order]
+
+    @classmethod
+    def from_nodes(cls, nodes_file: Path) -> 'Taxonomy':
+
+        """ Taxonomy from the NCBI taxonomy dump (`nodes.dmp`)
+
+        Species and genus of all nodes are resolved at once by following
+        parent pointers of unresolved nodes until all nodes are resolved.
+
+        :param nodes_file: `nodes.dmp` from `taxdump.tar.gz`
+
+        :returns taxonomy of the nodes below a species or genus
+
+        """
+
+        taxids, parents, ranks = [], [], []
+        with Path(nodes_file).open('r') as infile:
+            for line in infile:
+                fields = line.split('\t|\t', 3)
+                taxids.append(int(fields[0]))
+                parents.append(int(fields[1]))
+                ranks.append(fields[2])
+
+        taxids = numpy.array(taxids)
+        ranks = numpy.array(ranks)
+
+        parent = numpy.zeros(taxids.max() + 1, dtype=numpy.int64)
+        parent[taxids] = parents
+
+        return cls(
+            taxids=taxids,
+            species=cls._resolve(taxids, parent, taxids[ranks == 'species']),
+            genus=cls._resolve(taxids, parent, taxids[ranks == 'genus'])
+        ).select()
+
+    @staticmethod
+    def _resolve(taxids, parent, targets) -> numpy.array:
+
+        """ Ancestor of each node in targets, or 0 """
+
+        is_target = numpy.zeros(len(parent), dtype=bool)
+        is_target[targets] = True
+
+        current = taxids.copy()
+        while True:
+            unresolved = ~is_target[current] & (parent[current] != current)
+            if not unresolved.any():
+                break
+            current[unresolved] = parent[current[unresolved]]
+
+        return numpy.where(is_target[current], current, 0)
+
+    def select(self) -> 'Taxonomy':
+
+        """ Nodes with a species or genus """
+
+        keep = (self.species > 0) | (self.genus > 0)
+
+        return Taxonomy(self.taxids[keep], self.species[keep], self.genus[keep])
+
+    @classmethod
+    def load(cls, file: Path) -> 'Taxonomy':
+
+        """ Load a taxonomy saved with `Taxonomy.save` (.npz) """
+
+        with numpy.load(file) as data:
+            return cls(data['taxids'], data['species'], data['genus'])
+
+    def save(self, file: Path) -> None:
+
+        """ Save the taxonomy in compact form (.npz) """
+
+        numpy.savez_compressed(
+            file,
+            taxids=self.taxids.astype(numpy.int32),
+            species=self.species.astype(numpy.int32),
+            genus=self.genus.astype(numpy.int32)
+        )
+
+    def lookup(self, taxids: numpy.array) -> (numpy.array, numpy.array):
+
+        """ Species and genus of taxonomic identifiers, 0 if unknown """
+
+        if len(self.taxids) == 0:
+            return numpy.zeros(len(taxids), dtype=numpy.int64), \
+                numpy.zeros(len(taxids), dtype=numpy.int64)
+
+        index, found = _search(self.taxids, taxids)
+
+        species = numpy.where(found, self.species[index], 0)
+        genus = numpy.where(found, self.genus[index], 0)
+
+        return species, genus
+
+
+class GenomeSizes:
+
+    """ Genome sizes of taxonomic identifiers with taxonomic fallback """
+
+    def __init__(
+        self,
+        taxids: numpy.array,
+        sizes: numpy.array,
+        taxonomy: Taxonomy = None
+    ):
+
+        """ Genome sizes
+
+        :param taxids: taxonomic identifiers, duplicates keep the first size
+        :param sizes: genome sizes (Mbp)
+        :param taxonomy: taxonomy for species and genus fallback sizes
+
+        """
+
+        taxids = numpy.asarray(taxids, dtype=numpy.int64)
+        sizes = numpy.asarray(sizes, dtype=float)
+
+        self.taxids, first = numpy.unique(taxids, return_index=True)
+        self.sizes = sizes[first]
+
+        self.taxonomy = taxonomy
+
+        # Median genome sizes of species and genera:
+        if taxonomy is not None:
+            species, genus = taxonomy.lookup(self.taxids)
+            self.species_sizes = _medians(species, self.sizes)
+            self.genus_sizes = _medians(genus, self.sizes)
+        else:
+            self.species_sizes = self.genus_sizes = None
+
+    @classmethod
+    def from_file(cls, file: Path, taxonomy: Taxonomy = None) -> 'GenomeSizes':
+
+        """ Genome sizes from file with columns: taxid, size (.csv) """
+
+        import pandas
+
+        df = pandas.read_csv(file)
+
+        return cls(
+            taxids=pandas.to_numeric(
+                df.iloc[:, 0], errors='coerce'
+            ).fillna(0).values,
+            sizes=pandas.to_numeric(df.iloc[:, 1], errors='coerce').values,
+            taxonomy=taxonomy
+        )
+
+    def lookup(self, taxids: numpy.array, fallback: bool = True) -> numpy.array:
+
+        """ Genome sizes of taxonomic identifiers
+
+        :param taxids: taxonomic identifiers, may contain NaN
+        :param fallback: use the median genome size of the species or genus
+            of identifiers without genome size, if a taxonomy is available
+
+        :returns genome sizes (Mbp), NaN if not found
+
+        """
+
+        taxids = numpy.asarray(taxids, dtype=float)
+        taxids = numpy.where(numpy.isnan(taxids), 0, taxids).astype(numpy.int64)
+
+        sizes = _lookup(self.taxids, self.sizes, taxids)
+
+        missing = numpy.isnan(sizes)
+        if fallback and self.taxonomy is not None and missing.any():
+            species, genus = self.taxonomy.lookup(taxids[missing])
+
+            fallback_sizes = _lookup(*self.species_sizes, species)
+            no_species = numpy.isnan(fallback_sizes)
+            fallback_sizes[no_species] = _lookup(
+                *self.genus_sizes, genus[no_species]
+            )
+
+            sizes[missing] = fallback_sizes
+
+        return sizes
+
+
+def _search(keys: numpy.array, values: numpy.array) -> (numpy.array, numpy.array):
+
+    """ Index of values in sorted keys and whether they were found """
+
+    if len(keys) == 0:
+        return numpy.zeros(len(values), dtype=int), \
+            numpy.zeros(len(values), dtype=bool)
+
+    index = numpy.searchsorted(keys, values).clip(max=len(keys) - 1)
+
+    return index, keys[index] == values
+
+
+def _lookup(keys: numpy.array, values: numpy.array, query: numpy.array) -> numpy.array:
+
+    """ Values of query keys in sorted keys, NaN if not found """
+
+    index, found = _search(keys, query)
+    if len(keys) == 0:
+        return numpy.full(len(query), numpy.nan)
+
+    return numpy.where(found, values[index], numpy.nan)
+
+
+def _medians(groups: numpy.array, sizes: numpy.array) -> (numpy.array, numpy.array):
+
+    """ Median size per group (> 0) as sorted arrays of groups and medians """
+
+    keep = (groups > 0) & ~numpy.isnan(sizes)
+    groups, sizes = groups[keep], sizes[keep]
+
+    order = numpy.lexsort((sizes, groups))
+    groups, sizes = groups[order], sizes[order]
+
+    unique, start, counts = numpy.unique(
+        groups, return_index=True, return_counts=True
+    )
+    lower = sizes[start + (counts - 1) // 2]
+    upper = sizes[start + counts // 2]
+
+    return unique, (lower + upper) / 2
+
+
+_genome_sizes = None
+
+
+def get_genome_size_lookup() -> GenomeSizes:
+
+    """ Genome sizes of `resources/genome.sizes`, loaded once per process
+
+    The taxonomy for the species and genus fallback is loaded from the file
+    in PATHFINDER_TAXONOMY, `resources/taxonomy.npz` or
+    `~/.pathfinder/taxonomy.npz`, whichever exists first, see `pf taxonomy`.
+
+    :returns genome sizes
+
+    """
+
+    global _genome_sizes
+
+    if _genome_sizes is None:
+        taxonomy = None
+        for file in (
+            os.environ.get('PATHFINDER_TAXONOMY'),
+            RESOURCES / 'taxonomy.npz',
+            Path.home() / '.pathfinder' / 'taxonomy.npz'
+        ):
+            if file and Path(file).exists():
+                taxonomy = Taxonomy.load(file)
+                break
+
+        _genome_sizes = GenomeSizes.from_file(
+            RESOURCES / 'genome.sizes', taxonomy=taxonomy
+        )
+
+    return _genome_sizes
@@ -0,0 +1,267 @@
+"""
+
+Pathfinder manifest module, @esteinig
+
+Download manifest of an output directory in SQLite. Each read file is recorded
+with its run accession, batch, expected size and checksum from the ENA, bytes
+received, status and number of attempts, so that restarted downloads schedule
+only outstanding or failed transfers and the state of a download is summarized
+without inspecting the read files on disk. Statistics of completed read files
+(see `pathfinder.fastq`) are recorded with their completion.
+
+"""
+
+import os
+import time
+import sqlite3
+import threading
+
+from pathlib import Path
+
+# File states
+PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+
+# Statistics of read files, see `MiniAspera.qc_record`
+QC_FIELDS = (
+    'run', 'reads', 'bases', 'mean_length', 'gzip', 'valid',
+    'ena_reads', 'ena_bases', 'files'
+)
+
+
+class Manifest:
+
+    """ Download manifest of an output directory """
+
+    def __init__(self, path: Path):
+
+        """ Manifest
+
+        :param path: manifest database, file paths are recorded relative
+            to its directory, e.g. `<outdir>/manifest.db`
+
+        """
+
+        self.path = Path(path)
+        self.root = os.path.abspath(self.path.parent)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS files ('
+            'file TEXT PRIMARY KEY, run TEXT, batch TEXT, address TEXT, '
+            'size INTEGER, md5 TEXT, received INTEGER DEFAULT 0, '
+            f'status TEXT DEFAULT \'{PENDING}\', attempts INTEGER DEFAULT 0, '
+            'error TEXT, updated REAL)'
+        )
+        self._db.execute(
+            'CREATE INDEX IF NOT EXISTS files_status ON files (status)'
+        )
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS qc (file TEXT PRIMARY KEY, run TEXT, '
+            'reads INTEGER, bases INTEGER, mean_length REAL, gzip INTEGER, '
+            'valid INTEGER, ena_reads INTEGER, ena_bases INTEGER, files INTEGER)'
+        )
+        self._db.commit()
+
+    @classmethod
+    def exists(cls, outdir: Path, name: str = 'manifest.db') -> bool:
+
+        return (Path(outdir) / name).exists()
+
+    def key(self, file: Path) -> str:
+
+        """ Path of a file relative to the manifest directory, empty
+        for the manifest directory itself """
+
+        file = os.path.abspath(file)
+        if file == self.root:
+            return ''
+        elif file.startswith(self.root + os.sep):
+            return file[len(self.root) + 1:]
+        else:
+            return file
+
+    def register(self, records: list) -> None:
+
+        """ Record files to download
+
+        Known files keep their state; their address, expected size and
+        checksum are updated.
+
+        :param records: list of dicts with keys: file, run, batch,
+            address, size, md5
+
+        """
+
+        now = time.time()
+        keys = [self.key(record['file']) for record in records]
+
+        with self._lock:
+            self._db.executemany(
+                'INSERT OR IGNORE INTO files (file, updated) VALUES (?, ?)',
+                [(key, now) for key in keys]
+            )
+            self._db.executemany(
+                'UPDATE files SET run = :run, batch = :batch, address = :address, '
+                'size = :size, md5 = COALESCE(:md5, md5) WHERE file = :file',
+                [
+                    {
+                        'file': key, 'run': record.get('run'),
+                        'batch': record.get('batch'), 'address': record.get('address'),
+                        'size': record.get('size'), 'md5': record.get('md5')
+                    } for key, record in zip(keys, records)
+                ]
+            )
+            self._db.commit()
+
+    def get_status(self, files: list) -> dict:
+
+        """ Status and bytes received of recorded files
+
+        :param files: file paths
+
+        :returns dict of file path: (status, bytes received), for recorded files
+
+        """
+
+        keys = {self.key(file): file for file in files}
+
+        status = {}
+        with self._lock:
+            for key, state, received in self._db.execute(
+                'SELECT file, status, received FROM files'
+            ):
+                if key in keys:
+                    status[keys[key]] = (state, received)
+
+        return status
+
+    def start(self, file: Path) -> None:
+
+        """ Record the start of a transfer attempt """
+
+        self._update(
+            file, 'status = ?, attempts = attempts + 1, error = NULL', (RUNNING,)
+        )
+
+    def finish(self, file: Path, received: int = None, qc: dict = None) -> None:
+
+        """ Record a completed transfer, with the statistics of the file
+
+        :param qc: statistics of the file with keys: `QC_FIELDS`, recorded
+            together with the completion
+
+        """
+
+        self._update(
+            file, 'status = ?, received = ?', (DONE, received), qc=qc
+        )
+
+    def record_qc(self, file: Path, qc: dict) -> None:
+
+        """ Record the statistics of a file, e.g. of files completed
+        before statistics were recorded """
+
+        with self._lock:
+            self._insert_qc(file, qc)
+            self._db.commit()
+
+    def get_qc(self, files: list) -> dict:
+
+        """ Statistics of recorded files
+
+        :param files: file paths
+
+        :returns dict of file path: dict of statistics with keys: `QC_FIELDS`,
+            for files with statistics
+
+        """
+
+        keys = {self.key(file): file for file in files}
+
+        qc = {}
+        with self._lock:
+            for key, *values in self._db.execute(
+                f'SELECT file, {", ".join(QC_FIELDS)} FROM qc'
+            ):
+                if key in keys:
+                    record = dict(zip(QC_FIELDS, values))
+                    for field in ('gzip', 'valid'):
+                        if record[field] is not None:
+                            record[field] = bool(record[field])
+                    qc[keys[key]] = record
+
+        return qc
+
+    def _insert_qc(self, file: Path, qc: dict) -> None:
+
+        self._db.execute(
+            f'INSERT OR REPLACE INTO qc (file, {", ".join(QC_FIELDS)}) '
+            f'VALUES (?{", ?" * len(QC_FIELDS)})',
+            (self.key(file),) + tuple(qc.get(field) for field in QC_FIELDS)
+        )
+
+    def fail(self, file: Path, error: str, received: int = None) -> None:
+
+        """ Record a failed transfer """
+
+        self._update(
+            file, 'status = ?, error = ?, received = ?', (FAILED, error, received)
+        )
+
+    def _update(
+        self, file: Path, assignments: str, values: tuple, qc: dict = None
+    ) -> None:
+
+        with self._lock:
+            self._db.execute(
+                f'UPDATE files SET {assignments}, updated = ? WHERE file = ?',
+                values + (time.time(), self.key(file))
+            )
+            if qc is not None:
+                self._insert_qc(file, qc)
+            self._db.commit()
+
+    def summary(self) -> list:
+
+        """ Files, expected bytes and bytes received by batch and status
+
+        :returns list of dicts with keys: batch, status, files,
+            runs, size, received, attempts
+
+        """
+
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT batch, status, COUNT(*), COUNT(DISTINCT run), '
+                'SUM(size), SUM(received), SUM(attempts) FROM files '
+                'GROUP BY batch, status ORDER BY batch, status'
+            ).fetchall()
+
+        return [
+            dict(zip(
+                ('batch', 'status', 'files', 'runs', 'size', 'received', 'attempts'),
+                row
+            )) for row in rows
+        ]
+
+    def failed(self, limit: int = None) -> list:
+
+        """ Failed files with their number of attempts and last error """
+
+        query = 'SELECT file, run, attempts, error FROM files WHERE status = ? ' \
+                'ORDER BY updated'
+        if limit:
+            query += f' LIMIT {int(limit)}'
+
+        with self._lock:
+            rows = self._db.execute(query, (FAILED,)).fetchall()
+
+        return [dict(zip(('file', 'run', 'attempts', 'error'), row)) for row in rows]
+
+    def close(self) -> None:
+
+        with self._lock:
+            self._db.close()
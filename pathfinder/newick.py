@@ -0,0 +1,147 @@
+"""
+
+Pathfinder newick module, @esteinig
+
+Streaming tokenizer for trees in Newick format. Tip labels and branch lengths are
+extracted in one pass over the file without building a tree, with labels read as
+by DendroPy: quotes are removed from quoted labels and underscores in unquoted
+labels are read as spaces.
+
+"""
+
+import re
+
+from pathlib import Path
+
+TOKENS = re.compile(
+    r"'(?:[^']|'')*'(?!')"      # quoted label
+    r"|'(?:[^']|'')*\Z"         # quoted label continuing in the next chunk
+    r"|\[[^\]]*\]"              # comment
+    r"|\[[^\]]*\Z"              # comment continuing in the next chunk
+    r"|[(),:;]"                 # structure
+    r"|[^\s(),:;\[\]']+"        # unquoted label or branch length
+)
+
+
+def tokenize(newick_file: Path, chunk_size: int = 1024*1024):
+
+    """ Tokens of the first tree in a Newick file
+
+    The file is read in chunks; tokens at the end of a chunk are completed
+    from the next chunk. Comments and whitespace are skipped.
+
+    :param newick_file: tree file in Newick format
+    :param chunk_size: characters read at once
+
+    :returns generator of tokens
+
+    """
+
+    carry = ''
+    with Path(newick_file).open('r') as infile:
+        while True:
+            chunk = infile.read(chunk_size)
+            buffer = carry + chunk
+            eof = not chunk
+            carry = ''
+
+            for match in TOKENS.finditer(buffer):
+                if not eof and match.end() == len(buffer):
+                    # Token may continue in the next chunk:
+                    carry = buffer[match.start():]
+                    break
+
+                token = match.group()
+                if token[0] == '[':
+                    continue
+
+                yield token
+                if token == ';':
+                    return
+
+            if eof:
+                return
+
+
+def iter_tips(newick_file: Path, branch_lengths: bool = False):
+
+    """ Tip labels of the first tree in a Newick file, in order of appearance
+
+    :param newick_file: tree file in Newick format
+    :param branch_lengths: include the branch lengths of the tips
+
+    :returns generator of tip labels, or tuples of tip label and branch
+        length (None if not given), tips without labels are skipped
+
+    """
+
+    previous = None     # previous structural token
+    tip = None          # label of the current tip
+    length = False      # next token is a branch length
+
+    for token in tokenize(newick_file):
+        if token in '(),:;' and len(token) == 1:
+            if token == ':':
+                length = True
+                continue
+
+            if tip is not None:
+                yield (tip, None) if branch_lengths else tip
+                tip = None
+
+            previous = token
+            continue
+
+        if length:
+            length = False
+            if tip is not None:
+                try:
+                    value = float(token)
+                except ValueError:
+                    value = None
+                yield (tip, value) if branch_lengths else tip
+                tip = None
+            continue
+
+        if previous in (None, '(', ','):
+            tip = get_label(token)
+        else:
+            tip = None  # internal node label
+
+    if tip is not None:
+        yield (tip, None) if branch_lengths else tip
+
+
+def get_label(token: str) -> str:
+
+    """ Label of a quoted or unquoted token, as read by DendroPy """
+
+    if token[0] == "'":
+        return token[1:-1].replace("''", "'")
+    else:
+        return token.replace('_', ' ')
+
+
+def split_label(label: str) -> (str, str or None):
+
+    """ Split a tip label into name and date at the last whitespace
+
+    :param label: tip label, e.g. 'sample 2001.5' or 'S aureus 2001.5'
+
+    :returns name and date, or the label and None if the last
+        token of the label is not a date
+
+    """
+
+    parts = label.rsplit(None, 1)
+
+    if len(parts) == 2:
+        name, date = parts
+        try:
+            float(date)
+        except ValueError:
+            return label, None
+
+        return name, date
+
+    return label, None
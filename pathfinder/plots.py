@@ -10,8 +10,6 @@ import matplotlib.pyplot as plt
 import numpy as np
 import pandas
 
-from sklearn.linear_model import LinearRegression
-
 
 def plot_date_randomisation(
     ax: plt.axes,
@@ -58,6 +56,8 @@ def plot_regression(
 
     """
 
+    from sklearn.linear_model import LinearRegression
+
     x = regression_data.iloc[:, 0].values.reshape(-1, 1)  # 2-d
     y = regression_data.iloc[:, 1].values.reshape(-1, 1)
     linear_regressor = LinearRegression()
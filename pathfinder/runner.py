@@ -0,0 +1,418 @@
+"""
+
+Pathfinder runner module, @esteinig
+
+Asynchronous execution of external tools (ascp, wget, lsd2, treetime) under a
+concurrency limit, streaming their output line by line to callbacks, with
+timeouts, cancellation and a synchronous interface for blocking callers.
+Processes are reaped with `os.wait4` and their resource usage is traced.
+
+"""
+
+import os
+import time
+import shlex
+import signal
+import asyncio
+import threading
+import subprocess
+
+from pathlib import Path
+from pathfinder.trace import get_tracer, get_bytes_written
+
+
+class CommandError(Exception):
+
+    """ Raised when a checked command fails or times out """
+
+    def __init__(self, result):
+
+        self.result = result
+
+        if result.timed_out:
+            message = f"Command timed out: {result.cmd}"
+        else:
+            message = f"Command failed with exit status " \
+                      f"{result.returncode}: {result.cmd}"
+
+        super().__init__(message)
+
+
+class CommandResult:
+
+    """ Exit status and captured output of a command """
+
+    def __init__(
+        self,
+        cmd: str,
+        returncode: int,
+        stdout: str = None,
+        stderr: str = None,
+        timed_out: bool = False,
+        wall: float = None,
+        rusage=None
+    ):
+
+        self.cmd = cmd
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.timed_out = timed_out
+
+        # Wall time in seconds and resource usage from `os.wait4`
+        self.wall = wall
+        self.rusage = rusage
+
+    def __repr__(self):
+
+        return f"CommandResult(cmd={self.cmd!r}, returncode={self.returncode}," \
+               f" timed_out={self.timed_out})"
+
+    @property
+    def ok(self) -> bool:
+
+        return self.returncode == 0 and not self.timed_out
+
+
+class CommandRunner:
+
+    """ Run external commands concurrently under a limit """
+
+    def __init__(
+        self,
+        limit: int = 4,
+        timeout: float = None,
+        grace: float = 5.,
+        chunk_size: int = 64*1024
+    ):
+
+        """ Asynchronous command runner
+
+        :param limit: maximum number of commands running at once
+        :param timeout: default timeout of commands in seconds, None for no timeout
+        :param grace: seconds between terminating and killing a command
+            that timed out or was cancelled
+        :param chunk_size: bytes read from the output streams at once
+
+        """
+
+        self.limit = limit
+        self.timeout = timeout
+        self.grace = grace
+        self.chunk_size = chunk_size
+
+        self._semaphore = None
+        self._loop = None
+
+    async def run(
+        self,
+        cmd: str or list,
+        stdout_callback=None,
+        stderr_callback=None,
+        timeout: float = None,
+        shell: bool = False,
+        capture: bool = True,
+        capture_stderr: bool = True,
+        check: bool = False,
+        cwd: Path = None,
+        env: dict = None,
+        outputs: list = None
+    ) -> CommandResult:
+
+        """ Run a command and stream its output line by line
+
+        Lines are split on newlines and carriage returns, so that progress
+        output (e.g. from ascp) reaches the callbacks as it is written.
+
+        :param cmd: command string or list of arguments
+        :param stdout_callback: called with each line of stdout
+        :param stderr_callback: called with each line of stderr
+        :param timeout: timeout in seconds, overrides the runner default
+        :param shell: run the command string in a shell
+        :param capture: collect stdout in the result; stdout is inherited
+            from this process if not collected or streamed
+        :param capture_stderr: collect stderr in the result; stderr is
+            inherited from this process if not collected or streamed
+        :param check: raise an error if the command fails or times out
+        :param cwd: working directory of the command
+        :param env: environment of the command
+        :param outputs: output files of the command, their size is traced
+            as bytes written by the command
+
+        :returns result of the command
+
+        :raises CommandError if :param check and the command fails or times out
+        :raises OSError if the command can not be started
+
+        """
+
+        async with self._get_semaphore():
+            result = await self._run(
+                cmd=cmd,
+                stdout_callback=stdout_callback,
+                stderr_callback=stderr_callback,
+                timeout=self.timeout if timeout is None else timeout,
+                shell=shell,
+                capture=capture,
+                capture_stderr=capture_stderr,
+                cwd=cwd,
+                env=env,
+                outputs=outputs
+            )
+
+        if check and not result.ok:
+            raise CommandError(result)
+
+        return result
+
+    async def run_many(self, cmds: list, **kwargs) -> list:
+
+        """ Run commands concurrently under the limit of the runner
+
+        A failing command cancels the remaining commands if `check` is set.
+
+        :param cmds: list of commands
+        :param kwargs: keyword arguments passed to `CommandRunner.run`
+
+        :returns list of results in the order of the commands
+
+        """
+
+        tasks = [
+            asyncio.ensure_future(self.run(cmd, **kwargs)) for cmd in cmds
+        ]
+        try:
+            return await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+    def run_sync(self, cmd: str or list, **kwargs) -> CommandResult:
+
+        """ Run a command from synchronous code, see `CommandRunner.run` """
+
+        return asyncio.run(self.run(cmd, **kwargs))
+
+    def run_many_sync(self, cmds: list, **kwargs) -> list:
+
+        """ Run commands from synchronous code, see `CommandRunner.run_many` """
+
+        return asyncio.run(self.run_many(cmds, **kwargs))
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+
+        # Semaphores are bound to the event loop they are first used in:
+        loop = asyncio.get_event_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.limit)
+            self._loop = loop
+
+        return self._semaphore
+
+    async def _run(
+        self, cmd, stdout_callback, stderr_callback, timeout,
+        shell, capture, capture_stderr, cwd, env, outputs
+    ) -> CommandResult:
+
+        if isinstance(cmd, (list, tuple)):
+            args = [str(arg) for arg in cmd]
+            cmd = " ".join(shlex.quote(arg) for arg in args)
+        else:
+            args = shlex.split(cmd)
+
+        pipe_stdout = capture or stdout_callback is not None
+        pipe_stderr = capture_stderr or stderr_callback is not None
+
+        start, clock = time.time(), time.perf_counter()
+        proc = subprocess.Popen(
+            cmd if shell else args,
+            shell=shell,
+            stdout=subprocess.PIPE if pipe_stdout else None,
+            stderr=subprocess.PIPE if pipe_stderr else None,
+            cwd=cwd,
+            env=env
+        )
+
+        loop = asyncio.get_event_loop()
+        waiter = self._reap(proc, loop)
+
+        stdout_lines = [] if capture else None
+        stderr_lines = [] if capture_stderr else None
+
+        streams, transports = [], []
+        for pipe, callback, lines in (
+            (proc.stdout, stdout_callback, stdout_lines),
+            (proc.stderr, stderr_callback, stderr_lines)
+        ):
+            if pipe is not None:
+                reader = asyncio.StreamReader()
+                transport, _ = await loop.connect_read_pipe(
+                    lambda: asyncio.StreamReaderProtocol(reader), pipe
+                )
+                transports.append(transport)
+                streams.append(self._stream(reader, callback, lines))
+
+        timed_out = False
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*streams, asyncio.shield(waiter)),
+                timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            timed_out = True
+            await self._stop(proc, waiter)
+        except BaseException:
+            # Cancelled or failing callback, do not leave the process behind:
+            await self._stop(proc, waiter)
+            self._trace(args, cmd, start, clock, waiter, outputs, "cancelled")
+            raise
+        finally:
+            for transport in transports:
+                transport.close()
+
+        returncode, rusage = waiter.result()
+        wall = self._trace(
+            args, cmd, start, clock, waiter, outputs,
+            "timeout" if timed_out else returncode
+        )
+
+        return CommandResult(
+            cmd=cmd,
+            returncode=returncode,
+            stdout=None if stdout_lines is None else "\n".join(stdout_lines),
+            stderr=None if stderr_lines is None else "\n".join(stderr_lines),
+            timed_out=timed_out,
+            wall=wall,
+            rusage=rusage
+        )
+
+    @staticmethod
+    def _reap(proc: subprocess.Popen, loop) -> asyncio.Future:
+
+        """ Wait for a process in a thread, with `os.wait4` for its resource usage """
+
+        future = loop.create_future()
+
+        def wait():
+            rusage = None
+            try:
+                _, status, rusage = os.wait4(proc.pid, 0)
+                if os.WIFSIGNALED(status):
+                    proc.returncode = -os.WTERMSIG(status)
+                else:
+                    proc.returncode = os.WEXITSTATUS(status)
+            except ChildProcessError:
+                # Reaped elsewhere, e.g. by Popen.poll, without resource usage
+                pass
+            finally:
+                # Always resolve, the command is awaited on the future:
+                try:
+                    loop.call_soon_threadsafe(
+                        future.set_result, (proc.returncode, rusage)
+                    )
+                except RuntimeError:
+                    pass  # event loop closed
+
+        threading.Thread(target=wait, daemon=True).start()
+
+        return future
+
+    @staticmethod
+    def _trace(args, cmd, start, clock, waiter, outputs, status) -> float:
+
+        """ Record the resource usage of a command, if tracing """
+
+        wall = time.perf_counter() - clock
+
+        tracer = get_tracer()
+        if tracer is not None:
+            tracer.record(
+                name=Path(args[0]).name if args else cmd,
+                category="command",
+                start=start,
+                wall=wall,
+                status=status,
+                rusage=waiter.result()[1] if waiter.done() else None,
+                bytes_written=get_bytes_written(outputs),
+                cmd=cmd
+            )
+
+        return wall
+
+    async def _stream(self, reader, callback, lines: list or None) -> None:
+
+        """ Read a stream in chunks and emit complete lines """
+
+        pending = b""
+        while True:
+            chunk = await reader.read(self.chunk_size)
+            if not chunk:
+                break
+
+            pending += chunk
+            # Keep a trailing carriage return, it may be the start of \r\n:
+            if pending.endswith(b"\r"):
+                data, pending = pending[:-1], b"\r"
+            else:
+                data, pending = pending, b""
+
+            *complete, rest = data.replace(b"\r\n", b"\n").replace(
+                b"\r", b"\n"
+            ).split(b"\n")
+            pending = rest + pending
+
+            for line in complete:
+                self._emit(line, callback, lines)
+
+        pending = pending.rstrip(b"\r")
+        if pending:
+            self._emit(pending, callback, lines)
+
+    @staticmethod
+    def _emit(line: bytes, callback, lines: list or None) -> None:
+
+        line = line.decode("utf-8", errors="replace")
+        if lines is not None:
+            lines.append(line)
+        if callback is not None:
+            callback(line)
+
+    async def _stop(self, proc: subprocess.Popen, waiter) -> None:
+
+        """ Terminate a process and kill it after the grace period
+
+        Signals are sent with `os.kill`, as the methods of `Popen` poll the
+        process and may reap it before the reaper thread does.
+
+        """
+
+        if waiter.done():
+            return
+
+        try:
+            os.kill(proc.pid, signal.SIGTERM)
+            try:
+                await asyncio.wait_for(
+                    asyncio.shield(waiter), timeout=self.grace
+                )
+            except asyncio.TimeoutError:
+                os.kill(proc.pid, signal.SIGKILL)
+                await waiter
+        except ProcessLookupError:
+            await waiter
+
+
+def run_command(cmd: str or list, limit: int = 1, **kwargs) -> CommandResult:
+
+    """ Run a command synchronously, see `CommandRunner.run` """
+
+    return CommandRunner(limit=limit).run_sync(cmd, **kwargs)
+
+
+def run_commands(cmds: list, limit: int = 4, **kwargs) -> list:
+
+    """ Run commands concurrently under a limit, see `CommandRunner.run_many` """
+
+    return CommandRunner(limit=limit).run_many_sync(cmds, **kwargs)
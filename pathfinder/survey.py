@@ -1,41 +1,122 @@
+import os
 import time
-import uuid
+import threading
+import numpy
 import pandas
 import urllib.request
 
-from pathfinder.utils import get_genome_sizes, get_aspera_key
+from pathfinder.utils import get_aspera_key
+from pathfinder.genomes import get_genome_size_lookup
+from pathfinder.cache import QueryCache
+from pathfinder.transfer import NativeTransfer, TransferError, Bandwidth
+from pathfinder.fastq import FastqStats, is_fastq
+from pathfinder.manifest import Manifest, DONE
+from pathfinder.runner import run_command, CommandError
 
 import shlex
-import subprocess
 
-from io import StringIO
 from tqdm import tqdm
+from concurrent.futures import ThreadPoolExecutor, wait
 from pathlib import Path
 from pandas.errors import EmptyDataError
 
 
 class MiniAspera:
 
-    def __init__(self, force=False):
+    def __init__(
+        self,
+        force=False,
+        wget=False,
+        port: int = 33001,
+        bandwidth: Bandwidth = None,
+        aspera_retries: int = 2,
+        failover: int = 3,
+        ascp: str = 'ascp',
+        check_retries: int = 1
+    ):
+
+        """ Aspera transfers with fallback to FTP
+
+        :param force: download files even if they exist
+        :param wget: download from FTP with wget instead of native transfers
+        :param port: TCP port of Aspera (ascp -P)
+        :param bandwidth: total bandwidth shared by concurrent transfers,
+            unlimited if None
+        :param aspera_retries: retries of failed Aspera transfers before
+            a file is downloaded from FTP instead
+        :param failover: number of consecutive files that failed over to
+            FTP after which Aspera is not attempted for further files
+        :param ascp: Aspera client executable
+        :param check_retries: downloads of read files that fail integrity
+            checks, see `MiniAspera.download_checked`
+
+        """
 
-        self.port = 33001
-        self.limit = 1024
+        self.port = port
+        self.limit = 1024  # maximum rate of each Aspera transfer (Mbit/s)
+
+        self.bandwidth = bandwidth or Bandwidth()
+        self.aspera_retries = aspera_retries
+        self.failover = failover
+        self.check_retries = check_retries
+
+        self._failed_over = 0
+        self._lock = threading.Lock()
 
         self.force = force
+        self.refresh = 0.5
 
-        self.ascp = 'ascp'
+        self.ascp = ascp
         self.key = get_aspera_key()
 
         self.fasp = "era-fasp@fasp.sra.ebi.ac.uk:"
 
+        # Native HTTP/FTP transfers, unless wget is requested
+        self.wget = wget
+        self.transfer = NativeTransfer(bandwidth=self.bandwidth)
+
     def download_batch(
         self,
         file,
         outdir: str = ".",
         limit_download: int = None,
         ftp: bool = False,
+        workers: int = 1,
+        progress=None,
+        manifest: Manifest = None
     ):
 
+        """ Download the read files of a batch with a bounded worker pool
+
+        Each read file (including both mates of a pair) is submitted as its
+        own transfer, so that up to :param workers transfers are in flight
+        at any time. Progress is tracked as aggregate bytes written to the
+        output files of the batch.
+
+        With a manifest, files recorded as done are not scheduled again and
+        are not inspected on disk; the outcome of each transfer is recorded.
+        Failed transfers do not stop the batch, they are returned when all
+        other transfers of the batch are done.
+
+        Read files are checked as they are transferred and their statistics
+        written to the QC table of the batch (`qc.tsv`), see `write_qc`. With
+        a manifest, statistics are recorded with the completion of each file
+        and the QC table is written from the manifest; files completed before
+        statistics were recorded are read once from disk.
+
+        :param file: batch file (.csv) with columns: ftp_1, ftp_2, size
+        :param outdir: output directory for read files
+        :param limit_download: download only the first runs of the batch
+        :param ftp: download from FTP instead of Aspera
+        :param workers: number of concurrent transfers
+        :param progress: callback instead of the progress bar, called with
+            files done, total files, bytes done and total bytes (or None)
+        :param manifest: download manifest of the output directory
+
+        :returns list of tuples of (outfile, error) of failed transfers
+
+        """
+
         batch = self.read_batch(file)
 
         outpath = Path(outdir)
@@ -45,69 +126,534 @@ class MiniAspera:
         if limit_download:
             batch = batch.iloc[0:limit_download]
 
-        with tqdm(total=len(batch)) as pbar:
-            pbar.set_description("Downloading batch")
+        transfers = self.get_transfers(batch, outdir=outpath, ftp=ftp)
+
+        try:
+            total = int(batch["size"].astype(float).sum()*1024*1024)
+        except (KeyError, ValueError):
+            total = None
+
+        files = len(transfers)
+
+        completed = 0
+        outfiles = [outfile for _, outfile, *_ in transfers]
+        if manifest is not None:
+            manifest.register([
+                {
+                    'file': outfile, 'run': run, 'batch': manifest.key(outpath),
+                    'address': address, 'size': size, 'md5': md5
+                } for address, outfile, md5, run, size, _ in transfers
+            ])
+            if not self.force:
+                status = manifest.get_status(
+                    [outfile for _, outfile, *_ in transfers]
+                )
+                done = [
+                    status[outfile][1] or 0 for _, outfile, *_ in transfers
+                    if status.get(outfile, (None,))[0] == DONE
+                ]
+                completed = sum(done)
+
+                self._record_qc(manifest, [
+                    transfer for transfer in transfers
+                    if status.get(transfer[1], (None,))[0] == DONE
+                ])
+
+                transfers = [
+                    transfer for transfer in transfers
+                    if status.get(transfer[1], (None,))[0] != DONE
+                ]
+
+        existing = completed + self._bytes_written(transfers)
+
+        submitted, checked, failed = {}, {}, []
+        try:
+            with tqdm(
+                total=total, initial=existing, unit="B",
+                unit_scale=True, unit_divisor=1024, disable=progress is not None
+            ) as pbar, ThreadPoolExecutor(max_workers=workers) as executor:
+                pbar.set_description("Downloading batch")
+
+                submitted = {
+                    executor.submit(
+                        self.download_recorded,
+                        manifest=manifest,
+                        address=address,
+                        outfile=outfile,
+                        run=run,
+                        force=self.force,
+                        ftp=ftp,
+                        md5=md5,
+                        size=size,
+                        expected=expected
+                    ): outfile
+                    for address, outfile, md5, run, size, expected in transfers
+                }
+                pending = set(submitted)
+
+                try:
+                    while pending:
+                        done, pending = wait(pending, timeout=self.refresh)
+                        for future in done:
+                            try:
+                                future.result()
+                            except TransferError as err:
+                                failed.append((submitted[future], str(err)))
+
+                        written = completed + self._bytes_written(transfers)
+                        pbar.update(written - pbar.n)
+
+                        if progress is not None:
+                            progress(
+                                files - len(pending), files, written, total
+                            )
+                except BaseException:
+                    for future in pending:
+                        future.cancel()
+                    raise
+        finally:
+            # Statistics of all completed files, including transfers that
+            # completed after the batch was stopped:
+            if manifest is not None:
+                checked = manifest.get_qc(outfiles)
+            else:
+                for future, outfile in submitted.items():
+                    if future.done() and not future.cancelled() \
+                            and future.exception() is None \
+                            and future.result() is not None:
+                        checked[outfile] = future.result()
+
+            if checked:
+                self.write_qc(
+                    [
+                        dict(record, file=Path(outfile).name)
+                        for outfile, record in checked.items()
+                    ],
+                    outpath / "qc.tsv"
+                )
 
-            for i, fastq in batch.iterrows():
+        return failed
+
+    def _record_qc(self, manifest: Manifest, transfers: list) -> None:
+
+        """ Record statistics of completed read files without statistics,
+        e.g. in manifests from before statistics were recorded """
+
+        recorded = manifest.get_qc([outfile for _, outfile, *_ in transfers])
+        for _, outfile, _, run, _, expected in transfers:
+            if outfile not in recorded and is_fastq(outfile) \
+                    and outfile.exists():
+                manifest.record_qc(outfile, self.qc_record(
+                    run, expected, FastqStats().read(outfile)
+                ))
+
+    def get_transfers(self, batch, outdir, ftp: bool = False) -> list:
+
+        """ Get the transfer addresses and output files of a batch
+
+        :param batch: batch dataframe with columns: ftp_1, ftp_2
+            and optional columns: md5_1, md5_2, bytes_1, bytes_2,
+            reads, bases
+        :param outdir: output directory for read files
+        :param ftp: use FTP addresses instead of Aspera addresses
+
+        :returns list of tuples of (address, outfile, md5, run, size,
+            expected), with the run accession, expected file size (or None)
+            and expected reads and bases of the run with its number of
+            read files, see `MiniAspera.download_checked`
+
+        """
+
+        transfers = []
+        for i, fastq in batch.iterrows():
+            links = [
+                fastq[f"ftp_{mate}"] for mate in ("1", "2")
+                if fastq[f"ftp_{mate}"] and
+                not isinstance(fastq[f"ftp_{mate}"], float)
+            ]
+            expected = tuple(
+                None if pandas.isna(count) else int(count) for count in (
+                    pandas.to_numeric(fastq.get(column), errors="coerce")
+                    for column in ("reads", "bases")
+                )
+            ) + (len(links),)
+
+            for mate in ("1", "2"):
+                link = fastq[f"ftp_{mate}"]
+                if not link or isinstance(link, float):
+                    continue
+
+                md5 = fastq.get(f"md5_{mate}")
+                if not md5 or isinstance(md5, float):
+                    md5 = None
+
+                size = pandas.to_numeric(
+                    fastq.get(f"bytes_{mate}"), errors="coerce"
+                )
+                size = None if pandas.isna(size) else int(size)
 
                 if ftp:
-                    fq1_address = fastq["ftp_1"]
+                    address = link
                 else:
-                    fq1_address = fastq["ftp_1"].replace(
+                    address = link.replace(
                         "ftp.sra.ebi.ac.uk", self.fasp
                     )
 
-                fq1_path = Path(outdir) / Path(fq1_address).name
+                transfers.append((
+                    address, Path(outdir) / Path(address).name, md5,
+                    _run_accession(fastq, link), size, expected
+                ))
+
+        return transfers
+
+    @staticmethod
+    def _bytes_written(transfers) -> int:
+
+        """ Sum the sizes of all output and partial files on disk """
+
+        written = 0
+        for _, outfile, *_ in transfers:
+            for file in (outfile, NativeTransfer.get_partial(outfile)):
+                try:
+                    written += file.stat().st_size
+                    break
+                except OSError:
+                    pass
+
+        return written
+
+    def download_recorded(
+        self,
+        manifest: Manifest,
+        address: str,
+        outfile: Path,
+        run: str = None,
+        size: int = None,
+        **kwargs
+    ) -> dict or None:
+
+        """ Download a read file and record the outcome in the manifest
+
+        Transfers that complete without output file, or with an output
+        file that does not have the expected size, are recorded as failed.
+        Statistics of read files are recorded with their completion.
 
-                self.download(
-                    address=fq1_address,
-                    outfile=fq1_path,
-                    force=self.force,
-                    ftp=ftp
+        :param manifest: download manifest, or None to download only
+        :param address: file address
+        :param outfile: output file path
+        :param run: run accession of the read file
+        :param size: expected file size in bytes
+        :param kwargs: keyword arguments of `MiniAspera.download_checked`
+
+        :returns statistics of the read file, see `MiniAspera.qc_record`,
+            None if the file was not transferred (exists) or is not FASTQ
+
+        :raises TransferError if the transfer does not produce
+            the expected output file
+
+        """
+
+        expected = kwargs.get("expected", (None, None, 1))
+
+        if manifest is None:
+            stats = self.download_checked(
+                address=address, outfile=outfile, **kwargs
+            )
+            return None if stats is None else \
+                self.qc_record(run, expected, stats)
+
+        manifest.start(outfile)
+        try:
+            stats = self.download_checked(
+                address=address, outfile=outfile, **kwargs
+            )
+            qc = None if stats is None else self.qc_record(run, expected, stats)
+
+            try:
+                received = outfile.stat().st_size
+            except OSError:
+                raise TransferError(f"Transfer produced no file: {address}")
+
+            if size is not None and received != size:
+                raise TransferError(
+                    f"File size {received} does not match {size}: {address}"
                 )
+        except Exception as err:
+            manifest.fail(
+                outfile, error=str(err) or type(err).__name__,
+                received=self._bytes_written([(address, outfile)])
+            )
+            raise
 
-                if fastq["ftp_2"] and not isinstance(
-                        fastq["ftp_2"], float
-                ):
-                    if ftp:
-                        fq2_address = fastq["ftp_2"]
-                    else:
-                        fq2_address = fastq["ftp_2"].replace(
-                            "ftp.sra.ebi.ac.uk", self.fasp
-                        )
-                    fq2_path = Path(outdir) / Path(fq2_address).name
-                    self.download(
-                        address=fq2_address,
-                        outfile=fq2_path,
-                        force=self.force,
-                        ftp=ftp
-                    )
+        manifest.finish(outfile, received=received, qc=qc)
 
-                pbar.update(1)
+        return qc
+
+    def download_checked(
+        self,
+        address: str,
+        outfile: Path,
+        expected: tuple = (None, None, 1),
+        **kwargs
+    ) -> FastqStats or None:
 
-    def download(self, address, outfile, force=False, ftp=False):
+        """ Download a read file and check its integrity
+
+        Read files are decompressed and counted as they are transferred.
+        Files with an invalid gzip stream or incomplete records, or with
+        read counts (and base counts of runs with a single read file) that
+        do not match the ENA, are downloaded again. Files that match their
+        checksum are not downloaded again for mismatched counts, which are
+        then reported only.
+
+        :param address: file address
+        :param outfile: output file path
+        :param expected: reads and bases of the run and its number of
+            read files, see `MiniAspera.get_transfers`
+        :param kwargs: keyword arguments of `MiniAspera.download`
+
+        :returns statistics of the read file, None if the file was not
+            transferred (exists) or is not FASTQ
+
+        :raises TransferError if the read file is not complete after
+            all downloads
+
+        """
+
+        if not is_fastq(outfile):
+            self.download(address=address, outfile=outfile, **kwargs)
+            return None
+
+        reads, bases, files = expected
+
+        for attempt in range(self.check_retries + 1):
+            stats = FastqStats()
+            checksum = self.download(
+                address=address, outfile=outfile, stats=stats, **kwargs
+            )
+            if stats.finish().size == 0:
+                return None
+
+            problem = stats.check(
+                reads=reads, bases=bases if files == 1 else None
+            )
+            if problem is None:
+                return stats
+
+            verified = checksum is not None and kwargs.get("md5") is not None
+            if stats.valid and verified:
+                break
+
+            if attempt < self.check_retries:
+                tqdm.write(f"{problem}, downloading again: {outfile}")
+                kwargs["force"] = True
+
+        if not stats.valid:
+            # Not to be skipped as existing file by the next download:
+            if outfile.exists():
+                outfile.unlink()
+            raise TransferError(f"{problem}: {address}")
+
+        tqdm.write(f"{problem}: {outfile}")
+
+        return stats
+
+    @staticmethod
+    def qc_record(run: str, expected: tuple, stats: FastqStats) -> dict:
+
+        """ Statistics of a read file with the expected counts of its run
+
+        :param run: run accession
+        :param expected: reads and bases of the run and its number of
+            read files, see `MiniAspera.get_transfers`
+        :param stats: statistics of the read file
+
+        :returns dict with keys: run, reads, bases, mean_length, gzip,
+            valid, ena_reads, ena_bases, files
+
+        """
+
+        return {
+            "run": run,
+            "reads": stats.reads,
+            "bases": stats.bases,
+            "mean_length": stats.mean_length,
+            "gzip": stats.valid_gzip,
+            "valid": stats.valid,
+            "ena_reads": expected[0],
+            "ena_bases": expected[1],
+            "files": expected[2]
+        }
+
+    @staticmethod
+    def write_qc(records: list, qc_file: Path) -> pandas.DataFrame:
+
+        """ Write the statistics of read files to the QC table of a batch
+
+        Files of previous downloads into the batch are kept in the table,
+        unless the files were downloaded again.
+
+        :param records: statistics of read files with their file names
+            in key: file, see `MiniAspera.qc_record`
+        :param qc_file: QC table (.tsv) with columns: run, file, reads,
+            bases, mean_length, gzip, valid, ena_reads, ena_bases, check;
+            base counts are checked against the ENA for all files of a run
+
+        :returns QC table
+
+        """
+
+        qc = pandas.DataFrame(records, columns=[
+            "run", "file", "reads", "bases", "mean_length", "gzip", "valid",
+            "ena_reads", "ena_bases", "files"
+        ])
+
+        if qc_file.exists():
+            previous = pandas.read_csv(qc_file, sep="\t")
+            previous = previous[~previous.file.isin(qc.file)]
+            qc = pandas.concat(
+                [previous.drop(columns="check"), qc], ignore_index=True
+            )
+
+        for column in ("ena_reads", "ena_bases", "files"):
+            qc[column] = qc[column].astype("Int64")
+
+        run_bases = qc.groupby("run").bases.transform("sum")
+        run_files = qc.groupby("run").file.transform("count")
+
+        mismatch = (qc.reads != qc.ena_reads).fillna(False) | (
+            (run_files == qc.files) & (run_bases != qc.ena_bases)
+        ).fillna(False)
+
+        qc["check"] = numpy.where(
+            ~qc.valid.astype(bool), "invalid",
+            numpy.where(mismatch, "mismatch", "pass")
+        )
+
+        qc.sort_values(["run", "file"]).to_csv(qc_file, sep="\t", index=False)
+
+        return qc
+
+    def download(
+        self, address, outfile, force=False, ftp=False, md5=None, stats=None
+    ):
+
+        """ Download a read file with Aspera, native transfers or wget
+
+        :param stats: statistics of the read file, updated as the file is
+            transferred by native transfers, or read after the transfer
+            by Aspera or wget, see `pathfinder.transfer.Digest`
+
+        :returns MD5 checksum of native transfers, None otherwise
+
+        """
 
         # Skip existing files
         if not force and outfile.exists():
-            print(f"File exists: {outfile}")
-            return
-
-        if ftp:
-            cmd = shlex.split(f"wget {address} -O {outfile}")
-        else:
-            cmd = shlex.split(
-                f"{self.ascp} -QT -l {str(self.limit)}m"
-                f" -P{str(self.port)} -i {self.key} -q "
-                f"{address} {outfile}"
+            tqdm.write(f"File exists: {outfile}")
+            return None
+
+        if not ftp:
+            if not self.aspera_failed():
+                if self.download_aspera(address, outfile):
+                    self._read_stats(outfile, stats)
+                    return None
+                tqdm.write(f"Aspera failed, downloading from FTP: {outfile}")
+
+            address = self.get_ftp_address(address)
+
+        if not self.wget:
+            # Resumable and verified against checksum, if provided
+            return self.transfer.download(
+                address=address, outfile=outfile, md5=md5, force=force,
+                stats=stats
             )
-        try:
-            subprocess.call(cmd)
-        except subprocess.CalledProcessError:
-            print("Error in subprocess.")
-            raise  # handle errors in the called executable
-        except OSError:
-            print("Executable not found.")
-            raise  # executable not found
+
+        with self.bandwidth.transfer():
+            share = self.bandwidth.share()
+            rate = f" --limit-rate={int(share * 1e6 / 8)}" if share else ""
+
+            cmd = shlex.split(f"wget{rate} {address} -O {outfile}")
+            try:
+                run_command(
+                    cmd, capture=False, capture_stderr=False, outputs=[outfile]
+                )
+            except OSError:
+                print("Executable not found.")
+                raise  # executable not found
+
+        self._read_stats(outfile, stats)
+
+        return None
+
+    @staticmethod
+    def _read_stats(outfile: Path, stats: FastqStats = None) -> None:
+
+        """ Statistics of a file transferred by an external client are read
+        from disk, as its data does not pass through this process """
+
+        if stats is not None and outfile.exists():
+            stats.read(outfile)
+
+    def download_aspera(self, address, outfile) -> bool:
+
+        """ Download a file with Aspera, with retries
+
+        Each attempt is limited to the current share of the bandwidth;
+        attempts that fail do not leave output files.
+
+        :param address: Aspera file address
+        :param outfile: output file path
+
+        :returns True if the file was downloaded, False if all attempts failed
+
+        """
+
+        for attempt in range(self.aspera_retries + 1):
+            with self.bandwidth.transfer():
+                share = self.bandwidth.share()
+                rate = self.limit if share is None else min(self.limit, share)
+
+                cmd = shlex.split(
+                    f"{self.ascp} -QT -l {max(1, int(rate))}m"
+                    f" -P{str(self.port)} -i {self.key} -q "
+                    f"{address} {outfile}"
+                )
+                try:
+                    run_command(
+                        cmd, capture=False, capture_stderr=False,
+                        outputs=[outfile], check=True
+                    )
+                    success = outfile.exists()
+                except (CommandError, OSError):
+                    success = False
+
+            if success:
+                with self._lock:
+                    self._failed_over = 0
+                return True
+
+            if outfile.exists():
+                outfile.unlink()
+
+        with self._lock:
+            self._failed_over += 1
+
+        return False
+
+    def aspera_failed(self) -> bool:
+
+        """ Aspera failed for the last consecutive files, e.g. when the port
+        is blocked, so that further files are downloaded from FTP directly """
+
+        with self._lock:
+            return bool(self.failover) and self._failed_over >= self.failover
+
+    def get_ftp_address(self, address: str) -> str:
+
+        """ FTP address of an Aspera address, see `MiniAspera.get_transfers` """
+
+        return address.replace(self.fasp, "ftp.sra.ebi.ac.uk")
 
     @staticmethod
     def read_batch(file):
@@ -121,20 +667,39 @@ class Survey:
     Simple accessor class wrapping wget to pull short-read data from the ENA.
     """
 
-    def __init__(self, outdir=None):
+    def __init__(
+        self,
+        outdir=None,
+        cache: QueryCache = None,
+        offline: bool = False
+    ):
 
         self.outdir = outdir
 
+        # Query results are served from the cache, if provided, and
+        # exclusively from the cache when offline:
+        self.cache = cache
+        self.offline = offline
+
+        if offline and cache is None:
+            raise ValueError("Offline queries require a query cache.")
+
         self.url_result = "read_run"
         self.url_display = "report"
-        self.url_query = "https://www.ebi.ac.uk/ena/data/" \
-                         "warehouse/search?query="
+        self.url_query = os.environ.get(
+            "PATHFINDER_ENA_URL",
+            "https://www.ebi.ac.uk/ena/data/warehouse/search"
+        ) + "?query="
+
+        # Results are retrieved in pages of records, parsed in chunks:
+        self.page_size = 100000
+        self.chunk_size = 10000
         self.url_fields = "run_accession,tax_id,fastq_ftp,fastq_bytes," \
-                          "read_count,base_count," \
+                          "fastq_md5,read_count,base_count," \
                           "instrument_platform,instrument_model," \
                           "library_layout,library_source," \
                           "library_strategy,sample_accession,study_accession," \
-                          "submitted_ftp,submitted_bytes"
+                          "submitted_ftp,submitted_bytes,submitted_md5"
 
         # TODO add study accession
 
@@ -150,7 +715,30 @@ class Survey:
 
     def query_from_csv(self, file):
 
-        self.query = pandas.read_csv(file)
+        """ Read query results indexed by run accession, as written by
+        `Survey.query_to_csv` or with a column: run_accession
+
+        :raises ValueError if the file has no run accessions
+
+        """
+
+        query = pandas.read_csv(file)
+
+        if "run_accession" in query.columns:
+            query = query.set_index("run_accession")
+        elif len(query.columns) > 0 and query.columns[0] == "Unnamed: 0" \
+                and query[query.columns[0]].map(
+                    lambda run: isinstance(run, str)
+                ).all():
+            query = query.set_index(query.columns[0])
+            query.index.name = None
+        else:
+            raise ValueError(
+                f"Query file has no run accessions in its index "
+                f"or a column: run_accession: {file}"
+            )
+
+        self.query = query
 
         return self.query
 
@@ -169,9 +757,46 @@ class Survey:
         self.query = self.query.query(ops)
 
     @staticmethod
-    def batch_output(batches, outdir="batches", exist_ok=True):
+    def batch_output(
+        batches, outdir="batches", exist_ok=True, manifest="batches.csv"
+    ):
+
+        """ Write batches to their own output directories
+
+        :param batches: list of batch dataframes
+        :param outdir: output directory for batch directories
+        :param exist_ok: allow existing batch directories
+        :param manifest: file name of the batch plan summary in the
+            output directory, with columns: batch, runs, size, bases, csv
+
+        :returns generator of tuples of (batch directory, batch file)
+
+        """
+
+        batches = list(batches)
 
         outdir = Path.cwd() / outdir
+        outdir.mkdir(parents=True, exist_ok=True)
+
+        plan = []
+        for i, batch in enumerate(batches):
+            plan.append({
+                "batch": i,
+                "runs": len(batch),
+                "size": pandas.to_numeric(
+                    batch.get("size"), errors="coerce"
+                ).sum(),
+                "bases": pandas.to_numeric(
+                    batch.get("bases"), errors="coerce"
+                ).sum(),
+                "csv": f"batch_{i}/batch_{i}.csv"
+            })
+
+        if manifest:
+            pandas.DataFrame(
+                plan, columns=["batch", "runs", "size", "bases", "csv"]
+            ).to_csv(outdir / manifest, index=False)
+
         for i, batch in enumerate(batches):
             batch_dir = outdir / f"batch_{i}"
             batch_csv = batch_dir / f"batch_{i}.csv"
@@ -181,22 +806,47 @@ class Survey:
 
             yield batch_dir, batch_csv
 
-    def batch(self, query=None, batch_size=None, max_gb=None):
+    def batch(self, query=None, batch_size=None, max_gb=None, balance=False):
+
+        """ Split the query results into batches
+
+        With a maximum size, runs are packed into as few batches as possible
+        under the size budget (first-fit decreasing); runs larger than the
+        budget are placed into their own batch. Batches can additionally be
+        balanced by the total bases of their runs, so that batch jobs have
+        similar run times.
+
+        :param query: query dataframe with column: size (MB) and bases
+        :param batch_size: number of runs per batch
+        :param max_gb: maximum size of each batch in GB
+        :param balance: balance batches of maximum size by total bases
+
+        :returns list of batch dataframes
+
+        :raises ValueError if neither batch size nor maximum size is set
+
+        """
 
         if query is None:
             query = self.query
 
         if max_gb:
-            running_size = []
-            batches = []
-            start = 0
-            for i, entry in query.iterrows():
-                running_size.append(float(entry["size"])/1000)
-                if sum(running_size) > max_gb:
-                    batches += [query[start:i]]
-                    start = i
-                    running_size = []
-            return batches
+            sizes = pandas.to_numeric(
+                query["size"], errors="coerce"
+            ).fillna(0).values/1000
+
+            if balance:
+                weights = pandas.to_numeric(
+                    query["bases"], errors="coerce"
+                ).fillna(0).values
+            else:
+                weights = None
+
+            return [
+                query.iloc[indices] for indices in self._pack_batches(
+                    sizes=sizes, capacity=max_gb, weights=weights
+                )
+            ]
         elif batch_size:
             return [
                 query[i:i + batch_size] for i in range(
@@ -208,6 +858,64 @@ class Survey:
                 "Either maximum gigabytes or batch size must be set."
             )
 
+    @staticmethod
+    def _pack_batches(
+        sizes: numpy.array, capacity: float, weights: numpy.array = None
+    ) -> list:
+
+        """ Pack items into batches under a size capacity
+
+        Items are packed first-fit decreasing by size. If weights are given,
+        the same number of batches is then filled by assigning items in
+        decreasing order of weight to the lightest batch with capacity left,
+        opening further batches only if an item does not fit anywhere.
+
+        :param sizes: item sizes
+        :param capacity: maximum total size of items in a batch
+        :param weights: item weights to balance across batches
+
+        :returns list of arrays of item indices per batch, in input order
+
+        """
+
+        def pack(order, select, n=0):
+
+            # At most one batch per item:
+            loads = numpy.zeros(len(sizes))
+            filled = numpy.zeros(len(sizes))
+            assigned = numpy.zeros(len(sizes), dtype=int)
+
+            for i in order:
+                fits = numpy.flatnonzero(filled[:n] + sizes[i] <= capacity)
+                if fits.size:
+                    b = select(fits, loads)
+                else:
+                    b, n = n, n + 1
+
+                filled[b] += sizes[i]
+                loads[b] += weights[i] if weights is not None else sizes[i]
+                assigned[i] = b
+
+            return assigned, n
+
+        # First-fit decreasing by size:
+        assigned, n = pack(
+            numpy.argsort(-sizes, kind="stable"), lambda fits, _: fits[0]
+        )
+
+        if weights is not None:
+            # Open as many batches as in the first-fit plan, then choose
+            # the lightest batch for each item by decreasing weight:
+            assigned, _ = pack(
+                numpy.argsort(-weights, kind="stable"),
+                lambda fits, loads: fits[numpy.argmin(loads[fits])], n=n
+            )
+
+        return [
+            numpy.flatnonzero(assigned == b)
+            for b in numpy.unique(assigned)
+        ]
+
     def query_ena(self, species="Staphylococcus aureus", scheme="illumina",
                   study: str = None, sample: list = None, term: str = None,
                   submitted_fastq: bool = False) -> (dict, str):
@@ -275,17 +983,94 @@ class Survey:
 
         return query_results, term
 
-    @staticmethod
-    def _query(url) -> pandas.DataFrame:
+    def _query(self, url) -> pandas.DataFrame:
 
-        query_results = StringIO(urllib.request.urlopen(url)
-                                 .read().decode('utf-8'))
+        """ Get the results of a query from the cache or the ENA warehouse
 
-        return pandas.read_csv(query_results, sep="\t")
+        :param url: query url
+
+        :returns dataframe of query results
+
+        :raises ValueError if offline and the query is not in the cache
+
+        """
+
+        if self.cache is not None:
+            query_results = self.cache.get(url, expired=self.offline)
+            if query_results is not None:
+                return query_results
+
+        if self.offline:
+            raise ValueError(f"Query results not found in cache: {url}")
+
+        chunks = list(self._query_pages(url))
+
+        if chunks:
+            query_results = pandas.concat(chunks, ignore_index=True)
+        else:
+            query_results = pandas.DataFrame(
+                columns=self.url_fields.split(",")
+            )
+
+        if self.cache is not None:
+            self.cache.put(url, query_results)
+
+        return query_results
+
+    def _query_pages(self, url):
+
+        """ Stream the results of a query from the ENA warehouse by page
+
+        Records of each page are parsed into dataframe chunks as they
+        arrive, without holding the response in memory.
+
+        :param url: query url
+
+        :returns generator of dataframe chunks of query results
+
+        """
+
+        # First record of the page, starting at 1:
+        offset = 1
+        while True:
+            page = f"{url}&offset={offset}&length={self.page_size}"
+
+            records = 0
+            with urllib.request.urlopen(page) as response:
+                try:
+                    for chunk in pandas.read_csv(
+                        response, sep="\t", chunksize=self.chunk_size
+                    ):
+                        records += len(chunk)
+                        yield chunk
+                except EmptyDataError:
+                    pass
+
+            if records < self.page_size:
+                break
+
+            offset += self.page_size
 
     @staticmethod
     def _sanitize_ena_query(df, url, submitted_fastq) -> pandas.DataFrame:
 
+        """ Sanitize the ENA query results with columnar operations
+
+        Links, sizes and checksums are split per run, runs with links not
+        conforming to their library layout are dropped and sizes (MB) and
+        coverage are computed from a vectorized lookup of genome sizes.
+
+        :param df: query results from the ENA warehouse
+        :param url: query url for error messages
+        :param submitted_fastq: use submitted read files instead of ENA FASTQ
+
+        :returns dataframe of sanitized query results indexed by run accession
+
+        :raises ValueError if the query results are empty or contain
+            library layouts other than SINGLE or PAIRED
+
+        """
+
         # Drop rows with missing FTP links:
         df = df.dropna(subset=["fastq_ftp"])
 
@@ -296,104 +1081,123 @@ class Survey:
                 f"at ENA: {url}"
             )
 
-        genome_sizes = get_genome_sizes()
+        if not df["library_layout"].isin(["PAIRED", "SINGLE"]).all():
+            raise ValueError("Layout must be either SINGLE or PAIRED")
 
-        sanitized_dict = {}
-        # Iterate over rows of dataframe to sanitize query entries:
-        for index, entry in df.iterrows():
-
-            # FTP Links
-            if not submitted_fastq:
-                ftp_links = str(entry["fastq_ftp"]).strip(";").split(";")
-                ftp_sizes = str(entry["fastq_bytes"]).strip(";").split(";")
-            else:
-                ftp_links = str(entry["submitted_ftp"]).strip(";").split(";")
-                ftp_sizes = str(entry["submitted_bytes"]).strip(";").split(";")
+        df = df.reset_index(drop=True)
 
-            if entry["library_layout"] == "PAIRED":
-
-                # If there are fewer than two links, ignore accession:
-                # this need to be fixed see project accession PRJEB12470
-                # for ST59
-
-                # Need to split FASTQ into forward and reverse after download:
-                if len(ftp_links) < 2:
-                    continue
-                else:
-                    # Get last two links and file sizes,
-                    # which should be forward + reverse,
-                    # check that they are conforming to
-                    # pattern _1.fastq.gz and _2.fastq.gz:
-                    ftp_links = ftp_links[-2:]
-                    ftp_1, ftp_2 = ftp_links
-                    ftp_sizes = ftp_sizes[-2:]
-
-            elif entry["library_layout"] == "SINGLE":
-
-                # If there are fewer than one or more
-                # than two links, ignore accession:
-                if len(ftp_links) != 1:
-                    continue
-                else:
-                    ftp_1 = ftp_links[0]
-                    ftp_2 = None
-            else:
-                raise ValueError("Layout must be either SINGLE or PAIRED")
+        if not submitted_fastq:
+            links, sizes, checksums = "fastq_ftp", "fastq_bytes", "fastq_md5"
+        else:
+            links, sizes, checksums = \
+                "submitted_ftp", "submitted_bytes", "submitted_md5"
+
+        ftp_links = _to_string(df[links]).str.strip(";")
+        n_links = ftp_links.str.count(";") + 1
+
+        paired = df["library_layout"] == "PAIRED"
+
+        # Paired runs need at least two links, of which the last two
+        # should be forward and reverse (_1.fastq.gz and _2.fastq.gz)
+        # - this needs to be fixed, see project accession PRJEB12470
+        # for ST59 - and single runs need exactly one link:
+        keep = (paired & (n_links >= 2)) | (~paired & (n_links == 1))
+
+        df, ftp_links, paired = df[keep], ftp_links[keep], paired[keep]
+
+        ftp_1, ftp_2 = _split_pair(ftp_links)
+        ftp_1 = ftp_1.where(paired, ftp_links)
+        ftp_2 = ftp_2.where(paired, None)
+
+        # Checksums, if returned by ENA:
+        if checksums in df:
+            ftp_md5 = df[checksums].astype(object)
+            ftp_md5 = ftp_md5.where(ftp_md5.map(type) == str).str.strip(";")
+            n_md5 = ftp_md5.str.count(";") + 1
+            md5_1, md5_2 = _split_pair(ftp_md5)
+            md5_1 = md5_1.where(
+                paired & (n_md5 >= 2), ftp_md5.where(~paired & (n_md5 == 1))
+            )
+            md5_2 = md5_2.where(paired & (n_md5 >= 2))
+        else:
+            md5_1 = md5_2 = pandas.Series(None, index=df.index, dtype=object)
+
+        # Convert to MB, last two sizes for paired runs:
+        ftp_sizes = _to_string(df[sizes]).str.strip(";")
+        n_sizes = ftp_sizes.str.count(";") + 1
+
+        size_1, size_2 = _split_pair(ftp_sizes)
+        size = _to_megabytes(
+            size_1.where(paired & (n_sizes > 1), "0")
+        ) + _to_megabytes(size_2)
+
+        # Single runs with more than one file size, sum all sizes:
+        multiple = ~paired & (n_sizes > 1)
+        if multiple.any():
+            megabytes = _to_megabytes(
+                ftp_sizes[multiple].str.split(";").explode()
+            ).groupby(level=0)
+            size[multiple] = megabytes.sum().where(
+                megabytes.count() == n_sizes[multiple]
+            )
 
-            # Convert to MB:
-            try:
-                size = sum([int(byte)/1024/1024 for byte in ftp_sizes])
-            except ValueError:
-                size = None
+        # File sizes in bytes, per read file:
+        bytes_1 = _to_integer(size_1.where(
+            paired & (n_sizes > 1), size_2.where(~paired & (n_sizes == 1))
+        ))
+        bytes_2 = _to_integer(size_2.where(paired & (n_sizes > 1)))
 
-            try:
-                reads = int(entry["read_count"])
-            except ValueError:
-                reads = None
+        reads = _to_integer(df["read_count"])
+        bases = _to_integer(df["base_count"])
 
-            try:
-                bases = int(entry["base_count"])
-            except ValueError:
-                bases = None
+        # Exact taxid or median of its species or genus:
+        genome_sizes = get_genome_size_lookup()
+        taxids = pandas.to_numeric(df["tax_id"], errors="coerce")
+        genome_size = pandas.Series(
+            genome_sizes.lookup(taxids.values), index=df.index
+        )
 
-            if bases:
-                try:
-                    coverage = bases/(float(
-                        genome_sizes.loc[entry["tax_id"], "size"]
-                    )*1000000)
-                except KeyError or ValueError or ZeroDivisionError:
-                    coverage = None
-            else:
-                coverage = None
-
-            entry_dict = {
-                "id": str(uuid.uuid4()),
-                "ftp_1": ftp_1,
-                "ftp_2": ftp_2,
-                "size": size,
-                "reads": reads,
-                "bases": bases,
-                "coverage": coverage,
-                "layout": entry["library_layout"],
-                "platform": entry["instrument_platform"],
-                "model": entry["instrument_model"],
-                "source": entry["library_source"],
-                "strategy": entry["library_strategy"],
-                "tax_id": entry["tax_id"],
-                "sample": entry["sample_accession"],
-                "study": entry["study_accession"]
-            }
-
-            sanitized_dict[
-                entry["run_accession"]
-            ] = entry_dict
+        unknown = genome_size.isna() & taxids.notna()
+        if unknown.any() and genome_sizes.taxonomy is None:
+            tqdm.write(
+                f"No genome size for {unknown.sum()} runs, coverage is unknown: "
+                f"the fallback to genome sizes of species or genus requires "
+                f"a taxonomy, see: pf taxonomy"
+            )
 
-        try:
-            df = pandas.DataFrame(sanitized_dict).T
-        except EmptyDataError:
-            raise ValueError(f"No results were returned for query: {url}")
+        coverage = (bases/(genome_size*1000000)).where(
+            (bases > 0) & (genome_size > 0)
+        )
 
-        return df
+        sanitized = pandas.DataFrame({
+            "id": _uuid4(len(df)),
+            "ftp_1": ftp_1,
+            "ftp_2": ftp_2,
+            "md5_1": md5_1,
+            "md5_2": md5_2,
+            "bytes_1": bytes_1.astype("Int64"),
+            "bytes_2": bytes_2.astype("Int64"),
+            "size": size,
+            "reads": reads.astype("Int64"),
+            "bases": bases.astype("Int64"),
+            "coverage": coverage,
+            "layout": df["library_layout"],
+            "platform": df["instrument_platform"],
+            "model": df["instrument_model"],
+            "source": df["library_source"],
+            "strategy": df["library_strategy"],
+            "tax_id": df["tax_id"],
+            "sample": df["sample_accession"],
+            "study": df["study_accession"]
+        }, index=df.index)
+
+        sanitized.index = df["run_accession"].values
+        sanitized = sanitized[~sanitized.index.duplicated(keep="last")]
+
+        # Python objects with None for missing values, as in query records:
+        sanitized = sanitized.astype(object)
+
+        return sanitized.where(sanitized.notna(), None)
 
     @staticmethod
     def _construct_species_query(
@@ -436,3 +1240,68 @@ class Survey:
             return f'"(' + " OR ".join(
                 f'run_accession="{s}"' for s in sample
             ) + f')"' + "&domain=read"
+
+
+def _to_string(field: pandas.Series) -> pandas.Series:
+
+    """ Convert each entry of a field to string, including missing values """
+
+    return field.map(str).astype(str)
+
+
+def _split_pair(field: pandas.Series) -> (pandas.Series, pandas.Series):
+
+    """ Get the last two entries of a semicolon-delimited field """
+
+    parts = field.str.rpartition(";").reindex(columns=[0, 2])
+    head, last = parts[0].astype(object), parts[2].astype(object)
+
+    head = head.str.rpartition(";").reindex(columns=[2])[2]
+
+    return head.astype(object), last
+
+
+def _run_accession(fastq: pandas.Series, link: str) -> str:
+
+    """ Run accession of a batch row, or the prefix of its file name """
+
+    for column in ("run_accession", "Unnamed: 0"):
+        run = fastq.get(column)
+        if isinstance(run, str) and run:
+            return run
+
+    return Path(link).name.split(".")[0].split("_")[0]
+
+
+def _to_megabytes(field: pandas.Series) -> pandas.Series:
+
+    """ Convert a file size field of the ENA query results to MB """
+
+    return pandas.to_numeric(field, errors="coerce")/1024/1024
+
+
+def _to_integer(field: pandas.Series) -> pandas.Series:
+
+    """ Truncate a count field of the ENA query results to integers """
+
+    return numpy.trunc(pandas.to_numeric(field, errors="coerce"))
+
+
+def _uuid4(n: int) -> list:
+
+    """ Generate random (version 4) UUID strings in bulk """
+
+    uuids = numpy.frombuffer(
+        os.urandom(16*n), dtype=numpy.uint8
+    ).reshape(n, 16).copy()
+
+    # Set version and variant bits, see uuid.UUID:
+    uuids[:, 6] = uuids[:, 6] & 0x0f | 0x40
+    uuids[:, 8] = uuids[:, 8] & 0x3f | 0x80
+
+    h = uuids.tobytes().hex()
+
+    return [
+        f"{h[i:i+8]}-{h[i+8:i+12]}-{h[i+12:i+16]}-"
+        f"{h[i+16:i+20]}-{h[i+20:i+32]}" for i in range(0, 32*n, 32)
+    ]
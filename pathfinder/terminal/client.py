@@ -2,6 +2,7 @@ import click
 
 from .phybeast import client
 from .download import download
+from .taxonomy import taxonomy
 
 VERSION = '0.1'
 
@@ -15,4 +16,5 @@ def terminal_client():
 
 terminal_client.add_command(client.phybeast)
 terminal_client.add_command(download)
+terminal_client.add_command(taxonomy)
 
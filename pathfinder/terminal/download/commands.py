@@ -1,13 +1,12 @@
 import click
-import pandas
-
-from pathfinder.survey import Survey
-from pathfinder.survey import MiniAspera
 
 from pathlib import Path
 
+from .status import status
+
 
-@click.command()
+@click.group(invoke_without_command=True)
+@click.pass_context
 @click.option(
     '--outdir', '-o', type=str, default="pf-download",
     help='Output directory for read files'
@@ -16,6 +15,16 @@ from pathlib import Path
     '--batch', '-b', type=int, default=0,
     help='Batch large search results into their own output directories'
 )
+@click.option(
+    '--max_gb', type=float, default=None,
+    help='Batch large search results into batches of at most --max_gb '
+         'gigabytes each, in their own output directories'
+)
+@click.option(
+    '--balance', is_flag=True,
+    help='Balance batches of --max_gb by total bases, so that batch '
+         'jobs have similar run times'
+)
 @click.option(
     '--file', '-f', type=str, default=0,
     help='CSV file with column: accession or project, to download.'
@@ -40,7 +49,9 @@ from pathlib import Path
 @click.option(
     '--filter', '-f', type=str, default=None,
     help='Custom query filter on the return fields of the ENA query '
-         'for example: "coverage < 700 & coverage > 50" '
+         'for example: "coverage < 700 & coverage > 50" - coverage of '
+         'taxa without genome size falls back to their species or genus '
+         'only with a taxonomy prepared by: pf taxonomy'
 )
 @click.option(
     '--scheme', type=str, default=None,
@@ -52,18 +63,75 @@ from pathlib import Path
     '--ftp', '-f', is_flag=True,
     help='Force download from FTP instead of Aspera (slow)'
 )
+@click.option(
+    '--wget', is_flag=True,
+    help='Download from FTP with wget instead of the native, resumable '
+         'and checksum-verified transfers.'
+)
+@click.option(
+    '--bandwidth', type=float, default=None,
+    help='Total bandwidth of concurrent read file transfers in Mbit/s, '
+         'shared equally by active transfers [unlimited]'
+)
+@click.option(
+    '--port', type=int, default=33001,
+    help='TCP port of Aspera transfers'
+)
+@click.option(
+    '--aspera_retries', type=int, default=2,
+    help='Retries of failed Aspera transfers before downloading from FTP'
+)
 @click.option(
     '--limit', '-l', type=int, default=0,
     help='Limit download to first --limit query results.'
 )
+@click.option(
+    '--workers', '-w', type=int, default=1,
+    help='Number of concurrent read file transfers.'
+)
+@click.option(
+    '--offline', is_flag=True,
+    help='Serve query results exclusively from the local query cache.'
+)
+@click.option(
+    '--no_cache', is_flag=True,
+    help='Do not read or write query results to the local query cache.'
+)
+@click.option(
+    '--no_download', is_flag=True,
+    help='Query, filter and batch results without downloading read files.'
+)
+@click.option(
+    '--progress', is_flag=True,
+    help='Report download progress as JSON lines on stdout instead of '
+         'the progress bar, e.g. for jobs run by the server.'
+)
+@click.option(
+    '--db', is_flag=True,
+    help='Upsert query results into MongoDB, configured in '
+         '~/.pathfinder/db/config.json'
+)
+@click.option(
+    '--trace', type=Path, default=None,
+    help='Log wall time, CPU, memory and bytes written of each transfer '
+         'to file (.jsonl); also set by PATHFINDER_TRACE.'
+)
+@click.option(
+    '--chrome_trace', type=Path, default=None,
+    help='Write transfers as Chrome trace events to file (.json); '
+         'also set by PATHFINDER_TRACE_CHROME.'
+)
 @click.option(
     '--submitted', is_flag=True,
     help='Use default FASTQ files from ENA, switch on to use '
          'read files uploaded by submitter.'
 )
 def download(
+    ctx,
     outdir,
     batch,
+    max_gb,
+    balance,
     file,
     accession,
     project,
@@ -72,11 +140,37 @@ def download(
     filter,
     scheme,
     ftp,
+    wget,
+    bandwidth,
+    port,
+    aspera_retries,
     limit,
+    workers,
+    offline,
+    no_cache,
+    no_download,
+    progress,
+    db,
+    trace,
+    chrome_trace,
     submitted
 ):
     """ Download sequence read data from ENA """
 
+    if ctx.invoked_subcommand is not None:
+        return
+
+    import pandas
+
+    from pathfinder.survey import Survey
+    from pathfinder.survey import MiniAspera
+    from pathfinder.cache import QueryCache
+    from pathfinder.manifest import Manifest
+    from pathfinder.transfer import Bandwidth
+    from pathfinder.trace import configure
+
+    configure(log_file=trace, trace_file=chrome_trace)
+
     if file:
         df = pandas.read_csv(file)
         df.columns = [c.lower() for c in df.columns]
@@ -91,7 +185,11 @@ def download(
 
     Path(outdir).mkdir(exist_ok=True, parents=True)
 
-    survey = Survey(outdir=outdir)
+    survey = Survey(
+        outdir=outdir,
+        cache=None if no_cache else QueryCache(),
+        offline=offline
+    )
 
     if query is not None:
         if Path(query).exists():
@@ -117,8 +215,16 @@ def download(
     if filter is not None:
         survey.filter_query(filter)
 
-    if batch > 0:
-        batches = survey.batch(batch_size=batch)
+    if db:
+        from pathfinder.db.database import MongoAPI
+
+        inserted, updated = MongoAPI().upsert_survey(survey.query)
+        print(f'Database: {inserted} runs inserted, {updated} runs updated')
+
+    if batch > 0 or max_gb:
+        batches = survey.batch(
+            batch_size=batch, max_gb=max_gb, balance=balance
+        )
         batches = survey.batch_output(
             batches, outdir=Path(outdir)
         )
@@ -127,11 +233,61 @@ def download(
             Path(outdir), query_csv
         )]
 
-    for batch_path, batch_csv in batches:
-        ascp = MiniAspera()
-        ascp.download_batch(
-            file=batch_csv,
-            outdir=batch_path,
-            limit_download=limit,
-            ftp=ftp
+    if no_download:
+        for _ in batches:
+            pass  # write batch files
+        return
+
+    # Transfers are recorded across batches and runs of the output directory
+    manifest = Manifest(Path(outdir) / 'manifest.db')
+    shared = Bandwidth(limit=bandwidth)
+
+    # Failed transfers do not stop the remaining transfers and batches
+    failed = []
+    try:
+        for batch_path, batch_csv in batches:
+            ascp = MiniAspera(
+                wget=wget, port=port, bandwidth=shared,
+                aspera_retries=aspera_retries
+            )
+            failed += ascp.download_batch(
+                file=batch_csv,
+                outdir=batch_path,
+                limit_download=limit,
+                ftp=ftp,
+                workers=workers,
+                progress=report_progress(batch_path) if progress else None,
+                manifest=manifest
+            )
+    finally:
+        manifest.close()
+
+    if failed:
+        for outfile, error in failed:
+            click.echo(f'Failed: {outfile} ({error})', err=True)
+        raise click.ClickException(
+            f'{len(failed)} read files failed to download, downloads are '
+            f'resumed by running the command again, see: pf download '
+            f'status --outdir {outdir} --failed {len(failed)}'
         )
+
+
+def report_progress(batch: Path):
+
+    """ Progress callback printing JSON lines for a batch """
+
+    import json
+
+    def report(files_done, files, bytes_done, bytes_total):
+        print(json.dumps({
+            'batch': str(batch),
+            'files_done': files_done,
+            'files': files,
+            'bytes_done': bytes_done,
+            'bytes_total': bytes_total
+        }), flush=True)
+
+    return report
+
+
+download.add_command(status)
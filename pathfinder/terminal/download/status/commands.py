@@ -0,0 +1,81 @@
+import click
+
+from pathlib import Path
+
+
+@click.command()
+@click.option(
+    '--outdir', '-o', type=Path, default="pf-download",
+    help='Output directory of pf download, containing manifest.db'
+)
+@click.option(
+    '--failed', '-f', type=int, default=10,
+    help='Number of failed files to list with their last error.'
+)
+def status(outdir, failed):
+
+    """ Summarize the download manifest of an output directory """
+
+    from pathfinder.manifest import Manifest
+
+    if not Manifest.exists(outdir):
+        raise click.ClickException(f'No download manifest in: {outdir}')
+
+    manifest = Manifest(Path(outdir) / 'manifest.db')
+
+    summary = manifest.summary()
+    errors = manifest.failed(limit=failed) if failed else []
+
+    manifest.close()
+
+    header = ('batch', 'status', 'files', 'runs', 'size', 'received', 'attempts')
+    rows = [
+        (
+            row['batch'] or '.', row['status'], row['files'], row['runs'],
+            _size(row['size']), _size(row['received']), row['attempts']
+        ) for row in summary
+    ]
+
+    totals = {}
+    for row in summary:
+        totals.setdefault(row['status'], [0, 0, 0])
+        totals[row['status']][0] += row['files']
+        totals[row['status']][1] += row['size'] or 0
+        totals[row['status']][2] += row['received'] or 0
+
+    rows += [
+        ('total', state, files, '', _size(size), _size(received), '')
+        for state, (files, size, received) in sorted(totals.items())
+    ]
+
+    widths = [
+        max(len(str(value)) for value in column) for column in zip(header, *rows)
+    ]
+    for row in [header] + rows:
+        click.echo('  '.join(
+            str(value).ljust(width) for value, width in zip(row, widths)
+        ))
+
+    if errors:
+        click.echo(f'\nFailed files ({len(errors)} shown):')
+        for error in errors:
+            click.echo(
+                f'{error["file"]}  attempts: {error["attempts"]}  {error["error"]}'
+            )
+
+
+def _size(size: int or None) -> str:
+
+    if size is None:
+        return '-'
+
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            break
+        size /= 1024
+    else:
+        unit = 'TB'
+
+    return f'{size:.1f} {unit}'
+
+
@@ -1,6 +1,7 @@
 import click
 
 from .utils import client
+from .clock_screen import clock_screen
 
 
 VERSION = '0.1'
@@ -16,3 +17,4 @@ def phybeast():
 
 
 phybeast.add_command(client.utils)
+phybeast.add_command(clock_screen)
@@ -0,0 +1,54 @@
+import click
+
+from pathlib import Path
+
+
+@click.command()
+@click.option(
+    "--tree", "-t", default=None, type=Path,
+    help="Input tree, newick format, leaf labels: name date.",
+)
+@click.option(
+    "--dates", "-d", default=None, type=Path,
+    help="Input meta data file, tab-delimited, includes: name, date columns.",
+)
+@click.option(
+    "--rtt", default=None, type=Path,
+    help="Regression data file from process DateRegression, instead of --tree.",
+)
+@click.option(
+    "--no_reroot", is_flag=True,
+    help="Compute distances from the root of the input tree.",
+)
+@click.option(
+    "--replicates", "-r", default=1000, help="Number of date randomisation replicates.", type=int,
+)
+@click.option(
+    "--seed", "-s", default=None, help="Seed for reproducible replicates.", type=int,
+)
+@click.option(
+    "--output", "-o", default="rates.tab", type=Path,
+    help="Replicate rate file for plot-date-randomisation.",
+)
+@click.option(
+    "--rate", default=None, type=Path,
+    help="Rate estimate of the observed dates for plot-date-randomisation [not written].",
+)
+def clock_screen(tree, dates, rtt, no_reroot, replicates, seed, output, rate):
+
+    """ Screen for temporal signal by root-to-tip regression on randomised dates """
+
+    from pathfinder.utils import phybeast_clock_screen
+
+    phybeast_clock_screen(
+        tree_file=tree,
+        date_file=dates,
+        rtt_file=rtt,
+        reroot=not no_reroot,
+        replicates=replicates,
+        seed=seed,
+        output_file=output,
+        rate_file=rate
+    )
+
+
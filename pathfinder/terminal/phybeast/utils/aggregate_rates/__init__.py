@@ -0,0 +1 @@
+from .commands import aggregate_rates
@@ -0,0 +1,40 @@
+import click
+
+from pathlib import Path
+
+
+@click.command()
+@click.option(
+    "--results", "-r", default=".", type=str,
+    help="Directory or quoted glob of replicate result files from lsd2 or TreeTime.",
+)
+@click.option(
+    "--prep", "-p", default="lsd2", help="Result files from: lsd2, treetime.", type=str,
+)
+@click.option(
+    "--pattern", default="*.txt", type=str,
+    help="Glob of result files in results directory.",
+)
+@click.option(
+    "--workers", "-w", default=4, type=int,
+    help="Number of processes parsing result files.",
+)
+@click.option(
+    "--output", "-o", default="rates.tab", type=Path,
+    help="Output table with columns: replicate, rate, tmrca, file.",
+)
+def aggregate_rates(results, prep, pattern, workers, output):
+
+    """ Aggregate rates and tMRCA of date randomisation replicates """
+
+    from pathfinder.utils import phybeast_aggregate_rates
+
+    phybeast_aggregate_rates(
+        results=results,
+        prep=prep,
+        output_file=output,
+        pattern=pattern,
+        workers=workers
+    )
+
+
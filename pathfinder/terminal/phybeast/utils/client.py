@@ -1,8 +1,13 @@
 import click
 
+from .clusters import clusters
 from .extract_rate import extract_rate
+from .aggregate_rates import aggregate_rates
 from .remove_reference import remove_reference
+from .root_to_tip import root_to_tip
 from .randomise_dates import randomise_dates
+from .snp_distances import snp_distances
+from .variant_sites import variant_sites
 from .prepare_metadata import prepare_metadata
 from .plot_date_randomisation import plot_date_randomisation
 
@@ -18,8 +23,13 @@ def utils():
     pass
 
 
+utils.add_command(clusters)
 utils.add_command(extract_rate)
+utils.add_command(aggregate_rates)
 utils.add_command(remove_reference)
+utils.add_command(root_to_tip)
 utils.add_command(randomise_dates)
+utils.add_command(snp_distances)
+utils.add_command(variant_sites)
 utils.add_command(prepare_metadata)
 utils.add_command(plot_date_randomisation)
@@ -0,0 +1 @@
+from .commands import clusters
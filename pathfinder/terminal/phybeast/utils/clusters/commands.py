@@ -0,0 +1,36 @@
+import click
+
+from pathlib import Path
+
+
+@click.command()
+@click.option(
+    "--distances", "-d", required=True, type=Path,
+    help="Distance matrix (.npy) or edge list (.tsv) from snp-distances.",
+)
+@click.option(
+    "--threshold", "-t", multiple=True, type=int,
+    help="SNP distance threshold; may be repeated [5, 10, 25]",
+)
+@click.option(
+    "--names", "-n", default=None, type=Path,
+    help="Sample names, one per line, to include samples without edges.",
+)
+@click.option(
+    "--output", "-o", default="clusters.tsv", type=Path,
+    help="Output table with columns: sample, threshold, cluster_id.",
+)
+def clusters(distances, threshold, names, output):
+
+    """ Transmission clusters of samples at SNP distance thresholds """
+
+    from pathfinder.utils import phybeast_clusters
+
+    phybeast_clusters(
+        distance_file=distances,
+        thresholds=threshold or (5, 10, 25),
+        names_file=names,
+        output_file=output
+    )
+
+
@@ -1,13 +1,12 @@
 import click
 
 from pathlib import Path
-from pathfinder.utils import phybeast_extract_rate
 
 
 @click.command()
 @click.option(
     "--file", "-f", default="lsd.out", type=Path,
-    help="Input meta data file, tab-delimited, includes: name, date columns.",
+    help="Result file from lsd2 or stdout of TreeTime clock.",
 )
 @click.option(
     "--prep", "-p", default="lsd2", help="Prepare output file from: lsd2, treetime.", type=str,
@@ -20,6 +19,8 @@ def extract_rate(file, prep, output):
 
     """ Extract substitution rate from LSD2 or TimeTree output """
 
+    from pathfinder.utils import phybeast_extract_rate
+
     phybeast_extract_rate(result_file=file, prep=prep, output_file=output)
 
 
@@ -1,7 +1,6 @@
 import click
 
 from pathlib import Path
-from pathfinder.utils import phybeast_plot_date_randomisation
 
 
 @click.command()
@@ -25,6 +24,8 @@ def plot_date_randomisation(file, output, rate, regression):
 
     """ Plot date randomisation test by Duchene et al. """
 
+    from pathfinder.utils import phybeast_plot_date_randomisation
+
     phybeast_plot_date_randomisation(
         replicate_file=file,
         rate_file=rate,
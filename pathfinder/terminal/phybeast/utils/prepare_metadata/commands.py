@@ -1,7 +1,6 @@
 import click
 
 from pathlib import Path
-from pathfinder.utils import phybeast_prepare_metadata_file
 
 
 @click.command()
@@ -19,6 +18,8 @@ def prepare_metadata(meta_data, prep, output):
 
     """ Randomise the dates in a meta data file with columns: name, date """
 
+    from pathfinder.utils import phybeast_prepare_metadata_file
+
     phybeast_prepare_metadata_file(meta_file=meta_data, prep=prep, output_file=output)
 
 
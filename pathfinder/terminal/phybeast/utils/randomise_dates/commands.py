@@ -1,7 +1,6 @@
 import click
 
 from pathlib import Path
-from pathfinder.utils import phybeast_randomise_date_file
 
 
 @click.command()
@@ -11,10 +10,24 @@ from pathfinder.utils import phybeast_randomise_date_file
 @click.option(
     "--output", "-o", default="output_alignment.fasta", help="Output alignment.", type=Path,
 )
-def randomise_dates(date_file, output):
+@click.option(
+    "--replicates", "-r", default=None, help="Number of replicates; writes one numbered output file per replicate [1, not numbered].", type=int,
+)
+@click.option(
+    "--seed", "-s", default=None, help="Seed for reproducible replicates.", type=int,
+)
+@click.option(
+    "--long", is_flag=True, help="Write all replicates to output file, columns: replicate, name, date.",
+)
+def randomise_dates(date_file, output, replicates, seed, long):
 
     """ Randomise the dates in a meta data file with columns: name, date """
 
-    phybeast_randomise_date_file(date_file=date_file, output_file=output)
+    from pathfinder.utils import phybeast_randomise_date_file
+
+    phybeast_randomise_date_file(
+        date_file=date_file, output_file=output, replicates=replicates or 1, seed=seed, long=long,
+        numbered=replicates is not None
+    )
 
 
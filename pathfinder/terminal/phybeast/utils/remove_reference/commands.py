@@ -1,20 +1,33 @@
 import click
 
 from pathlib import Path
-from pathfinder.utils import remove_sample
 
 
 @click.command()
 @click.option(
-    "--alignment", "-a", default="input_alignment.fasta", help="Input alignment.", type=Path,
+    "--alignment", "-a", default="input_alignment.fasta", help="Input alignment, may be gzipped.", type=Path,
 )
 @click.option(
     "--output", "-o", default="output_alignment.fasta", help="Output alignment.", type=Path,
 )
-def remove_reference(alignment, output):
+@click.option(
+    "--name", "-n", multiple=True, help="Sequence name to remove; may be repeated [Reference]", type=str,
+)
+@click.option(
+    "--names", "-N", default=None, help="File with sequence names to remove, one per line.", type=Path,
+)
+@click.option(
+    "--keep", is_flag=True, help="Keep only the given sequence names instead of removing them.",
+)
+def remove_reference(alignment, output, name, names, keep):
 
     """ Remove 'Reference' from Snippy alignment output file """
 
-    remove_sample(alignment=alignment, outfile=output, remove='Reference')
+    from pathfinder.utils import remove_sample
+
+    if not name and names is None:
+        name = ['Reference']
+
+    remove_sample(alignment=alignment, outfile=output, remove=list(name), names_file=names, keep=keep)
 
 
@@ -0,0 +1 @@
+from .commands import root_to_tip
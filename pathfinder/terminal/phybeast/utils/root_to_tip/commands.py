@@ -0,0 +1,46 @@
+import click
+
+from pathlib import Path
+
+
+@click.command()
+@click.option(
+    "--tree", "-t", required=True, type=Path,
+    help="Input tree, newick format (leaf labels: name date) or saved tree (.npz).",
+)
+@click.option(
+    "--dates", "-d", default=None, type=Path,
+    help="Input meta data file, tab-delimited, includes: name, date columns.",
+)
+@click.option(
+    "--remove", "-r", multiple=True, type=str,
+    help="Leaf label to remove from the tree; may be repeated.",
+)
+@click.option(
+    "--no_reroot", is_flag=True,
+    help="Compute distances from the root of the input tree.",
+)
+@click.option(
+    "--save", "-s", default=None, type=Path,
+    help="Save the (pruned) tree for reuse (.npz).",
+)
+@click.option(
+    "--output", "-o", default="rtt.csv", type=Path,
+    help="Regression data file for plot-date-randomisation.",
+)
+def root_to_tip(tree, dates, remove, no_reroot, save, output):
+
+    """ Root-to-tip distances and dates of the leaves for the date regression """
+
+    from pathfinder.utils import phybeast_root_to_tip
+
+    phybeast_root_to_tip(
+        tree_file=tree,
+        date_file=dates,
+        output_file=output,
+        remove=list(remove),
+        reroot=not no_reroot,
+        tree_output=save
+    )
+
+
@@ -0,0 +1 @@
+from .commands import snp_distances
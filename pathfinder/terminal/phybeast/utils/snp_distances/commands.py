@@ -0,0 +1,41 @@
+import click
+
+from pathlib import Path
+
+
+@click.command()
+@click.option(
+    "--alignment", "-a", required=True, type=Path,
+    help="Input core alignment, may be gzipped, or alignment store directory.",
+)
+@click.option(
+    "--output", "-o", default="distances.npy", type=Path,
+    help="Output distance matrix (.npy) or edge list with --threshold (.tsv).",
+)
+@click.option(
+    "--threshold", "-t", default=None, type=int,
+    help="Output edges between samples at or below this SNP distance.",
+)
+@click.option(
+    "--workers", "-w", default=4, type=int,
+    help="Number of processes comparing samples.",
+)
+@click.option(
+    "--store", "-s", default=None, type=Path,
+    help="Keep the converted alignment in this store directory for reuse.",
+)
+def snp_distances(alignment, output, threshold, workers, store):
+
+    """ Pairwise SNP distances between the samples of a core alignment """
+
+    from pathfinder.utils import phybeast_snp_distances
+
+    phybeast_snp_distances(
+        alignment=alignment,
+        output_file=output,
+        threshold=threshold,
+        workers=workers,
+        store=store
+    )
+
+
@@ -0,0 +1,41 @@
+import click
+
+from pathlib import Path
+
+
+@click.command()
+@click.option(
+    "--alignment", "-a", required=True, type=Path,
+    help="Input core alignment, may be gzipped, or alignment store directory.",
+)
+@click.option(
+    "--output", "-o", default="snps.fasta", type=Path,
+    help="Output alignment of variant sites.",
+)
+@click.option(
+    "--constant", "-c", default=None, type=Path,
+    help="Output file of constant site counts (A,C,G,T) for IQ-TREE -fconst.",
+)
+@click.option(
+    "--acgt", is_flag=True,
+    help="Only use sites with A, C, G or T in all samples, as snp-sites -c.",
+)
+@click.option(
+    "--store", "-s", default=None, type=Path,
+    help="Keep the converted alignment in this store directory for reuse.",
+)
+def variant_sites(alignment, output, constant, acgt, store):
+
+    """ Extract variant sites and count constant sites of a core alignment """
+
+    from pathfinder.utils import phybeast_variant_sites
+
+    phybeast_variant_sites(
+        alignment=alignment,
+        output_file=output,
+        constant_file=constant,
+        acgt=acgt,
+        store=store
+    )
+
+
@@ -0,0 +1,26 @@
+import click
+
+from pathlib import Path
+
+
+@click.command()
+@click.option(
+    '--nodes', '-n', type=Path, required=True,
+    help='Taxonomy nodes from NCBI (nodes.dmp in taxdump.tar.gz)'
+)
+@click.option(
+    '--output', '-o', type=Path,
+    default=Path.home() / '.pathfinder' / 'taxonomy.npz',
+    help='Output file for the compact taxonomy (.npz) [~/.pathfinder/taxonomy.npz]'
+)
+def taxonomy(nodes, output):
+
+    """ Prepare the taxonomy for genome size fallback to species or genus """
+
+    from pathfinder.genomes import Taxonomy
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+
+    Taxonomy.from_nodes(nodes).save(output)
+
+
@@ -0,0 +1,215 @@
+"""
+
+Pathfinder trace module, @esteinig
+
+Resource accounting of external commands and transfers: wall time, CPU time,
+maximum resident memory, bytes written and exit status of each process are
+appended to a JSON-lines log and can be exported in the Chrome trace event
+format (chrome://tracing, Perfetto).
+
+"""
+
+import os
+import json
+import time
+import atexit
+import threading
+
+from pathlib import Path
+
+_tracer = None
+
+
+class Tracer:
+
+    """ Record resource usage of processes and transfers """
+
+    def __init__(self, log_file: Path = None, trace_file: Path = None):
+
+        """ Resource tracer
+
+        :param log_file: JSON-lines log, records are appended as they complete
+        :param trace_file: Chrome trace event file, written on closing
+
+        """
+
+        self.log_file = Path(log_file) if log_file else None
+        self.trace_file = Path(trace_file) if trace_file else None
+
+        self.records = []
+        self.origin = time.time()
+
+        self._lock = threading.Lock()
+        self._log = self.log_file.open('a') if self.log_file else None
+
+    def record(
+        self,
+        name: str,
+        category: str,
+        start: float,
+        wall: float,
+        status: int or str = None,
+        rusage=None,
+        bytes_written: int = None,
+        **args
+    ) -> dict:
+
+        """ Record the resource usage of a completed process or transfer
+
+        :param name: name of the process, e.g. the executable
+        :param category: category of the process, e.g. command or transfer
+        :param start: start time (epoch seconds)
+        :param wall: wall time in seconds
+        :param status: exit status or error of the process
+        :param rusage: resource usage of the process from `os.wait4`
+        :param bytes_written: bytes written by the process to its outputs
+        :param args: additional fields of the record, e.g. command or address
+
+        :returns record
+
+        """
+
+        record = {
+            'name': name,
+            'category': category,
+            'start': start,
+            'wall': wall,
+            'user': rusage.ru_utime if rusage else None,
+            'sys': rusage.ru_stime if rusage else None,
+            # Kilobytes on Linux:
+            'max_rss': rusage.ru_maxrss if rusage else None,
+            'bytes_written': bytes_written,
+            'status': status,
+            'pid': os.getpid(),
+            'thread': threading.get_ident(),
+            **args
+        }
+
+        with self._lock:
+            self.records.append(record)
+            if self._log:
+                self._log.write(json.dumps(record, default=str) + '\n')
+                self._log.flush()
+
+        return record
+
+    def close(self) -> None:
+
+        """ Close the log and write the Chrome trace file """
+
+        with self._lock:
+            if self._log:
+                self._log.close()
+                self._log = None
+
+            if self.trace_file:
+                write_chrome_trace(self.records, self.trace_file)
+
+
+def write_chrome_trace(records: list, trace_file: Path) -> None:
+
+    """ Write records in the Chrome trace event format
+
+    Each record is a complete event on the thread that ran it, with
+    its resource usage as event arguments.
+
+    :param records: records of `Tracer.record` or lines of its log
+    :param trace_file: output file (.json)
+
+    """
+
+    origin = min((record['start'] for record in records), default=0)
+
+    events = [
+        {
+            'name': record['name'],
+            'cat': record['category'],
+            'ph': 'X',
+            'ts': (record['start'] - origin) * 1e6,
+            'dur': record['wall'] * 1e6,
+            'pid': record['pid'],
+            'tid': record['thread'],
+            'args': {
+                key: value for key, value in record.items() if key not in (
+                    'name', 'category', 'start', 'wall', 'pid', 'thread'
+                )
+            }
+        }
+        for record in records
+    ]
+
+    with Path(trace_file).open('w') as outfile:
+        json.dump(
+            {'traceEvents': events, 'displayTimeUnit': 'ms'},
+            outfile, default=str
+        )
+
+
+def read_log(log_file: Path) -> list:
+
+    """ Read the records of a JSON-lines log """
+
+    with Path(log_file).open('r') as infile:
+        return [json.loads(line) for line in infile if line.strip()]
+
+
+def configure(log_file: Path = None, trace_file: Path = None) -> Tracer or None:
+
+    """ Configure the tracer used by commands and transfers
+
+    Without arguments, the tracer is configured from the environment
+    variables `PATHFINDER_TRACE` (log) and `PATHFINDER_TRACE_CHROME`.
+    The tracer is closed at exit.
+
+    :param log_file: JSON-lines log
+    :param trace_file: Chrome trace event file
+
+    :returns tracer or None if tracing is not configured
+
+    """
+
+    global _tracer
+
+    if _tracer is not None:
+        _tracer.close()
+
+    log_file = log_file or os.environ.get('PATHFINDER_TRACE')
+    trace_file = trace_file or os.environ.get('PATHFINDER_TRACE_CHROME')
+
+    if log_file or trace_file:
+        _tracer = Tracer(log_file=log_file, trace_file=trace_file)
+        atexit.register(_tracer.close)
+    else:
+        _tracer = None
+
+    return _tracer
+
+
+def get_tracer() -> Tracer or None:
+
+    """ Get the configured tracer, configured from the environment on first use """
+
+    if _tracer is None and (
+        os.environ.get('PATHFINDER_TRACE') or
+        os.environ.get('PATHFINDER_TRACE_CHROME')
+    ):
+        return configure()
+
+    return _tracer
+
+
+def get_bytes_written(outputs: list) -> int or None:
+
+    """ Total size of output files, None if no outputs are given """
+
+    if not outputs:
+        return None
+
+    size = 0
+    for output in outputs:
+        try:
+            size += os.stat(output).st_size
+        except OSError:
+            pass
+
+    return size
@@ -0,0 +1,393 @@
+"""
+
+Pathfinder transfer module, @esteinig
+
+Native HTTP and FTP transfers of read files from the ENA. Partial downloads are
+resumed with byte ranges (REST for FTP) and hashed while they are streamed to disk,
+optionally passing the data on to statistics of its content (see `pathfinder.fastq`).
+Concurrent transfers share a total bandwidth, which is split equally between the
+active transfers and rebalanced as transfers start and finish.
+
+"""
+
+import time
+import ftplib
+import hashlib
+import threading
+import urllib.error
+import urllib.request
+
+from pathlib import Path
+from contextlib import contextmanager
+from urllib.parse import urlparse
+from pathfinder.trace import get_tracer, get_bytes_written
+
+
+class TransferError(Exception):
+
+    """ Raised when a transfer does not succeed within the allowed retries """
+
+    pass
+
+
+class ChecksumError(TransferError):
+
+    """ Raised when the checksum of a completed transfer does not match """
+
+    pass
+
+
+class Bandwidth:
+
+    """ Total bandwidth shared equally by the active transfers """
+
+    def __init__(self, limit: float = None):
+
+        """ Bandwidth
+
+        :param limit: total bandwidth in megabits per second, unlimited if None
+
+        """
+
+        self.limit = limit
+        self.active = 0
+
+        self._lock = threading.Lock()
+
+    def share(self) -> float or None:
+
+        """ Current bandwidth of each active transfer in megabits per second,
+        None if unlimited """
+
+        if not self.limit:
+            return None
+
+        with self._lock:
+            return self.limit / max(1, self.active)
+
+    @contextmanager
+    def transfer(self):
+
+        """ Register an active transfer for the duration of the context
+
+        :returns throttle of the transfer, called with the number of
+            bytes received to pace the transfer to its current share
+
+        """
+
+        with self._lock:
+            self.active += 1
+        try:
+            yield Throttle(self)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+class Throttle:
+
+    """ Paces a transfer to its current share of the bandwidth """
+
+    def __init__(self, bandwidth: Bandwidth):
+
+        self.bandwidth = bandwidth
+        self.due = time.monotonic()
+
+    def __call__(self, size: int) -> None:
+
+        """ Wait until :param size bytes are due at the current share """
+
+        share = self.bandwidth.share()
+        if share is None:
+            return
+
+        # The share is read for each chunk, so that transfers speed up when
+        # other transfers finish; idle time is not credited to later chunks
+        now = time.monotonic()
+        self.due = max(self.due, now) + size * 8 / (share * 1e6)
+        if self.due > now:
+            time.sleep(self.due - now)
+
+
+class Digest:
+
+    """ MD5 checksum of the data of a transfer, passed on to statistics """
+
+    def __init__(self, stats=None):
+
+        """ Digest
+
+        :param stats: statistics of the data with methods: reset and update,
+            e.g. `FastqStats`, reset as the digest starts over
+
+        """
+
+        self.md5 = hashlib.md5()
+        self.stats = stats
+
+        if stats is not None:
+            stats.reset()
+
+    def update(self, chunk: bytes) -> None:
+
+        self.md5.update(chunk)
+        if self.stats is not None:
+            self.stats.update(chunk)
+
+    def hexdigest(self) -> str:
+
+        return self.md5.hexdigest()
+
+
+class NativeTransfer:
+
+    """ Resumable, checksum-verified file transfers over HTTP(S) and FTP """
+
+    def __init__(
+        self,
+        retries: int = 5,
+        backoff: float = 2.0,
+        chunk_size: int = 1024*1024,
+        timeout: float = 60.,
+        scheme: str = "http",
+        bandwidth: Bandwidth = None
+    ):
+
+        self.retries = retries
+        self.backoff = backoff
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+
+        # Shared with other transfers, unlimited if not given
+        self.bandwidth = bandwidth or Bandwidth()
+
+        # ENA links do not specify a protocol
+        self.scheme = scheme
+
+    def download(
+        self,
+        address: str,
+        outfile: Path,
+        md5: str = None,
+        force: bool = False,
+        stats=None
+    ) -> str:
+
+        """ Download a file with resume, streaming checksum and retries
+
+        Data is written to a partial file next to the output file, which is
+        renamed to the output file only when the transfer is complete and the
+        checksum matches. Partial files of interrupted transfers are resumed.
+
+        :param address: file address, with or without protocol
+        :param outfile: output file path
+        :param md5: expected MD5 checksum of the file, e.g. from `fastq_md5`
+        :param force: discard partial files and start the transfer anew
+        :param stats: statistics updated with the data of the file as it is
+            transferred (including resumed partial files), see `Digest`
+
+        :returns MD5 checksum of the downloaded file
+
+        :raises TransferError if the transfer fails after all retries
+        :raises ChecksumError if the checksum does not match after all retries
+
+        """
+
+        outfile = Path(outfile)
+        partial = self.get_partial(outfile)
+
+        if force and partial.exists():
+            partial.unlink()
+
+        start, clock = time.time(), time.perf_counter()
+        status = "error"
+        try:
+            checksum = self._download(address, partial, outfile, md5, stats)
+            status = 0
+        finally:
+            tracer = get_tracer()
+            if tracer is not None:
+                tracer.record(
+                    name=urlparse(self.get_url(address)).scheme,
+                    category="transfer",
+                    start=start,
+                    wall=time.perf_counter() - clock,
+                    status=status,
+                    bytes_written=get_bytes_written(
+                        [outfile if status == 0 else partial]
+                    ),
+                    address=address
+                )
+
+        return checksum
+
+    def _download(self, address, partial, outfile, md5, stats=None) -> str:
+
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt > 0:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+
+            try:
+                checksum = self._transfer(address, partial, stats)
+            except (OSError, EOFError, ftplib.Error) as err:
+                if self.is_permanent(err):
+                    raise TransferError(
+                        f"Transfer failed: {address} ({err})"
+                    ) from err
+                error = err
+                continue
+
+            if md5 and checksum != md5:
+                # Corrupt data can not be resumed, start over:
+                partial.unlink()
+                error = ChecksumError(
+                    f"Checksum {checksum} does not match {md5}: {address}"
+                )
+                continue
+
+            partial.replace(outfile)
+
+            return checksum
+
+        if isinstance(error, ChecksumError):
+            raise error
+
+        raise TransferError(
+            f"Transfer failed after {self.retries + 1} attempts: "
+            f"{address} ({error})"
+        ) from error
+
+    @staticmethod
+    def is_permanent(error: Exception) -> bool:
+
+        """ Errors that are not resolved by retrying the transfer: HTTP client
+        errors (e.g. 404) except timeouts and rate limits, and permanent FTP
+        replies (5xx, e.g. 550 for missing files) """
+
+        if isinstance(error, urllib.error.HTTPError):
+            return 400 <= error.code < 500 and error.code not in (408, 429)
+
+        return isinstance(error, ftplib.error_perm)
+
+    @staticmethod
+    def get_partial(outfile: Path) -> Path:
+
+        """ Get the path of the partial file for an output file """
+
+        return outfile.with_name(outfile.name + ".part")
+
+    def get_url(self, address: str) -> str:
+
+        """ Add the default protocol to addresses without protocol """
+
+        if "://" in address:
+            return address
+        else:
+            return f"{self.scheme}://{address}"
+
+    def _transfer(self, address: str, partial: Path, stats=None) -> str:
+
+        url = self.get_url(address)
+
+        # Resume from the bytes already on disk:
+        hasher, offset = self._resume(partial, stats)
+
+        with self.bandwidth.transfer() as throttle:
+            if urlparse(url).scheme == "ftp":
+                hasher = self._ftp(url, partial, offset, hasher, throttle)
+            else:
+                hasher = self._http(url, partial, offset, hasher, throttle)
+
+        return hasher.hexdigest()
+
+    def _resume(self, partial: Path, stats=None) -> (Digest, int):
+
+        """ Seed the checksum with the bytes of a partial file """
+
+        hasher = Digest(stats)
+        offset = 0
+
+        if partial.exists():
+            with partial.open("rb") as infile:
+                for chunk in iter(lambda: infile.read(self.chunk_size), b""):
+                    hasher.update(chunk)
+                    offset += len(chunk)
+
+        return hasher, offset
+
+    def _http(self, url, partial, offset, hasher, throttle):
+
+        request = urllib.request.Request(url)
+        if offset:
+            request.add_header("Range", f"bytes={offset}-")
+
+        try:
+            response = urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as err:
+            if err.code == 416 and offset:
+                # Requested range starts at the end of file:
+                return hasher
+            raise
+
+        with response:
+            if offset and response.getcode() != 206:
+                # Server ignored the range request, restart:
+                hasher, mode = Digest(hasher.stats), "wb"
+            else:
+                mode = "ab"
+
+            length = response.getheader("Content-Length")
+
+            received = 0
+            with partial.open(mode) as outfile:
+                for chunk in iter(
+                    lambda: response.read(self.chunk_size), b""
+                ):
+                    outfile.write(chunk)
+                    hasher.update(chunk)
+                    throttle(len(chunk))
+                    received += len(chunk)
+
+            # Reads end without error when the connection is dropped:
+            if length is not None and received < int(length):
+                raise EOFError(
+                    f"Connection closed after {received} of {length} bytes"
+                )
+
+        return hasher
+
+    def _ftp(self, url, partial, offset, hasher, throttle):
+
+        url = urlparse(url)
+
+        ftp = ftplib.FTP(timeout=self.timeout)
+        ftp.connect(url.hostname, url.port or 21)
+        try:
+            ftp.login(url.username or "anonymous", url.password or "")
+
+            if offset:
+                try:
+                    ftp.sendcmd(f"REST {offset}")
+                except ftplib.error_perm:
+                    # Server does not support restarts:
+                    hasher, offset = Digest(hasher.stats), 0
+
+            with partial.open("ab" if offset else "wb") as outfile:
+
+                def write(chunk):
+                    outfile.write(chunk)
+                    hasher.update(chunk)
+                    throttle(len(chunk))
+
+                ftp.retrbinary(
+                    f"RETR {url.path}", write,
+                    blocksize=self.chunk_size, rest=offset or None
+                )
+        finally:
+            try:
+                ftp.quit()
+            except (OSError, EOFError, ftplib.Error):
+                ftp.close()
+
+        return hasher
@@ -0,0 +1,392 @@
+"""
+
+Pathfinder tree module, @esteinig
+
+Array-backed phylogenetic trees. Nodes are stored in preorder as arrays of parent
+indices, branch lengths, labels and the end of each node's subtree, so that the
+subtree of a node is a contiguous range of nodes. Root-to-tip distances, subtree
+sums, pruning and root-to-tip regression are vectorized over all nodes at once.
+
+"""
+
+import numpy
+
+from pathlib import Path
+
+from pathfinder.newick import tokenize, get_label
+
+
+class Tree:
+
+    """ Phylogenetic tree as arrays of nodes in preorder """
+
+    def __init__(
+        self,
+        parent: numpy.array,
+        length: numpy.array,
+        stop: numpy.array,
+        labels: numpy.array
+    ):
+
+        """ Tree
+
+        :param parent: index of the parent of each node, -1 for the root
+        :param length: branch length of each node
+        :param stop: end of the subtree of each node (exclusive): the
+            subtree of node i are the nodes i to stop[i] - 1
+        :param labels: label of each node, empty if none
+
+        """
+
+        self.parent = numpy.asarray(parent, dtype=numpy.int64)
+        self.length = numpy.asarray(length, dtype=float)
+        self.stop = numpy.asarray(stop, dtype=numpy.int64)
+        self.labels = numpy.asarray(labels, dtype=str)
+
+    def __len__(self):
+
+        return len(self.parent)
+
+    @property
+    def is_tip(self) -> numpy.array:
+
+        return self.stop == numpy.arange(len(self)) + 1
+
+    @property
+    def tips(self) -> numpy.array:
+
+        """ Indices of the tips in order of appearance """
+
+        return numpy.flatnonzero(self.is_tip)
+
+    @classmethod
+    def from_newick(cls, newick_file: Path) -> 'Tree':
+
+        """ Tree from the first tree in a Newick file
+
+        Labels are read as by DendroPy, see `pathfinder.newick.get_label`;
+        missing branch lengths are read as zero.
+
+        :param newick_file: tree file in Newick format
+
+        :returns tree
+
+        :raises ValueError if the tree is empty or malformed
+
+        """
+
+        parent, length, stop, labels = [], [], [], []
+
+        stack = []          # open internal nodes
+        node = None         # node receiving labels and branch lengths
+        tip = True          # a tip starts at the next label or structure
+        is_length = False   # next token is a branch length
+
+        def add_node(label: str = '') -> int:
+            index = len(parent)
+            parent.append(stack[-1] if stack else -1)
+            length.append(0.)
+            stop.append(index + 1)
+            labels.append(label)
+            return index
+
+        for token in tokenize(newick_file):
+            if is_length:
+                is_length = False
+                try:
+                    length[node] = float(token)
+                except ValueError:
+                    raise ValueError(f'Branch length is not a number: {token}')
+                continue
+
+            if token == '(':
+                if parent and not stack:
+                    raise ValueError('Tree has more than one root')
+                node = add_node()
+                stack.append(node)
+                tip = True
+            elif token == ',':
+                if tip:
+                    add_node()
+                if not stack:
+                    raise ValueError('Tree has more than one root')
+                tip = True
+            elif token == ')':
+                if tip:
+                    add_node()
+                if not stack:
+                    raise ValueError('Unbalanced parentheses in tree')
+                node = stack.pop()
+                stop[node] = len(parent)
+                tip = False
+            elif token == ':':
+                if tip:
+                    node = add_node()
+                    tip = False
+                is_length = True
+            elif token == ';':
+                break
+            elif tip:
+                node = add_node(get_label(token))
+                tip = False
+            else:
+                labels[node] = get_label(token)
+
+        if stack:
+            raise ValueError('Unbalanced parentheses in tree')
+        if not parent:
+            raise ValueError(f'No tree in file: {newick_file}')
+
+        return cls(parent, length, stop, labels)
+
+    @classmethod
+    def load(cls, file: Path) -> 'Tree':
+
+        """ Load a tree saved with `Tree.save` (.npz) """
+
+        with numpy.load(file) as data:
+            return cls(data['parent'], data['length'], data['stop'], data['labels'])
+
+    def save(self, file: Path) -> None:
+
+        """ Save the tree in compact form (.npz) """
+
+        numpy.savez_compressed(
+            file,
+            parent=self.parent.astype(numpy.int32),
+            length=self.length,
+            stop=self.stop.astype(numpy.int32),
+            labels=self.labels
+        )
+
+    @classmethod
+    def read(cls, file: Path) -> 'Tree':
+
+        """ Tree from a Newick file or a tree saved with `Tree.save` (.npz) """
+
+        if Path(file).suffix == '.npz':
+            return cls.load(file)
+        else:
+            return cls.from_newick(file)
+
+    def subtree_sums(self, values: numpy.array) -> numpy.array:
+
+        """ Sum of values over the subtree of each node
+
+        :param values: value of each node
+
+        :returns sum of the values of each node and its descendants
+
+        """
+
+        cumulative = numpy.concatenate(([0], numpy.cumsum(values)))
+
+        return cumulative[self.stop] - cumulative[:-1]
+
+    def path_sums(self, values: numpy.array) -> numpy.array:
+
+        """ Sum of values over the path from the root to each node
+
+        Paths are summed by pointer jumping: each pass adds the sum of the
+        path to the current ancestor and doubles the distance to the next
+        ancestor, so that the number of passes grows with the logarithm of
+        the depth of the tree.
+
+        :param values: value of each node
+
+        :returns sum of the values of each node and its ancestors
+
+        """
+
+        sums = numpy.array(values, dtype=float)
+        ancestor = self.parent.copy()
+
+        unresolved = numpy.flatnonzero(ancestor >= 0)
+        while len(unresolved) > 0:
+            above = ancestor[unresolved]
+            sums[unresolved] += sums[above]
+            ancestor[unresolved] = ancestor[above]
+            unresolved = unresolved[ancestor[unresolved] >= 0]
+
+        return sums
+
+    def subtree_sizes(self) -> numpy.array:
+
+        """ Number of tips in the subtree of each node """
+
+        return self.subtree_sums(self.is_tip.astype(numpy.int64))
+
+    def root_distances(self) -> numpy.array:
+
+        """ Distance of each node from the root, without the root branch """
+
+        length = self.length.copy()
+        length[self.parent < 0] = 0.
+
+        return self.path_sums(length)
+
+    def prune(self, labels: list or set) -> 'Tree':
+
+        """ Remove tips by label
+
+        Internal nodes without remaining tips are removed; nodes with a
+        single remaining child are removed and their branch length added
+        to the child, so that distances between remaining tips are kept.
+
+        :param labels: labels of the tips to remove
+
+        :returns pruned tree
+
+        :raises ValueError if no tips remain
+
+        """
+
+        remove = self.is_tip & numpy.isin(self.labels, list(labels))
+        if not remove.any():
+            return self
+
+        keep = self.subtree_sums(self.is_tip & ~remove) > 0
+        if not keep.any():
+            raise ValueError('No tips remain in pruned tree')
+
+        nodes = numpy.flatnonzero(keep & (self.parent >= 0))
+        children = numpy.bincount(self.parent[nodes], minlength=len(self))
+        select = keep & (children != 1)
+
+        # Nearest selected ancestor of each node:
+        ancestor = self.parent.copy()
+        while True:
+            unresolved = numpy.flatnonzero(ancestor >= 0)
+            unresolved = unresolved[~select[ancestor[unresolved]]]
+            if len(unresolved) == 0:
+                break
+            ancestor[unresolved] = self.parent[ancestor[unresolved]]
+
+        distances = self.root_distances()
+        length = numpy.where(
+            ancestor == self.parent, self.length, distances - distances[ancestor]
+        )
+        length[ancestor < 0] = numpy.where(
+            self.parent[ancestor < 0] < 0, self.length[ancestor < 0], 0.
+        )
+
+        index = numpy.cumsum(select) - 1
+        selected = numpy.concatenate(([0], numpy.cumsum(select)))
+
+        return Tree(
+            parent=numpy.where(ancestor >= 0, index[ancestor], -1)[select],
+            length=length[select],
+            stop=selected[self.stop[select]],
+            labels=self.labels[select]
+        )
+
+    def tip_distances(self, root: int = 0, offset: float = 0.) -> numpy.array:
+
+        """ Distances of the tips from a node or a point on its branch
+
+        :param root: node from which distances are measured
+        :param offset: distance of the point on the branch of the root
+            node towards its parent, not beyond the parent
+
+        :returns distance of each tip, in order of `Tree.tips`
+
+        """
+
+        distances = self.root_distances()
+        tips = self.tips
+
+        # Distance of the deepest common ancestor of root and tips,
+        # ancestors of the root are visited from the root down:
+        path = [root]
+        while self.parent[path[-1]] >= 0:
+            path.append(self.parent[path[-1]])
+
+        common = numpy.zeros(len(self))
+        for node in reversed(path):
+            common[node:self.stop[node]] = distances[node]
+
+        below = (tips >= root) & (tips < self.stop[root])
+
+        return distances[tips] + distances[root] - 2*common[tips] + \
+            numpy.where(below, offset, -offset)
+
+    def regression_root(self, dates: numpy.array) -> (int, float):
+
+        """ Root minimizing the residuals of the root-to-tip regression
+
+        Residual sums of squares of the regression of root-to-tip distances on
+        tip dates are computed for all nodes as roots at once, from subtree and
+        path sums of the distances. On each branch, the position of the root
+        minimizing the residuals is then found in closed form, as the residuals
+        are quadratic in the position of the root along the branch.
+
+        :param dates: date of each node, NaN for nodes without date
+
+        :returns node and offset along its branch towards the parent,
+            see `Tree.tip_distances`
+
+        :raises ValueError if fewer than two tips have dates, or all
+            dates are the same
+
+        """
+
+        weights = numpy.isfinite(dates) & self.is_tip
+        x = numpy.where(weights, dates, 0.)
+
+        n, sx, sxx = weights.sum(), x.sum(), x @ x
+        if n < 2:
+            raise ValueError('Fewer than two tips with dates')
+
+        cxx = sxx - sx*sx/n
+        if cxx <= 0:
+            raise ValueError('Tip dates do not vary')
+
+        d = self.root_distances()
+        d_parent = numpy.where(self.parent >= 0, d[self.parent], 0.)
+        length = d - d_parent
+        wd = numpy.where(weights, d, 0.)
+        sd, sdd, sxd = wd.sum(), wd @ wd, x @ wd
+
+        # Tip sums below each node:
+        w_below = self.subtree_sums(weights)
+        x_below = self.subtree_sums(x)
+        d_below = self.subtree_sums(wd)
+
+        # Sums over tips of (functions of) the distance of their common
+        # ancestor with each node, from the path to the node:
+        a = self.path_sums(w_below*length)
+        b = self.path_sums(x_below*length)
+        c = self.path_sums(w_below*(d*d - d_parent*d_parent))
+        e = self.path_sums(d_below*length)
+
+        # Regression sums of distances from each node:
+        sy = sd + n*d - 2*a
+        sxy = sxd + sx*d - 2*b
+        syy = sdd + 2*d*sd + n*d*d - 4*e - 4*d*a + 4*c
+
+        cxy = sxy - sx*sy/n
+        residuals = syy - sy*sy/n - cxy*cxy/cxx
+
+        # Moving the root along a branch adds the offset to the distances
+        # of the tips below the node and subtracts it from all others:
+        ss = 2*w_below - n
+        sxs = 2*x_below - sx
+        sys = 2*(d_below - d*w_below) - sy
+
+        css = n - ss*ss/n
+        cxs = sxs - sx*ss/n
+        cys = sys - sy*ss/n
+
+        rss = css - cxs*cxs/cxx
+        rsy = cys - cxy*cxs/cxx
+
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            offset = numpy.where(rss > 0, -rsy/rss, 0.)
+        offset = numpy.clip(offset, 0., length)
+        offset[self.parent < 0] = 0.
+
+        residuals = residuals + 2*offset*rsy + offset*offset*rss
+
+        root = int(numpy.argmin(residuals))
+
+        return root, float(offset[root])
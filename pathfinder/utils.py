@@ -1,15 +1,14 @@
+from __future__ import annotations
+
 import subprocess
 import shlex
-import sys
-import dendropy
-import pandas
-import pysam
-from random import shuffle
+import gzip
+import mmap
+import os
 from pathlib import Path
 
-import matplotlib.pyplot as plt
-
-from pathfinder.plots import plot_date_randomisation, plot_regression
+# Dependencies for data processing, phylogenetics and plotting are imported
+# in the functions that use them, to keep the command-line client fast
 
 
 def run_cmd(cmd, callback=None, watch=False, background=False, shell=False):
@@ -19,8 +18,11 @@ def run_cmd(cmd, callback=None, watch=False, background=False, shell=False):
     If a callback is provided, then the output is sent to it, otherwise it
     is just returned.
 
-    Optionally, the output of the command can be "watched" and whenever new
-    output is detected, it will be sent to the given `callback`.
+    Optionally, the output of the command can be "watched" and every line
+    of output is sent to the given `callback` as it is written.
+
+    Synchronous interface to `pathfinder.runner.CommandRunner`, which runs
+    many commands concurrently, with timeouts and cancellation.
 
     Returns:
         A string containing the output of the command, or None if a `callback`
@@ -35,33 +37,29 @@ def run_cmd(cmd, callback=None, watch=False, background=False, shell=False):
             "You must provide a callback when watching a process."
         )
 
-    output = None
-    try:
+    if background:
+        # Let task run in background and return pmid for monitoring:
         if shell:
             proc = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE)
         else:
             proc = subprocess.Popen(shlex.split(cmd), stdout=subprocess.PIPE)
 
-        if background:
-            # Let task run in background and return pmid for monitoring:
-            return proc.pid, proc
-
-        if watch:
-            while proc.poll() is None:
-                line = proc.stdout.readline()
-                if line != "":
-                    callback(line)
-
-            # Sometimes the process exits before we have all of the output, so
-            # we need to gather the remainder of the output.
-            remainder = proc.communicate()[0]
-            if remainder:
-                callback(remainder)
-        else:
-            output = proc.communicate()[0]
-    except:
-        err = str(sys.exc_info()[1]) + "\n"
-        output = err
+        return proc.pid, proc
+
+    from pathfinder.runner import run_command
+
+    try:
+        result = run_command(
+            cmd,
+            stdout_callback=callback if watch else None,
+            shell=shell,
+            capture=not watch,
+            capture_stderr=False
+        )
+    except OSError as err:
+        output = str(err) + "\n"
+    else:
+        output = None if watch else result.stdout
 
     if callback and output is not None:
         return callback(output)
@@ -83,27 +81,46 @@ def get_genome_sizes() -> pandas.DataFrame:
     """ Return a dataframe from the `genome.size` file in `pathfinder.resources`
 
     Genome sizes are computed as media genome size for given taxonomic
-    identifier from the NCBI Prokaryot DB.
+    identifier from the NCBI Prokaryot DB. The file is loaded once per
+    process, see `pathfinder.genomes.get_genome_size_lookup`.
 
     :return Dataframe with one column size and row index taxid
 
     """
 
-    genome_sizes = Path(__file__).parent / "resources" / "genome.sizes"
-    genome_sizes = pandas.read_csv(genome_sizes, index_col=0)
+    import pandas
 
-    return genome_sizes
+    from pathfinder.genomes import get_genome_size_lookup
+
+    genome_sizes = get_genome_size_lookup()
+
+    return pandas.DataFrame(
+        {'size': genome_sizes.sizes},
+        index=pandas.Index(genome_sizes.taxids, name='taxid')
+    )
 
 
 # Alignment support functions
 
-def remove_sample(alignment: Path, outfile: Path, remove: str or list) -> None:
+def remove_sample(
+    alignment: Path,
+    outfile: Path,
+    remove: str or list or set = None,
+    names_file: Path = None,
+    keep: bool = False
+) -> None:
 
     """ Remove any sequence from the alignment file by sequence names
 
-    :param alignment: alignment file (.fasta)
+    Only headers are parsed: sequences are copied as blocks of bytes from the
+    memory-mapped alignment to the output file. Gzipped alignments are
+    streamed line by line.
+
+    :param alignment: alignment file (.fasta or .fasta.gz)
     :param outfile: output file (.fasta)
     :param remove: sequence identifiers to remove
+    :param names_file: file with sequence identifiers to remove, one per line
+    :param keep: keep only the given sequence identifiers instead of removing them
 
     :return:  None, outputs alignment file with sequences removed
 
@@ -112,10 +129,256 @@ def remove_sample(alignment: Path, outfile: Path, remove: str or list) -> None:
     if isinstance(remove, str):
         remove = [remove]
 
-    with pysam.FastxFile(alignment) as fin, outfile.open('w') as fout:
-            for entry in fin:
-                if entry.name not in remove:
-                    fout.write(str(entry) + '\n')
+    names = set(remove or [])
+    if names_file is not None:
+        with Path(names_file).open('r') as infile:
+            names.update(line.strip() for line in infile if line.strip())
+
+    names = {name.encode('utf-8') for name in names}
+
+    alignment = Path(alignment)
+    with alignment.open('rb') as fin:
+        gzipped = fin.read(2) == b'\x1f\x8b'
+
+    with Path(outfile).open('wb') as fout:
+        if gzipped:
+            with gzip.open(alignment, 'rb') as fin:
+                _filter_fasta_lines(fin, fout, names, keep)
+        else:
+            _filter_fasta_blocks(alignment, fout, names, keep)
+
+
+def _filter_fasta_blocks(alignment: Path, fout, names: set, keep: bool):
+
+    """ Copy the records of a FASTA file selected by name in blocks """
+
+    from pathfinder.alignment import fasta_name, find_header
+
+    with alignment.open('rb') as fin:
+        if os.fstat(fin.fileno()).st_size == 0:
+            return
+
+        with mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ) as mm, \
+                memoryview(mm) as view:
+
+            start = find_header(mm, 0)
+            while start != -1:
+                header_end = mm.find(b'\n', start)
+                if header_end == -1:
+                    header_end = len(mm)
+
+                next_start = find_header(mm, header_end)
+                end = len(mm) if next_start == -1 else next_start
+
+                if (fasta_name(mm[start:header_end]) in names) == keep:
+                    fout.write(view[start:end])
+
+                start = next_start
+
+
+def _filter_fasta_lines(fin, fout, names: set, keep: bool):
+
+    """ Copy the records of a FASTA stream selected by name line by line """
+
+    from pathfinder.alignment import fasta_name
+
+    selected = False
+    for line in fin:
+        if line.startswith(b'>'):
+            selected = (fasta_name(line) in names) == keep
+        if selected:
+            fout.write(line)
+
+
+def phybeast_variant_sites(
+    alignment: Path,
+    output_file: Path = Path('snps.fasta'),
+    constant_file: Path = None,
+    acgt: bool = False,
+    store: Path = None,
+    block_size: int = 64*1024*1024
+) -> numpy.array:
+
+    """ Extract variant sites and count constant sites of a core alignment
+
+    The alignment is converted to a memory-mapped matrix of nucleotide codes,
+    see `pathfinder.alignment.Alignment`, and read in blocks of samples:
+    once to count the nucleotides at each site, and once to write the
+    variant sites.
+
+    :param alignment: core alignment (.fasta or .fasta.gz), or alignment store
+        directory from `pathfinder.alignment.Alignment.convert`
+    :param output_file: output alignment of variant sites (.fasta)
+    :param constant_file: output file of constant site counts of A, C, G, T,
+        comma-separated as for IQ-TREE (-fconst)
+    :param acgt: variant and constant sites contain only A, C, G or T
+    :param store: keep the converted alignment in this store directory,
+        otherwise the converted alignment is removed after extraction
+    :param block_size: maximum bytes of samples read at once
+
+    :returns indices of variant sites in the alignment
+
+    """
+
+    import numpy
+    import tempfile
+
+    from pathfinder.alignment import Alignment, variant_sites
+
+    alignment = Path(alignment)
+    output_file = Path(output_file)
+
+    with tempfile.TemporaryDirectory(dir=output_file.parent) as tmpdir:
+        if alignment.is_dir():
+            aln = Alignment.open(alignment)
+        else:
+            aln = Alignment.convert(
+                alignment, store=Path(tmpdir) if store is None else store
+            )
+
+        variant, constant = variant_sites(
+            aln.site_counts(block_size), samples=len(aln), acgt=acgt
+        )
+        sites = numpy.flatnonzero(variant)
+
+        aln.write_fasta(output_file, sites=sites, block_size=block_size)
+
+        del aln  # release the memory map before removing the store
+
+    if constant_file is not None:
+        Path(constant_file).write_text(','.join(str(c) for c in constant) + '\n')
+
+    return sites
+
+
+def phybeast_snp_distances(
+    alignment: Path,
+    output_file: Path = Path('distances.npy'),
+    threshold: int = None,
+    workers: int = 4,
+    store: Path = None,
+    block_size: int = 64*1024*1024
+) -> None:
+
+    """ Pairwise SNP distances between the samples of a core alignment
+
+    Only variant sites can differ between samples: the variant sites of the
+    alignment are packed into bit planes and compared in blocks of samples
+    in a process pool, see `pathfinder.distances.snp_distances`.
+
+    :param alignment: core alignment (.fasta or .fasta.gz), or alignment store
+        directory from `pathfinder.alignment.Alignment.convert`
+    :param output_file: output distance matrix (.npy) with sample names in
+        the same order (.names.txt), or edge list if a threshold is given
+        (.tsv) with columns: sample1, sample2, distance
+    :param threshold: output the edges between samples at or below this
+        distance instead of the distance matrix
+    :param workers: number of processes
+    :param store: keep the converted alignment in this store directory,
+        otherwise the converted alignment is removed after computation
+    :param block_size: maximum bytes of samples read at once, and of
+        comparisons held in memory per process
+
+    :returns None, writes to file :param output_file
+
+    """
+
+    import numpy
+    import pandas
+    import tempfile
+
+    from pathfinder.alignment import Alignment, variant_sites
+    from pathfinder.distances import snp_distances
+
+    alignment = Path(alignment)
+    output_file = Path(output_file)
+
+    with tempfile.TemporaryDirectory(dir=output_file.parent) as tmpdir:
+        if alignment.is_dir():
+            aln = Alignment.open(alignment)
+        else:
+            aln = Alignment.convert(
+                alignment, store=Path(tmpdir) if store is None else store
+            )
+
+        variant, _ = variant_sites(aln.site_counts(block_size), samples=len(aln))
+
+        planes_file = Path(tmpdir) / 'planes.npy'
+        aln.pack(sites=numpy.flatnonzero(variant), output=planes_file, block_size=block_size)
+
+        names = aln.names
+        del aln  # release the memory map before removing the store
+
+        if threshold is None:
+            snp_distances(
+                planes_file, matrix_file=output_file,
+                workers=workers, block_size=block_size
+            )
+            output_file.with_suffix('.names.txt').write_text(
+                ''.join(f'{name}\n' for name in names)
+            )
+        else:
+            i, j, distances = snp_distances(
+                planes_file, threshold=threshold,
+                workers=workers, block_size=block_size
+            )
+            names = numpy.array(names, dtype=object)
+            pandas.DataFrame(
+                {'sample1': names[i], 'sample2': names[j], 'distance': distances}
+            ).to_csv(output_file, sep='\t', index=False)
+
+
+def phybeast_clusters(
+    distance_file: Path,
+    thresholds: list = (5, 10, 25),
+    names_file: Path = None,
+    output_file: Path = Path('clusters.tsv')
+) -> pandas.DataFrame:
+
+    """ Transmission clusters of samples at SNP distance thresholds
+
+    Samples are linked at or below each threshold (single linkage); all
+    thresholds are computed in one pass over the sorted edges, see
+    `pathfinder.clusters.threshold_clusters`.
+
+    :param distance_file: distance matrix (.npy) with sample names (.names.txt),
+        or tab-delimited edge list with columns: sample1, sample2, distance,
+        from `pf phybeast utils snp-distances`
+    :param thresholds: SNP distance thresholds
+    :param names_file: sample names, one per line; samples not in the
+        edge list are reported as clusters of their own
+    :param output_file: tab-delimited output file
+
+    :returns DataFrame with columns: sample, threshold, cluster_id - one
+        row per sample and threshold, singletons included
+
+    """
+
+    import numpy
+    import pandas
+
+    from pathfinder.clusters import read_edges, threshold_clusters
+
+    thresholds = sorted(set(int(threshold) for threshold in thresholds))
+    if not thresholds:
+        raise ValueError('At least one threshold required')
+
+    names, i, j, distances = read_edges(
+        distance_file, max_distance=thresholds[-1], names_file=names_file
+    )
+
+    clusters = threshold_clusters(len(names), i, j, distances, thresholds)
+
+    df = pandas.DataFrame({
+        'sample': numpy.tile(numpy.array(names, dtype=object), len(thresholds)),
+        'threshold': numpy.repeat(thresholds, len(names)),
+        'cluster_id': clusters.ravel()
+    })
+
+    if output_file is not None:
+        df.to_csv(output_file, sep='\t', index=False)
+
+    return df
 
 
 # Phylogenetics support functions
@@ -124,16 +387,23 @@ def get_tree_dates(newick_file: Path) -> pandas.DataFrame:
 
     """ Get the leaf names and dates from the input tree
 
+    Tip labels are read in one pass over the file without building the
+    tree, see `pathfinder.newick.iter_tips`. Labels are split into name and
+    date at the last whitespace (or underscore in unquoted labels); labels
+    without date are returned with date None.
+
     :param newick_file: tree file in newick format
 
     :returns `pandas.DataFrame` with two columns: name, date
 
     """
 
-    tree = dendropy.Tree.get(path=newick_file, schema="newick")
+    import pandas
+
+    from pathfinder.newick import iter_tips, split_label
 
     return pandas.DataFrame(
-        data=[taxon.label.split() for taxon in tree.taxon_namespace],
+        data=[split_label(label) for label in iter_tips(newick_file)],
         columns=['name', 'date']
     )
 
@@ -144,37 +414,260 @@ def get_tree_dates(newick_file: Path) -> pandas.DataFrame:
 
 def phybeast_randomise_date_file(
     date_file: Path,
-    output_file: Path = None
+    output_file: Path = None,
+    replicates: int = 1,
+    seed: int = None,
+    long: bool = False,
+    numbered: bool = None
 ) -> pandas.DataFrame:
 
     """ Randomise order of dates in file
 
-    DataFrame input options can be passed as **kwargs
+    All replicates are generated at once from a permutation matrix
+    of the dates, one row per replicate.
 
     :param date_file: path to date file with columns: name and date
-    :param output_file: path to tab-delimited output file for randomised dates
-
-    :returns DataFrame with shuffled dates
+    :param output_file: path to tab-delimited output file for randomised dates;
+        with multiple replicates, one file per replicate is written with the
+        replicate number inserted before the extension: random.{1..n}.tab
+    :param replicates: number of replicates of randomised dates
+    :param seed: seed of the random number generator for reproducible replicates
+    :param long: write all replicates into the output file as one table with
+        columns: replicate, name, date
+    :param numbered: number the output file of each replicate, also of a
+        single replicate (random.1.tab); by default with multiple replicates
+
+    :returns DataFrame with shuffled dates, or with multiple replicates a long
+        DataFrame with columns: replicate, name, date
 
     :raises ValueError if date and name not in column headers
 
     """
 
+    import numpy
+    import pandas
+
     df = pandas.read_csv(date_file, sep='\t')
 
     if 'date' not in df.columns or 'name' not in df.columns:
         raise ValueError('Could not find date and name in columns')
 
-    # Suppress warning
-    with pandas.option_context('mode.chained_assignment', None):
-        dates = df.date
-        shuffle(dates)
-        df.date = dates
+    rng = numpy.random.default_rng(seed)
+
+    # Permutation matrix, random order of dates per replicate (row)
+    permutations = numpy.argsort(
+        rng.random((replicates, len(df))), axis=1
+    )
+    dates = df.date.values[permutations]
+
+    if numbered is None:
+        numbered = replicates > 1
+
+    if replicates == 1 and not long and not numbered:
+        df = df.assign(date=dates[0])
+
+        if output_file is not None:
+            df.to_csv(output_file, sep='\t', header=True, index=False)
+
+        return df
+
+    if output_file is not None and not long:
+        output_file = Path(output_file)
+        for i, replicate_dates in enumerate(dates, 1):
+            df.assign(date=replicate_dates).to_csv(
+                output_file.with_name(
+                    f'{output_file.stem}.{i}{output_file.suffix}'
+                ), sep='\t', header=True, index=False
+            )
+
+    replicate_df = pandas.DataFrame({
+        'replicate': numpy.repeat(numpy.arange(1, replicates + 1), len(df)),
+        'name': numpy.tile(df.name.values, replicates),
+        'date': dates.ravel()
+    })
+
+    if output_file is not None and long:
+        replicate_df.to_csv(output_file, sep='\t', header=True, index=False)
+
+    return replicate_df
+
+
+def phybeast_clock_screen(
+    tree_file: Path = None,
+    date_file: Path = None,
+    rtt_file: Path = None,
+    replicates: int = 1000,
+    seed: int = None,
+    output_file: Path = Path('rates.tab'),
+    rate_file: Path = None,
+    reroot: bool = True,
+    block_size: int = 10000000
+) -> pandas.DataFrame:
+
+    """ Screen for temporal signal by root-to-tip regression on randomised dates
+
+    Root-to-tip distances are computed once, from the root of the regression on
+    the observed dates as in `phybeast_root_to_tip`; regression rates and TMRCAs
+    of all date-randomised replicates are then computed as matrix operations over
+    the permuted date vectors, in blocks of replicates to limit memory use.
+
+    :param tree_file: tree file in newick format, leaf labels: name date, or
+        tree saved with `pathfinder.tree.Tree.save` (.npz)
+    :param date_file: tab-delimited date file with columns: name, date;
+        takes precedence over dates in the leaf labels of the tree
+    :param rtt_file: `rtt.csv` file from TimeTree clock regression, instead
+        of computing root-to-tip distances and dates from the tree
+    :param replicates: number of date-randomised replicates
+    :param seed: seed of the random number generator for reproducible replicates
+    :param output_file: tab-delimited output file of replicate rates and TMRCAs,
+        as `rates.tab` of process DateRandomisationPlot
+    :param rate_file: tab-delimited output file of the rate and TMRCA of the
+        observed dates, as `rate.txt` of process MolecularClock
+    :param reroot: root the tree for the regression on the observed dates,
+        otherwise distances are computed from the root of the tree as given
+    :param block_size: maximum number of permuted dates held in memory
+
+    :returns DataFrame with columns: rate, tmrca - one row per replicate
+
+    :raises ValueError if neither tree nor rtt file are given, or there
+        are fewer than two dated leaves
+
+    """
+
+    import numpy
+    import pandas
+
+    if rtt_file is not None:
+        data = pandas.read_csv(
+            rtt_file, skiprows=2, header=None,
+            names=['name', 'date', 'distance']
+        )
+    elif tree_file is not None:
+        data = phybeast_root_to_tip(
+            tree_file, date_file=date_file, output_file=None, reroot=reroot
+        )
+    else:
+        raise ValueError('Tree or root-to-tip regression file required')
+
+    data['date'] = pandas.to_numeric(data['date'], errors='coerce')
+    data = data.dropna(subset=['date', 'distance'])
+
+    if len(data) < 2:
+        raise ValueError('Fewer than two leaves with dates and distances')
+
+    x = data['date'].values.astype(float)
+    y = data['distance'].values.astype(float)
+
+    # Variance of dates is invariant to permutation:
+    x_mean, y_mean = x.mean(), y.mean()
+    x_centered, y_centered = x - x_mean, y - y_mean
+    sxx = x_centered @ x_centered
+
+    def regression(slopes):
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            return pandas.DataFrame({
+                'rate': slopes, 'tmrca': x_mean - y_mean/slopes
+            })
+
+    rng = numpy.random.default_rng(seed)
+
+    block = max(1, block_size // len(x))
+    slopes = numpy.empty(replicates)
+    for i in range(0, replicates, block):
+        n = min(block, replicates - i)
+        permutations = numpy.argsort(rng.random((n, len(x))), axis=1)
+        slopes[i:i+n] = x_centered[permutations] @ y_centered / sxx
+
+    rates = regression(slopes)
 
     if output_file is not None:
-        df.to_csv(output_file, sep='\t', header=True, index=False)
+        rates.to_csv(output_file, sep='\t', header=False, index=False)
 
-    return df
+    if rate_file is not None:
+        regression(
+            numpy.array([x_centered @ y_centered / sxx])
+        ).to_csv(rate_file, sep='\t', header=False, index=False)
+
+    return rates
+
+
+def phybeast_root_to_tip(
+    tree_file: Path,
+    date_file: Path = None,
+    output_file: Path = Path('rtt.csv'),
+    remove: list = None,
+    reroot: bool = True,
+    tree_output: Path = None
+) -> pandas.DataFrame:
+
+    """ Root-to-tip distances and dates of the leaves for the date regression
+
+    Replaces the regression output of TimeTree (`treetime clock`): the tree is
+    rooted at the position minimizing the residuals of the regression of
+    root-to-tip distances on dates, see `pathfinder.tree.Tree.regression_root`.
+
+    :param tree_file: tree file in newick format, leaf labels: name date, or
+        tree saved with `pathfinder.tree.Tree.save` (.npz)
+    :param date_file: tab-delimited date file with columns: name, date;
+        takes precedence over dates in the leaf labels of the tree
+    :param output_file: output file in format of `rtt.csv` from TimeTree,
+        leaves with dates only
+    :param remove: labels of leaves to remove from the tree, e.g. Reference
+    :param reroot: root the tree for the regression, otherwise distances
+        are computed from the root of the tree as given
+    :param tree_output: output file of the (pruned) tree for reuse (.npz)
+
+    :returns DataFrame with columns: name, date, distance
+
+    :raises ValueError if fewer than two leaves have dates, or all dates
+        are the same
+
+    """
+
+    import numpy
+    import pandas
+
+    from pathfinder.tree import Tree
+    from pathfinder.newick import split_label
+
+    tree = Tree.read(tree_file)
+    if remove:
+        tree = tree.prune(remove)
+
+    if tree_output is not None:
+        tree.save(tree_output)
+
+    tips = tree.tips
+    names, dates = zip(*[split_label(label) for label in tree.labels[tips]])
+
+    data = pandas.DataFrame({'name': names, 'date': dates})
+    if date_file is not None:
+        dates = pandas.read_csv(date_file, sep='\t')
+        data = data[['name']].merge(
+            dates[['name', 'date']].drop_duplicates('name'), on='name', how='left'
+        )
+
+    data['date'] = pandas.to_numeric(data['date'], errors='coerce')
+
+    if reroot:
+        node_dates = numpy.full(len(tree), numpy.nan)
+        node_dates[tips] = data['date'].values
+        root, offset = tree.regression_root(node_dates)
+    else:
+        root, offset = 0, 0.
+
+    data['distance'] = tree.tip_distances(root, offset)
+    data = data.dropna(subset=['date'])
+
+    if output_file is not None:
+        with Path(output_file).open('w') as outfile:
+            outfile.write(
+                '#Root-to-tip distances of leaves with dates\n'
+                '#name, date, root-to-tip distance\n'
+            )
+            data.to_csv(outfile, header=False, index=False)
+
+    return data
 
 
 def phybeast_prepare_metadata_file(
@@ -193,6 +686,8 @@ def phybeast_prepare_metadata_file(
 
     """
 
+    import pandas
+
     df = pandas.read_csv(meta_file, sep='\t')
 
     if 'date' not in df.columns or 'name' not in df.columns:
@@ -229,19 +724,176 @@ def phybeast_extract_rate(
 
     """
 
+    rate, tmrca = _parse_clock_result(result_file, prep=prep)
+
+    with output_file.open('w') as outfile:
+        outfile.write(f"{rate}\t{tmrca}\n")
+
+
+def phybeast_aggregate_rates(
+    results: Path or str,
+    prep: str = 'lsd2',
+    output_file: Path = Path('rates.tab'),
+    pattern: str = '*.txt',
+    workers: int = 4
+) -> pandas.DataFrame:
+
+    """ Aggregate rate and TMRCA estimates of date randomisation replicates
+
+    Result files are parsed in parallel with a small process pool. Replicate
+    identifiers are taken from result file names `<name>.<replicate>.txt`,
+    as output by `ClockReplicate`, or the file name without suffix.
+
+    :param results: directory of result files or glob of result files
+    :param prep: result file type: lsd2 or treetime
+    :param output_file: output table, tab-delimited, with header:
+        replicate, rate, tmrca, file
+    :param pattern: glob of result files in the directory of :param results
+    :param workers: number of processes parsing result files
+
+    :returns `pandas.DataFrame` with columns: replicate, rate, tmrca, file
+
+    :raises ValueError if no result files are found
+
+    """
+
+    import glob
+    import pandas
+
+    from functools import partial
+    from concurrent.futures import ProcessPoolExecutor
+
+    if Path(results).is_dir():
+        files = sorted(Path(results).glob(pattern))
+    else:
+        files = sorted(Path(file) for file in glob.glob(str(results)))
+
+    if not files:
+        raise ValueError(f'No result files found: {results}')
+
+    parse = partial(_parse_clock_result, prep=prep)
+    if workers > 1 and len(files) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            estimates = list(executor.map(
+                parse, files, chunksize=max(1, len(files) // (4 * workers))
+            ))
+    else:
+        estimates = [parse(file) for file in files]
+
+    df = pandas.DataFrame(
+        estimates, columns=['rate', 'tmrca'], dtype=float
+    )
+    df.insert(0, 'replicate', [_replicate_name(file) for file in files])
+    df['file'] = [str(file) for file in files]
+
+    numeric = pandas.to_numeric(df.replicate, errors='coerce')
+    if numeric.notna().all():
+        df = df.assign(replicate=numeric.astype(int))
+    df = df.sort_values('replicate').reset_index(drop=True)
+
+    if output_file is not None:
+        df.to_csv(output_file, sep='\t', index=False)
+
+    return df
+
+
+def _replicate_name(result_file: Path) -> str:
+
+    """ Replicate identifier from `<name>.<replicate>.txt` or file name """
+
+    tokens = result_file.name.split('.')
+    if len(tokens) > 2:
+        return tokens[1]
+    else:
+        return result_file.stem
+
+
+def _parse_clock_result(result_file: Path, prep: str = 'lsd2') -> (float, float):
+
+    """ Parse rate and TMRCA estimates from the output of lsd2 or treetime
+
+    :param result_file: output file of lsd2 or stdout of treetime clock
+    :param prep: result file type: lsd2 or treetime
+
+    :returns rate and TMRCA, NaN if not found in the result file
+
+    :raises ValueError if result file type is not supported
+
+    """
+
     if prep == 'lsd2':
+        return _parse_lsd2(Path(result_file))
+    elif prep == 'treetime':
+        return _parse_treetime(Path(result_file))
+    else:
+        raise ValueError('Result file type must be: lsd2 or treetime')
+
+
+def _parse_lsd2(result_file: Path) -> (float, float):
+
+    """ First result line of lsd2: rate <rate>, tMRCA <tmrca>, ... """
+
+    with result_file.open('r') as infile:
+        for line in infile:
+            line = line.strip()
+            if line.startswith('rate'):
+                fields = line.split()
+                return float(fields[1].strip(',')), float(fields[3].strip(','))
+
+    return float('nan'), float('nan')
+
+
+def _parse_treetime(result_file: Path) -> (float, float):
+
+    """ Rate from the stdout of treetime clock: --rate: <rate>
+
+    TreeTime does not report the TMRCA of the root-to-tip regression, which is
+    computed from the `rtt.csv` of its output directory, if it can be found
+    next to the result file: `<stem>/rtt.csv`, `clock/rtt.csv` or `rtt.csv`
+
+    """
+
+    rate = float('nan')
+    with result_file.open('r') as infile:
+        for line in infile:
+            line = line.strip()
+            if line.startswith('--rate:'):
+                rate = float(line.split()[1])
+                break
+
+    tmrca = float('nan')
+    for rtt_file in (
+        result_file.parent / result_file.stem / 'rtt.csv',
+        result_file.parent / 'clock' / 'rtt.csv',
+        result_file.parent / 'rtt.csv'
+    ):
+        if rtt_file.exists():
+            tmrca = _regression_tmrca(rtt_file)
+            break
 
-        with result_file.open('r') as infile, output_file.open('w') as outfile:
-            for line in infile:
-                if line.strip().startswith('rate'):
-                    rate = float(
-                        line.strip().split()[1].strip(',')
-                    )
-                    tmrca = float(
-                        line.strip().split()[3].strip(',')
-                    )
-                    print(rate, tmrca)
-                    outfile.write(f"{rate}\t{tmrca}\n")
+    return rate, tmrca
+
+
+def _regression_tmrca(rtt_file: Path) -> float:
+
+    """ Root date of the root-to-tip regression in `rtt.csv` from treetime """
+
+    import numpy
+    import pandas
+
+    rtt = pandas.read_csv(
+        rtt_file, skiprows=2, header=None, names=['name', 'date', 'distance']
+    )
+    rtt = rtt.apply(pandas.to_numeric, errors='coerce').dropna(
+        subset=['date', 'distance']
+    )
+
+    if len(rtt) < 2:
+        return float('nan')
+
+    slope, intercept = numpy.polyfit(rtt.date.values, rtt.distance.values, 1)
+
+    return -intercept/slope
 
 
 def phybeast_plot_date_randomisation(
@@ -262,6 +914,11 @@ def phybeast_plot_date_randomisation(
 
     """
 
+    import pandas
+    import matplotlib.pyplot as plt
+
+    from pathfinder.plots import plot_date_randomisation, plot_regression
+
     # one panel:
     if regression_file is None:
         fig, ax1 = plt.subplots(figsize=(27.0, 9))
@@ -272,11 +929,14 @@ def phybeast_plot_date_randomisation(
 
     # Date Randomisation
 
-    replicate_df = pandas.read_csv(
-        replicate_file, sep='\t', names=['replicate', 'tmrca']
-    )
+    replicate_df = pandas.read_csv(replicate_file, sep='\t', header=None)
 
-    replicates = replicate_df.replicate.tolist()
+    if replicate_df.iloc[0, 0] == 'replicate':
+        # Table with header from `aggregate-rates`
+        replicate_df = pandas.read_csv(replicate_file, sep='\t')
+        replicates = replicate_df.rate.tolist()
+    else:
+        replicates = replicate_df.iloc[:, 0].tolist()
 
     rate_df = pandas.read_csv(
          rate_file, sep='\t', names=['rate', 'tmrca']
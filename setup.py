@@ -5,7 +5,7 @@ setup(
     url='https://github.com/esteinig/pathfinder',
     author='Eike J. Steinig',
     author_email='eikejoachim.steinig@my.jcu.edu.au',
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks']),
     include_package_data=True,
     install_requires=[
         'click',
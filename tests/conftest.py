@@ -0,0 +1,131 @@
+"""
+
+Tests run from the source tree, in the repository root:
+
+    python -m pytest tests
+
+Transfers are tested against the stand-in ENA file server of the benchmarks
+(`benchmarks/server.py`), which is not part of the installed package.
+
+"""
+
+import sys
+import gzip
+import numpy
+import pytest
+
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.server import TransferServer  # noqa: E402
+
+
+def write_fastq(path: Path, reads: int, length: int = 150, seed: int = 0) -> Path:
+
+    """ Random reads in a multi-member gzipped FASTQ file, as from the ENA,
+    one member per 1000 reads """
+
+    rng = numpy.random.default_rng(seed)
+    letters = numpy.frombuffer(b'ACGT', dtype=numpy.uint8)
+
+    with Path(path).open('wb') as outfile:
+        for start in range(0, reads, 1000):
+            records = []
+            for i in range(start, min(start + 1000, reads)):
+                size = int(rng.integers(length // 2, length + 1))
+                sequence = letters[rng.integers(0, 4, size)].tobytes()
+                records.append(b'@read%d\n%s\n+\n%s\n' % (i, sequence, b'I' * size))
+            outfile.write(gzip.compress(b''.join(records)))
+
+    return Path(path)
+
+
+@pytest.fixture
+def fastq(tmp_path) -> Path:
+
+    return write_fastq(tmp_path / 'reads.fastq.gz', reads=2500, seed=2)
+
+
+@pytest.fixture
+def reads(tmp_path) -> Path:
+
+    """ Directory of served read files: ERR{0..4}_1.fastq.gz, 200 reads each """
+
+    directory = tmp_path / 'server'
+    directory.mkdir()
+    for i in range(5):
+        write_fastq(directory / f'ERR{i}_1.fastq.gz', reads=200, seed=i)
+
+    return directory
+
+
+@pytest.fixture
+def server(reads) -> TransferServer:
+
+    server = TransferServer(reads).start()
+    yield server
+    server.stop()
+
+
+def write_newick(path: Path, tips: int, seed: int = 0) -> Path:
+
+    """ Random binary tree with exponential branch lengths and dated tips,
+    labels: sample{i}_{date} read as 'sample{i} {date}' """
+
+    rng = numpy.random.default_rng(seed)
+
+    lineages = [
+        f'sample{i}_{date:.3f}' for i, date in enumerate(rng.uniform(1990, 2020, tips))
+    ]
+    while len(lineages) > 1:
+        i, j = sorted(rng.choice(len(lineages), 2, replace=False), reverse=True)
+        left, right = lineages.pop(i), lineages.pop(j)
+        lengths = rng.exponential(0.001, 2)
+        lineages.append(f'({left}:{lengths[0]:.6f},{right}:{lengths[1]:.6f})')
+
+    Path(path).write_text(lineages[0] + ';\n')
+
+    return Path(path)
+
+
+@pytest.fixture
+def newick(tmp_path) -> Path:
+
+    return write_newick(tmp_path / 'tree.newick', tips=50, seed=3)
+
+
+def write_fasta(
+    path: Path, samples: int, length: int, seed: int = 0, line_width: int = 60
+) -> Path:
+
+    """ Random core alignment of a reference and mutated samples with missing
+    (N) and gap (-) sites, sequences wrapped at the line width """
+
+    rng = numpy.random.default_rng(seed)
+    alphabet = numpy.frombuffer(b'ACGTN-', dtype=numpy.uint8)
+
+    reference = alphabet[rng.integers(0, 4, length)]
+    variable = numpy.flatnonzero(rng.random(length) < 0.05)
+
+    with Path(path).open('wb') as outfile:
+        for i in range(samples + 1):
+            sequence = reference.copy()
+            if i:
+                sequence[variable] = alphabet[
+                    rng.choice(6, len(variable), p=[.24, .24, .24, .24, .02, .02])
+                ]
+            sequence = sequence.tobytes()
+            outfile.write(b'>%s description\n' % (b'sample%d' % i if i else b'Reference'))
+            for start in range(0, length, line_width):
+                outfile.write(sequence[start:start+line_width] + b'\n')
+
+    return Path(path)
+
+
+@pytest.fixture
+def fasta(tmp_path) -> Path:
+
+    return write_fasta(tmp_path / 'alignment.fasta', samples=40, length=3000, seed=5)
@@ -0,0 +1,85 @@
+import gzip
+import numpy
+import pytest
+
+from pathfinder.alignment import Alignment, iter_fasta, LETTERS
+from pathfinder.utils import phybeast_variant_sites
+
+
+def read_fasta(fasta):
+
+    records = {}
+    for record in fasta.read_bytes().split(b'>')[1:]:
+        header, *lines = record.split(b'\n')
+        records[header.split()[0].decode()] = b''.join(lines)
+
+    return records
+
+
+def brute_force_sites(records, acgt=False):
+
+    """ Variant sites and constant site counts of A, C, G, T by column """
+
+    variant, constant = [], [0, 0, 0, 0]
+    for site, column in enumerate(zip(*records.values())):
+        letters = {chr(letter) for letter in column}
+        observed = letters & set('ACGT')
+        if acgt and not letters <= set('ACGT'):
+            continue
+        if len(observed) > 1:
+            variant.append(site)
+        elif len(observed) == 1:
+            constant['ACGT'.index(observed.pop())] += 1
+
+    return variant, constant
+
+
+def test_convert(fasta, tmp_path):
+
+    records = read_fasta(fasta)
+    alignment = Alignment.convert(fasta, tmp_path / 'store')
+
+    assert alignment.names == list(records)
+    assert alignment.length == 3000
+    for row, sequence in zip(alignment.sites, records.values()):
+        assert LETTERS[row].tobytes() == sequence
+
+    reopened = Alignment.open(tmp_path / 'store')
+    assert numpy.array_equal(reopened.sites, alignment.sites)
+
+
+def test_iter_fasta_gzip(fasta, tmp_path):
+
+    gzipped = tmp_path / 'alignment.fasta.gz'
+    gzipped.write_bytes(gzip.compress(fasta.read_bytes()))
+
+    assert list(iter_fasta(gzipped)) == list(iter_fasta(fasta))
+
+
+def test_convert_unaligned(tmp_path):
+
+    fasta = tmp_path / 'alignment.fasta'
+    fasta.write_text('>a\nACGT\n>b\nACG\n')
+
+    with pytest.raises(ValueError):
+        Alignment.convert(fasta, tmp_path / 'store')
+
+
+@pytest.mark.parametrize('acgt', [False, True])
+def test_variant_sites(fasta, tmp_path, acgt):
+
+    records = read_fasta(fasta)
+    variant, constant = brute_force_sites(records, acgt=acgt)
+
+    sites = phybeast_variant_sites(
+        fasta, output_file=tmp_path / 'snps.fasta', constant_file=tmp_path / 'constant.txt',
+        acgt=acgt, block_size=3000*7
+    )
+
+    assert sites.tolist() == variant
+    assert (tmp_path / 'constant.txt').read_text() == ','.join(map(str, constant)) + '\n'
+
+    snps = read_fasta(tmp_path / 'snps.fasta')
+    assert list(snps) == list(records)
+    for name, sequence in records.items():
+        assert snps[name] == bytes(sequence[site] for site in variant)
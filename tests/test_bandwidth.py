@@ -0,0 +1,80 @@
+import time
+import threading
+
+from unittest import mock
+
+import pathfinder.survey
+
+from pathfinder.survey import MiniAspera
+from pathfinder.transfer import Bandwidth, NativeTransfer
+
+
+def test_share():
+
+    bandwidth = Bandwidth(100)
+    assert bandwidth.share() == 100
+
+    with bandwidth.transfer():
+        with bandwidth.transfer():
+            assert bandwidth.share() == 50
+        assert bandwidth.share() == 100
+
+    assert bandwidth.active == 0
+    assert Bandwidth().share() is None
+
+
+def test_throttle(server, reads, tmp_path):
+
+    size = (reads / 'ERR0_1.fastq.gz').stat().st_size
+    rate = size * 8 / 1e6 / 0.5  # transfer in 0.5 seconds
+
+    start = time.monotonic()
+    NativeTransfer(bandwidth=Bandwidth(rate), chunk_size=1024).download(
+        f'{server.url}/ERR0_1.fastq.gz', tmp_path / 'ERR0_1.fastq.gz'
+    )
+
+    assert time.monotonic() - start >= 0.4
+
+
+def test_wget_shares_bandwidth(tmp_path):
+
+    """ Concurrent wget downloads are active transfers of the bandwidth """
+
+    aspera = MiniAspera(wget=True, bandwidth=Bandwidth(80))
+    barrier = threading.Barrier(4)
+    shares = []
+
+    def run_command(cmd, **kwargs):
+        barrier.wait(timeout=5)
+        shares.append(aspera.bandwidth.share())
+        barrier.wait(timeout=5)
+
+    with mock.patch.object(pathfinder.survey, 'run_command', run_command):
+        threads = [
+            threading.Thread(target=aspera.download, args=(
+                f'ftp.sra.ebi.ac.uk/ERR{i}_1.fastq.gz', tmp_path / f'ERR{i}_1.fastq.gz'
+            ), kwargs=dict(ftp=True)) for i in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    # 80 Mbit/s shared by four transfers:
+    assert shares == [20] * 4
+    assert aspera.bandwidth.active == 0
+
+
+def test_aspera_failover(tmp_path):
+
+    aspera = MiniAspera(ascp=str(tmp_path / 'ascp'), aspera_retries=1, failover=2)
+
+    for i in range(2):
+        assert not aspera.aspera_failed()
+        assert not aspera.download_aspera(
+            f'{aspera.fasp}/vol1/ERR{i}_1.fastq.gz', tmp_path / f'ERR{i}_1.fastq.gz'
+        )
+
+    assert aspera.aspera_failed()
+    assert aspera.get_ftp_address(f'{aspera.fasp}/vol1/ERR0_1.fastq.gz') == \
+        'ftp.sra.ebi.ac.uk/vol1/ERR0_1.fastq.gz'
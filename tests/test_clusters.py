@@ -0,0 +1,95 @@
+import numpy
+import pandas
+import pytest
+
+from pathfinder.clusters import read_edges, threshold_clusters
+from pathfinder.utils import phybeast_clusters
+
+THRESHOLDS = [0, 5, 10, 20, 40]
+
+
+def brute_force_clusters(matrix, threshold):
+
+    """ Connected components of samples at or below the threshold, numbered
+    in order of their first sample """
+
+    clusters = numpy.zeros(len(matrix), dtype=int)
+    for sample in range(len(matrix)):
+        if clusters[sample]:
+            continue
+        clusters[sample] = clusters.max() + 1
+        queue = [sample]
+        while queue:
+            linked = numpy.flatnonzero(matrix[queue.pop()] <= threshold)
+            for other in linked[clusters[linked] == 0]:
+                clusters[other] = clusters[sample]
+                queue.append(other)
+
+    return clusters
+
+
+@pytest.fixture
+def matrix(tmp_path):
+
+    """ Random symmetric distance matrix with names (.names.txt) """
+
+    rng = numpy.random.default_rng(7)
+    distances = rng.integers(0, 2000, (60, 60))
+    distances = numpy.triu(distances, k=1)
+    distances = distances + distances.T
+
+    matrix_file = tmp_path / 'distances.npy'
+    numpy.save(matrix_file, distances.astype(numpy.uint16))
+    matrix_file.with_suffix('.names.txt').write_text(
+        ''.join(f'sample{i}\n' for i in range(60))
+    )
+
+    return matrix_file
+
+
+@pytest.mark.parametrize('block_size', [64*1024*1024, 100])
+def test_threshold_clusters(matrix, block_size):
+
+    distances = numpy.load(matrix)
+
+    names, i, j, edges = read_edges(matrix, max(THRESHOLDS), block_size=block_size)
+    clusters = threshold_clusters(len(names), i, j, edges, THRESHOLDS)
+
+    assert names == [f'sample{i}' for i in range(60)]
+    for threshold, row in zip(THRESHOLDS, clusters):
+        assert numpy.array_equal(row, brute_force_clusters(distances, threshold))
+
+    assert len(set(clusters[0])) > len(set(clusters[-1])) > 1
+
+
+def test_edge_list(tmp_path):
+
+    edges = tmp_path / 'edges.tsv'
+    edges.write_text(
+        'sample1\tsample2\tdistance\n'
+        'a\tb\t1\n'
+        'c\td\t5\n'
+        'b\tc\t10\n'
+    )
+    names = tmp_path / 'names.txt'
+    names.write_text('a\nb\nc\nd\ne\n')
+
+    names, i, j, distances = read_edges(edges, 5, names_file=names)
+    clusters = threshold_clusters(len(names), i, j, distances, [5, 0, 1])
+
+    assert names == ['a', 'b', 'c', 'd', 'e']
+    assert clusters.tolist() == [
+        [1, 1, 2, 2, 3],
+        [1, 2, 3, 4, 5],
+        [1, 1, 2, 3, 4]
+    ]
+
+
+def test_phybeast_clusters(matrix, tmp_path):
+
+    df = phybeast_clusters(matrix, thresholds=[10, 5], output_file=tmp_path / 'clusters.tsv')
+
+    assert df.equals(pandas.read_csv(tmp_path / 'clusters.tsv', sep='\t'))
+    assert df.threshold.unique().tolist() == [5, 10]
+    assert df[df.threshold == 10].cluster_id.tolist() == \
+        brute_force_clusters(numpy.load(matrix), 10).tolist()
@@ -0,0 +1,75 @@
+import numpy
+import pandas
+import pytest
+
+from pathfinder.alignment import Alignment, MISSING
+from pathfinder.distances import snp_distances
+from pathfinder.utils import phybeast_snp_distances
+
+
+def brute_force_distances(alignment):
+
+    sites = numpy.asarray(alignment.sites)
+    matrix = numpy.zeros((len(sites), len(sites)), dtype=int)
+    for i in range(len(sites)):
+        for j in range(len(sites)):
+            valid = (sites[i] < MISSING) & (sites[j] < MISSING)
+            matrix[i, j] = (sites[i][valid] != sites[j][valid]).sum()
+
+    return matrix
+
+
+@pytest.fixture
+def alignment(fasta, tmp_path):
+
+    return Alignment.convert(fasta, tmp_path / 'store')
+
+
+@pytest.mark.parametrize('workers,rows,block_size', [
+    (1, 64, 64*1024*1024), (2, 7, 64*1024*1024), (1, 5, 1000)
+])
+def test_snp_distances(alignment, tmp_path, workers, rows, block_size):
+
+    planes = tmp_path / 'planes.npy'
+    matrix_file = tmp_path / 'matrix.npy'
+    alignment.pack(output=planes)
+
+    snp_distances(
+        planes, matrix_file=matrix_file, workers=workers, rows=rows,
+        block_size=block_size
+    )
+
+    assert numpy.array_equal(numpy.load(matrix_file), brute_force_distances(alignment))
+
+
+def test_snp_distance_edges(alignment, tmp_path):
+
+    planes = tmp_path / 'planes.npy'
+    alignment.pack(output=planes)
+    matrix = brute_force_distances(alignment)
+
+    i, j, distances = snp_distances(planes, threshold=105, rows=16, workers=1)
+
+    expected = {
+        (a, b, matrix[a, b]) for a, b in zip(*numpy.nonzero(matrix <= 105)) if a < b
+    }
+    assert set(zip(i.tolist(), j.tolist(), distances.tolist())) == expected
+
+
+def test_phybeast_snp_distances(fasta, alignment, tmp_path):
+
+    matrix = brute_force_distances(alignment)
+
+    phybeast_snp_distances(fasta, output_file=tmp_path / 'distances.npy', workers=1)
+    assert numpy.array_equal(numpy.load(tmp_path / 'distances.npy'), matrix)
+    assert (tmp_path / 'distances.names.txt').read_text().split() == alignment.names
+
+    phybeast_snp_distances(
+        fasta, output_file=tmp_path / 'edges.tsv', threshold=105, workers=1
+    )
+    edges = pandas.read_csv(tmp_path / 'edges.tsv', sep='\t')
+    index = {name: i for i, name in enumerate(alignment.names)}
+
+    assert len(edges) == (numpy.triu(matrix <= 105, k=1)).sum()
+    for sample1, sample2, distance in edges.itertuples(index=False):
+        assert matrix[index[sample1], index[sample2]] == distance
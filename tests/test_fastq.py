@@ -0,0 +1,120 @@
+import gzip
+import pandas
+import pytest
+
+from pathfinder.fastq import FastqStats, is_fastq
+from pathfinder.manifest import Manifest
+from pathfinder.survey import MiniAspera
+from pathfinder.transfer import NativeTransfer
+
+
+def count(fastq):
+
+    with gzip.open(fastq, 'rb') as infile:
+        lines = infile.read().splitlines()
+
+    return len(lines) // 4, sum(len(line) for line in lines[1::4])
+
+
+@pytest.mark.parametrize('chunk_size', [3, 1000, 1024*1024])
+def test_chunks(fastq, chunk_size):
+
+    """ Records and gzip members split across chunks of the stream """
+
+    reads, bases = count(fastq)
+    data = fastq.read_bytes()
+
+    stats = FastqStats()
+    for start in range(0, len(data), chunk_size):
+        stats.update(data[start:start+chunk_size])
+    stats.finish()
+
+    assert stats.gzip and stats.valid_gzip
+    assert (stats.reads, stats.bases) == (reads, bases)
+    assert stats.check(reads=reads, bases=bases) is None
+    assert stats.check(reads=reads + 1) == f'Read count {reads} does not match {reads + 1}'
+
+
+def test_truncated(fastq, tmp_path):
+
+    truncated = tmp_path / 'truncated.fastq.gz'
+    truncated.write_bytes(fastq.read_bytes()[:-100])
+
+    stats = FastqStats().read(truncated)
+
+    assert stats.valid_gzip is False
+    assert stats.check().startswith('Invalid gzip stream')
+
+
+def test_plain(tmp_path):
+
+    fastq = tmp_path / 'reads.fastq'
+    fastq.write_bytes(b'@r1\nACGT\n+\nIIII\n@r2\nACG\n+\nIII')
+
+    stats = FastqStats().read(fastq)
+
+    assert stats.gzip is False and stats.valid_gzip is None
+    assert (stats.reads, stats.bases, stats.mean_length) == (2, 7, 3.5)
+    assert stats.check(reads=2, bases=7) is None
+
+    fastq.write_bytes(b'@r1\nACGT\n+\nIII\n')
+    assert FastqStats().read(fastq).check() == 'Incomplete FASTQ records'
+
+
+def test_is_fastq():
+
+    assert is_fastq('ERR1_1.fastq.gz') and is_fastq('reads.fq')
+    assert not is_fastq('ERR1.bam')
+
+
+def test_transfer_stats(server, reads, tmp_path):
+
+    """ Statistics of a resumed transfer include the partial file """
+
+    source = (reads / 'ERR2_1.fastq.gz').read_bytes()
+    outfile = tmp_path / 'ERR2_1.fastq.gz'
+    NativeTransfer.get_partial(outfile).write_bytes(source[:len(source) // 2])
+
+    stats = FastqStats()
+    NativeTransfer().download(f'{server.url}/ERR2_1.fastq.gz', outfile, stats=stats)
+
+    assert (stats.reads, stats.bases) == count(reads / 'ERR2_1.fastq.gz')
+
+
+def test_qc_table(server, tmp_path):
+
+    batch = tmp_path / 'batch.csv'
+    pandas.DataFrame({
+        'run_accession': [f'ERR{i}' for i in range(5)],
+        'ftp_1': [f'{server.url}/ERR{i}_1.fastq.gz' for i in range(5)],
+        'ftp_2': [None] * 5,
+        'size': [0.01] * 5,
+        'reads': [200, 200, 200, 200, 100]
+    }).to_csv(batch, index=False)
+
+    outdir = tmp_path / 'reads'
+    outdir.mkdir()
+    manifest = Manifest(outdir / 'manifest.db')
+
+    aspera = MiniAspera()
+    aspera.transfer.backoff = 0.
+    aspera.download_batch(
+        batch, outdir=outdir, ftp=True, workers=2, manifest=manifest,
+        progress=lambda *args: None
+    )
+
+    assert len(manifest.get_qc(outdir.glob('*.fastq.gz'))) == 5
+
+    qc = pandas.read_csv(outdir / 'qc.tsv', sep='\t').sort_values('file')
+    assert qc.reads.tolist() == [200] * 5
+    assert qc.check.tolist() == ['pass'] * 4 + ['mismatch']
+
+    # Statistics of completed files are kept when the batch is resumed:
+    (outdir / 'qc.tsv').unlink()
+    aspera.download_batch(
+        batch, outdir=outdir, ftp=True, workers=2, manifest=manifest,
+        progress=lambda *args: None
+    )
+    assert pandas.read_csv(outdir / 'qc.tsv', sep='\t').sort_values('file').equals(qc)
+
+    manifest.close()
@@ -0,0 +1,49 @@
+import os
+import sys
+import pytest
+import subprocess
+
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Dependencies that must only be imported by the subcommands that need them
+HEAVY = (
+    'pandas', 'numpy', 'matplotlib', 'sklearn', 'scipy',
+    'seaborn', 'dendropy', 'pysam', 'pymongo', 'mongoengine', 'tqdm'
+)
+
+
+def imported(code: str) -> set:
+
+    """ Top-level modules imported by code in a fresh interpreter """
+
+    proc = subprocess.run(
+        [sys.executable, '-c', f'{code}\nimport sys\nprint(*sys.modules)'],
+        stdout=subprocess.PIPE, check=True, universal_newlines=True, cwd=str(ROOT),
+        env=dict(os.environ, PYTHONPATH=str(ROOT))
+    )
+
+    return {module.split('.')[0] for module in proc.stdout.split()}
+
+
+@pytest.mark.parametrize('module', ['pathfinder.terminal.client', 'pathfinder.utils'])
+def test_startup_imports(module):
+
+    assert not imported(f'import {module}') & set(HEAVY)
+
+
+@pytest.mark.parametrize('args', [
+    ['--help'],
+    ['phybeast', 'utils', 'extract-rate', '--help'],
+    ['download', 'status', '--help']
+])
+def test_help_imports(args):
+
+    code = 'from pathfinder.terminal.client import terminal_client\n' \
+        'try:\n' \
+        f'    terminal_client({args!r})\n' \
+        'except SystemExit:\n' \
+        '    pass'
+
+    assert not imported(code) & set(HEAVY)
@@ -0,0 +1,111 @@
+import shutil
+import pandas
+import pytest
+
+from pathfinder.manifest import Manifest, DONE, FAILED, PENDING
+from pathfinder.survey import MiniAspera
+
+
+@pytest.fixture
+def batch(server, tmp_path):
+
+    """ Batch of six runs, the last is missing on the server """
+
+    batch = tmp_path / 'batch.csv'
+    pandas.DataFrame({
+        'ftp_1': [f'{server.url}/ERR{i}_1.fastq.gz' for i in range(6)],
+        'ftp_2': [None] * 6,
+        'size': [0.01] * 6,
+        'reads': [200] * 6
+    }).to_csv(batch, index=False)
+
+    return batch
+
+
+def download(batch, outdir, manifest):
+
+    aspera = MiniAspera()
+    aspera.transfer.backoff = 0.
+
+    return aspera.download_batch(
+        batch, outdir=outdir, ftp=True, workers=2, manifest=manifest,
+        progress=lambda *args: None
+    )
+
+
+def test_manifest(tmp_path):
+
+    manifest = Manifest(tmp_path / 'manifest.db')
+    files = [tmp_path / 'batch' / f'ERR{i}_1.fastq.gz' for i in range(3)]
+    manifest.register([
+        dict(file=file, run=f'ERR{i}', batch='batch', address='', size=10)
+        for i, file in enumerate(files)
+    ])
+
+    manifest.start(files[0])
+    manifest.finish(files[0], received=10)
+    manifest.start(files[1])
+    manifest.fail(files[1], 'HTTP Error 404: Not Found')
+
+    assert manifest.key(tmp_path) == ''
+    assert manifest.key(files[0]) == 'batch/ERR0_1.fastq.gz'
+    assert manifest.get_status(files) == {
+        files[0]: (DONE, 10), files[1]: (FAILED, None), files[2]: (PENDING, 0)
+    }
+
+    assert manifest.failed() == [{
+        'file': 'batch/ERR1_1.fastq.gz', 'run': 'ERR1', 'attempts': 1,
+        'error': 'HTTP Error 404: Not Found'
+    }]
+    assert {row['status']: row['files'] for row in manifest.summary()} == {
+        DONE: 1, FAILED: 1, PENDING: 1
+    }
+
+    manifest.close()
+
+    # State persists across connections:
+    manifest = Manifest(tmp_path / 'manifest.db')
+    assert manifest.get_status(files[:1]) == {files[0]: (DONE, 10)}
+    manifest.close()
+
+
+def test_download_batch(server, reads, batch, tmp_path):
+
+    outdir = tmp_path / 'reads'
+    outdir.mkdir()
+    manifest = Manifest(outdir / 'manifest.db')
+
+    # A failed file does not stop the other files of the batch:
+    failed = download(batch, outdir, manifest)
+
+    assert [outfile.name for outfile, _ in failed] == ['ERR5_1.fastq.gz']
+    assert {row['status']: row['files'] for row in manifest.summary()} == {
+        DONE: 5, FAILED: 1
+    }
+    assert server.requests == 5
+
+    # A restart transfers only the outstanding file:
+    shutil.copy(reads / 'ERR0_1.fastq.gz', reads / 'ERR5_1.fastq.gz')
+    assert download(batch, outdir, manifest) == []
+
+    assert {row['status']: row['files'] for row in manifest.summary()} == {DONE: 6}
+    assert server.requests == 6
+
+    manifest.close()
+
+
+def test_status(server, batch, tmp_path):
+
+    from click.testing import CliRunner
+    from pathfinder.terminal.download.status import status
+
+    outdir = tmp_path / 'reads'
+    outdir.mkdir()
+    manifest = Manifest(outdir / 'manifest.db')
+    download(batch, outdir, manifest)
+    manifest.close()
+
+    result = CliRunner().invoke(status, ['--outdir', str(outdir), '--failed', '1'])
+
+    assert result.exit_code == 0
+    assert 'ERR5_1.fastq.gz' in result.output
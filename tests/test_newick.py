@@ -0,0 +1,63 @@
+import dendropy
+
+from pathfinder.newick import tokenize, iter_tips, split_label
+from pathfinder.utils import get_tree_dates
+
+
+def read_dendropy(newick_file):
+
+    return dendropy.Tree.get(
+        path=str(newick_file), schema='newick', preserve_underscores=False
+    )
+
+
+def test_iter_tips(newick):
+
+    tree = read_dendropy(newick)
+
+    assert list(iter_tips(newick, branch_lengths=True)) == [
+        (leaf.taxon.label, leaf.edge.length) for leaf in tree.leaf_node_iter()
+    ]
+
+
+def test_labels(tmp_path):
+
+    newick = tmp_path / 'tree.newick'
+    newick.write_text(
+        "(('quoted label 2001':0.1,[comment]plain_label_2002:0.2)node:0.3,"
+        "'it''s 2003':0.4,no_length);"
+    )
+
+    labels = [leaf.taxon.label for leaf in read_dendropy(newick).leaf_node_iter()]
+
+    assert list(iter_tips(newick)) == labels
+    assert list(iter_tips(newick, branch_lengths=True))[-1] == ('no length', None)
+
+
+def test_tokens_across_chunks(tmp_path):
+
+    newick = tmp_path / 'tree.newick'
+    newick.write_text(
+        "(('quoted label 2001':0.1,[a longer comment]plain_label_2002:0.2)node:0.3,"
+        "'it''s 2003':0.4);"
+    )
+
+    tokens = list(tokenize(newick))
+    for chunk_size in (1, 2, 7):
+        assert list(tokenize(newick, chunk_size=chunk_size)) == tokens
+
+
+def test_split_label():
+
+    assert split_label('S aureus 2001.5') == ('S aureus', '2001.5')
+    assert split_label('sample') == ('sample', None)
+    assert split_label('sample undated') == ('sample undated', None)
+
+
+def test_tree_dates(newick):
+
+    dates = get_tree_dates(newick)
+
+    assert len(dates) == 50
+    assert sorted(dates.name) == sorted(f'sample{i}' for i in range(50))
+    assert dates.date.astype(float).between(1990, 2020).all()
@@ -0,0 +1,71 @@
+import hashlib
+import pytest
+
+from benchmarks.server import TransferServer
+
+from pathfinder.transfer import NativeTransfer, TransferError, ChecksumError
+
+
+def md5(file):
+
+    return hashlib.md5(file.read_bytes()).hexdigest()
+
+
+def test_download(server, reads, tmp_path):
+
+    outfile = tmp_path / 'ERR0_1.fastq.gz'
+
+    checksum = NativeTransfer().download(f'{server.url}/ERR0_1.fastq.gz', outfile)
+
+    assert outfile.read_bytes() == (reads / 'ERR0_1.fastq.gz').read_bytes()
+    assert checksum == md5(outfile)
+    assert not NativeTransfer.get_partial(outfile).exists()
+
+
+def test_download_resumes_partial_file(server, reads, tmp_path):
+
+    source = (reads / 'ERR1_1.fastq.gz').read_bytes()
+    outfile = tmp_path / 'ERR1_1.fastq.gz'
+    NativeTransfer.get_partial(outfile).write_bytes(source[:len(source) // 3])
+
+    checksum = NativeTransfer().download(
+        f'{server.url}/ERR1_1.fastq.gz', outfile, md5=md5(reads / 'ERR1_1.fastq.gz')
+    )
+
+    assert outfile.read_bytes() == source
+    assert checksum == md5(outfile)
+
+
+def test_download_retries_failures(reads, tmp_path):
+
+    server = TransferServer(reads, failures=0.5, seed=1).start()
+    try:
+        for i in range(5):
+            outfile = tmp_path / f'ERR{i}_1.fastq.gz'
+            NativeTransfer(retries=10, backoff=0.).download(
+                f'{server.url}/{outfile.name}', outfile
+            )
+            assert outfile.read_bytes() == (reads / outfile.name).read_bytes()
+    finally:
+        server.stop()
+
+    assert server.failed > 0
+
+
+def test_download_checksum_mismatch(server, tmp_path):
+
+    outfile = tmp_path / 'ERR0_1.fastq.gz'
+    with pytest.raises(ChecksumError):
+        NativeTransfer(retries=1, backoff=0.).download(
+            f'{server.url}/ERR0_1.fastq.gz', outfile, md5='0' * 32
+        )
+
+    assert not outfile.exists()
+
+
+def test_download_missing_file_is_not_retried(server, tmp_path):
+
+    with pytest.raises(TransferError, match='404'):
+        NativeTransfer(retries=5, backoff=10.).download(
+            f'{server.url}/missing.fastq.gz', tmp_path / 'missing.fastq.gz'
+        )
@@ -0,0 +1,134 @@
+import numpy
+import dendropy
+import pytest
+
+from pathfinder.newick import split_label
+from pathfinder.tree import Tree
+from pathfinder.utils import phybeast_root_to_tip
+
+
+def read_dendropy(newick_file):
+
+    return dendropy.Tree.get(
+        path=str(newick_file), schema='newick', preserve_underscores=False
+    )
+
+
+def tip_dates(tree):
+
+    dates = numpy.full(len(tree), numpy.nan)
+    dates[tree.tips] = [float(split_label(label)[1]) for label in tree.labels[tree.tips]]
+
+    return dates
+
+
+def residuals(tree, dates, root, offset):
+
+    x = dates[tree.tips]
+    y = tree.tip_distances(root, offset)
+
+    return ((y - numpy.polyval(numpy.polyfit(x, y, 1), x))**2).sum()
+
+
+def test_root_distances(newick):
+
+    tree = Tree.from_newick(newick)
+    reference = read_dendropy(newick)
+
+    distances = dict(zip(tree.labels[tree.tips], tree.root_distances()[tree.tips]))
+    for leaf in reference.leaf_node_iter():
+        assert distances[leaf.taxon.label] == pytest.approx(leaf.distance_from_root())
+
+
+def test_subtree_sizes(newick):
+
+    tree = Tree.from_newick(newick)
+    reference = read_dendropy(newick)
+
+    assert sorted(tree.subtree_sizes()) == sorted(
+        len(node.leaf_nodes()) for node in reference.preorder_node_iter()
+    )
+
+
+def test_prune(newick):
+
+    tree = Tree.from_newick(newick)
+    labels = tree.labels[tree.tips]
+    remove = set(labels[::3])
+
+    pruned = tree.prune(remove)
+
+    reference = read_dendropy(newick)
+    reference.prune_taxa_with_labels(remove)
+    reference.suppress_unifurcations()
+
+    assert sorted(pruned.labels[pruned.tips]) == sorted(set(labels) - remove)
+    assert pruned.subtree_sizes()[0] == len(labels) - len(remove)
+
+    distances = dict(zip(pruned.labels[pruned.tips], pruned.root_distances()[pruned.tips]))
+    for leaf in reference.leaf_node_iter():
+        assert distances[leaf.taxon.label] == pytest.approx(leaf.distance_from_root())
+
+
+def test_tip_distances(newick):
+
+    tree = Tree.from_newick(newick)
+    reference = read_dendropy(newick)
+    matrix = reference.phylogenetic_distance_matrix()
+    taxa = {leaf.taxon.label: leaf.taxon for leaf in reference.leaf_node_iter()}
+
+    labels = tree.labels[tree.tips]
+    distances = tree.tip_distances(tree.tips[7])
+
+    for label, distance in zip(labels, distances):
+        assert distance == pytest.approx(matrix.distance(taxa[labels[7]], taxa[label]))
+
+
+def test_regression_root(newick):
+
+    tree = Tree.from_newick(newick)
+    dates = tip_dates(tree)
+
+    root, offset = tree.regression_root(dates)
+
+    assert 0 <= offset <= tree.length[root]
+
+    # Minimum of the residuals over points along all branches:
+    best = min(
+        residuals(tree, dates, node, node_offset)
+        for node in range(len(tree))
+        for node_offset in numpy.linspace(0, tree.length[node] if node else 0, 11)
+    )
+    assert residuals(tree, dates, root, offset) <= best * (1 + 1e-9)
+
+
+def test_root_to_tip(newick, tmp_path):
+
+    tree = Tree.from_newick(newick)
+    root, offset = tree.regression_root(tip_dates(tree))
+
+    data = phybeast_root_to_tip(
+        newick, output_file=tmp_path / 'rtt.csv', remove=['sample0 absent']
+    )
+
+    assert data.distance.values == pytest.approx(tree.tip_distances(root, offset))
+    assert len((tmp_path / 'rtt.csv').read_text().splitlines()) == 2 + len(data)
+
+
+def test_malformed_tree(tmp_path):
+
+    newick = tmp_path / 'tree.newick'
+    for text in ('((a:1,b:2);', '(a:1,b:2));', '(a:x,b:2);', ''):
+        newick.write_text(text)
+        with pytest.raises(ValueError):
+            Tree.from_newick(newick)
+
+
+def test_save_and_load(newick, tmp_path):
+
+    tree = Tree.from_newick(newick)
+    tree.save(tmp_path / 'tree.npz')
+    loaded = Tree.read(tmp_path / 'tree.npz')
+
+    for field in ('parent', 'length', 'stop', 'labels'):
+        assert numpy.array_equal(getattr(tree, field), getattr(loaded, field))